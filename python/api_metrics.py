@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Count outbound API requests by service, stage, package and endpoint, and gate them on a budget.
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+import yaml_io
+
+# Upper bounds in milliseconds of the latency histogram buckets, the last one is open
+LATENCY_BUCKETS_MS = [25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Path segments that vary per call, replaced so calls to the same endpoint are counted together
+ENDPOINT_PATTERNS = [
+    (re.compile(r"^/repos/[^/]+/[^/]+"), "/repos/{owner}/{repo}"),
+    (re.compile(r"/releases/tags/[^/]+"), "/releases/tags/{tag}"),
+    (re.compile(r"/git/refs/tags/[^/]+"), "/git/refs/tags/{tag}"),
+    (re.compile(r"^/pypi/[^/]+"), "/pypi/{package}"),
+    (re.compile(r"^/simple/[^/]+"), "/simple/{package}"),
+    (re.compile(r"/\d+(?=/|$)"), "/{id}"),
+]
+
+
+def normalize_endpoint(url: str) -> str:
+    """Reduce a request URL to the endpoint it calls.
+
+    Args:
+        url: Absolute or path-only request URL
+
+    Returns:
+        Path with the owner, repository, tags, package names and ids replaced by placeholders
+    """
+    path = urlparse(url).path or "/"
+    # GitHub Enterprise and the uploads host put the API under a prefix
+    path = re.sub(r"^/api/(v3|uploads)(?=/)", "", path)
+    # The PyPI stand-ins and mirrors may serve the index below a prefix
+    path = re.sub(r"^.*?(?=/(pypi|simple)/)", "", path)
+    for pattern, replacement in ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return path
+
+
+class ApiMetrics:
+    """Record every outbound API request made by the clients of one process.
+
+    Requests are counted by service, stage, package and endpoint together
+    with the bytes sent and received, errors and a latency histogram. The
+    stage and package are set by the code driving the generators, requests
+    made outside a package are attributed to "-".
+    """
+
+    def __init__(self):
+        """Initialize empty metrics."""
+        self.stage = "default"
+        self.package = "-"
+        self.started = time.time()
+        self.logger = logging.getLogger('api_metrics')
+        self.calls: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def package_context(self, package: str) -> Iterator[None]:
+        """Attribute the requests made inside the context to a package.
+
+        Args:
+            package: Package directory name (under python/)
+        """
+        previous = self.package
+        self.package = package
+        try:
+            yield
+        finally:
+            self.package = previous
+
+    def record(self, service: str, method: str, url: str, status: int, bytes_sent: int = 0,
+               bytes_received: int = 0, seconds: float = 0.0) -> None:
+        """Record a request.
+
+        Args:
+            service: Name of the API, e.g. "github" or "pypi"
+            method: HTTP method
+            url: Request URL
+            status: HTTP status of the response, 0 if no response was received
+            bytes_sent: Size of the request body
+            bytes_received: Size of the response body
+            seconds: Time until the response headers arrived
+        """
+        key = (service, self.stage, self.package, method.upper(), normalize_endpoint(url))
+        bucket = next(
+            (i for i, bound in enumerate(LATENCY_BUCKETS_MS) if seconds * 1000 <= bound),
+            len(LATENCY_BUCKETS_MS)
+        )
+        with self._lock:
+            entry = self.calls.get(key)
+            if entry is None:
+                entry = self.calls[key] = {
+                    "calls": 0,
+                    "errors": 0,
+                    "bytes_sent": 0,
+                    "bytes_received": 0,
+                    "seconds": 0.0,
+                    "latency_ms": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            entry["calls"] += 1
+            entry["errors"] += status == 0 or status >= 400
+            entry["bytes_sent"] += bytes_sent
+            entry["bytes_received"] += bytes_received
+            entry["seconds"] += seconds
+            entry["latency_ms"][bucket] += 1
+
+    def instrument(self, session: requests.Session, service: str) -> requests.Session:
+        """Record every response received through a requests session.
+
+        Args:
+            session: Session to instrument
+            service: Name of the API the session talks to
+
+        Returns:
+            The session
+        """
+        def on_response(response: requests.Response, *args, **kwargs):
+            body = response.request.body
+            bytes_sent = int(response.request.headers.get("Content-Length") or 0) or (
+                len(body) if isinstance(body, (bytes, str)) else 0
+            )
+            # Streamed bodies are not read yet, their announced length is counted
+            bytes_received = int(response.headers.get("Content-Length") or 0)
+            self.record(service, response.request.method, response.url, response.status_code,
+                        bytes_sent, bytes_received, response.elapsed.total_seconds())
+
+        session.hooks["response"].append(on_response)
+        return session
+
+    def totals(self, *fields: str) -> Dict[str, int]:
+        """Sum the calls grouped by some of service, stage, package, method and endpoint.
+
+        Args:
+            *fields: Names of the fields to group by, all calls are summed under "total" if none
+
+        Returns:
+            Dict mapping the joined field values to their number of calls
+        """
+        positions = [["service", "stage", "package", "method", "endpoint"].index(field) for field in fields]
+        totals: Dict[str, int] = {}
+        with self._lock:
+            for key, entry in self.calls.items():
+                group = " ".join(key[i] for i in positions) or "total"
+                totals[group] = totals.get(group, 0) + entry["calls"]
+        return totals
+
+    def to_dict(self) -> Dict:
+        """Get the metrics as a JSON serializable document.
+
+        Returns:
+            Dict with the per-endpoint entries and the totals per service and stage
+        """
+        with self._lock:
+            calls = [
+                dict(zip(["service", "stage", "package", "method", "endpoint"], key), **entry)
+                for key, entry in sorted(self.calls.items())
+            ]
+        return {
+            "started": self.started,
+            "seconds": time.time() - self.started,
+            "latency_buckets_ms": LATENCY_BUCKETS_MS,
+            "totals": {
+                "total": self.totals().get("total", 0),
+                "services": self.totals("service"),
+                "stages": self.totals("service", "stage"),
+                "endpoints": self.totals("service", "method", "endpoint"),
+            },
+            "calls": calls,
+        }
+
+    def dump(self, path: str) -> None:
+        """Write the metrics to a JSON file.
+
+        Args:
+            path: File to write to
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        self.logger.info(f"API metrics written to {path}")
+
+    def dump_at_exit(self, path: Optional[str]) -> None:
+        """Write the metrics to a JSON file when the process exits.
+
+        Args:
+            path: File to write to, nothing is written if None
+        """
+        if path:
+            atexit.register(self.dump, path)
+
+    def summary(self) -> str:
+        """Describe the calls made per service.
+
+        Returns:
+            Human readable summary
+        """
+        services = ", ".join(f"{service} {count}" for service, count in sorted(self.totals("service").items()))
+        return f"API calls: {services or 'none'}"
+
+
+def check_budget(metrics: Dict, budget: Dict) -> List[str]:
+    """Compare dumped metrics with a call budget.
+
+    The budget may declare a "total" and maximum numbers of calls per
+    service ("services", e.g. "github"), per service and stage ("stages",
+    e.g. "github build") and per endpoint ("endpoints", e.g.
+    "github GET /repos/{owner}/{repo}/releases/tags/{tag}").
+
+    Args:
+        metrics: Metrics as returned by ApiMetrics.to_dict
+        budget: Maximum number of calls by total, service, stage and endpoint
+
+    Returns:
+        Descriptions of the exceeded limits, empty if the budget is kept
+    """
+    totals = metrics["totals"]
+    exceeded = []
+    if "total" in budget and totals["total"] > budget["total"]:
+        exceeded.append(f"total: {totals['total']} calls, budget {budget['total']}")
+    for group in ("services", "stages", "endpoints"):
+        for name, limit in (budget.get(group) or {}).items():
+            count = totals[group].get(name, 0)
+            if count > limit:
+                exceeded.append(f"{name}: {count} calls, budget {limit}")
+    return exceeded
+
+
+# Metrics shared by all clients of the process unless they are given their own
+METRICS = ApiMetrics()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Check dumped API metrics against a call budget")
+    parser.add_argument("metrics", help="JSON file written by ApiMetrics.dump")
+    parser.add_argument("--budget", required=True, help="YAML file declaring the call budget")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+                        help="Set the logging level")
+
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    logger = logging.getLogger('api_metrics')
+
+    with open(args.metrics) as f:
+        metrics = json.load(f)
+    with open(args.budget) as f:
+        budget = yaml_io.load(f) or {}
+
+    exceeded = check_budget(metrics, budget)
+    for line in exceeded:
+        logger.error(f"Call budget exceeded, {line}")
+    if exceeded:
+        sys.exit(1)
+    logger.info(f"{metrics['totals']['total']} API calls within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Retrying upload of release assets over a shared connection pool.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from api_metrics import METRICS, ApiMetrics
+from github_client import GitHubClient
+
+
+# Responses worth another attempt, the upload did not complete on GitHub's side
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableUploadError(Exception):
+    """Upload attempt failed in a way that may succeed when repeated."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UploadResult(NamedTuple):
+    """Outcome of a single asset upload."""
+    name: str
+    size: int
+    seconds: float
+    attempts: int
+    asset: Dict
+
+    @property
+    def mib_per_second(self) -> float:
+        """Upload throughput of the successful attempt."""
+        return self.size / 1024 / 1024 / self.seconds if self.seconds else 0.0
+
+
+class AssetUploader:
+    """Upload release assets with retries, backoff and resume checks.
+
+    Before an attempt is repeated the release assets are listed, so an upload
+    that reached GitHub even though its response was lost is not sent again.
+    A broken upload left behind by a failed attempt is deleted first, as
+    GitHub refuses a second asset with the same name. The session is safe to
+    use from the threads of an upload executor, its pool holds one
+    connection per concurrent upload.
+    """
+
+    def __init__(self, github_token: Optional[str] = None, jobs: int = 4, retries: int = 4,
+                 backoff: float = 1.0, max_backoff: float = 30.0, timeout: float = 600.0,
+                 client: Optional[GitHubClient] = None, metrics: Optional[ApiMetrics] = None):
+        """Initialize the asset uploader.
+
+        Args:
+            github_token: GitHub token for authentication
+            jobs: Number of uploads run concurrently by callers
+            retries: Number of times a failed upload is repeated
+            backoff: Base delay in seconds before the first retry, doubled for every next retry
+            max_backoff: Maximum exponential backoff in seconds before a retry
+            timeout: Timeout in seconds for a single request, also the longest wait a
+                Retry-After or rate limit reset may impose before a retry
+            client: GitHub client that paces and counts these requests with the API requests
+            metrics: API metrics to record the requests in, the process wide metrics if None
+        """
+        self.jobs = max(1, jobs)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.client = client
+        self.logger = logging.getLogger('asset_uploader')
+        self.uploads = 0
+        self.attempts = 0
+        self.resumed = 0
+        self.bytes_sent = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers["Accept"] = "application/vnd.github+json"
+        token = github_token or os.environ.get("GITHUB_TOKEN")
+        if token:
+            self.session.headers["Authorization"] = f"token {token}"
+        adapter = HTTPAdapter(pool_connections=self.jobs, pool_maxsize=self.jobs, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        (metrics or METRICS).instrument(self.session, "github")
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, letting the GitHub client pace and count it."""
+        if self.client:
+            self.client.throttle()
+        response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        if self.client:
+            self.client.record_response(response.status_code, response.headers)
+        return response
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Get the delay before a retry, exponential with full jitter.
+
+        Args:
+            attempt: Number of the retry, starting at 1
+
+        Returns:
+            Delay in seconds
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+    def find_asset(self, release: Dict, name: str) -> Optional[Dict]:
+        """Look up an asset of a release by name.
+
+        Args:
+            release: Release as returned by the GitHub API
+            name: Name of the asset
+
+        Returns:
+            Asset as returned by the GitHub API, or None if it does not exist
+        """
+        url = release["assets_url"]
+        while url:
+            response = self._request("GET", url, params={"per_page": 100})
+            response.raise_for_status()
+            for asset in response.json():
+                if asset["name"] == name:
+                    return asset
+            url = response.links.get("next", {}).get("url")
+        return None
+
+    def _landed(self, asset: Dict, size: int, sha256: Optional[str]) -> bool:
+        """Check whether an asset on GitHub is a complete copy of the local file."""
+        if asset.get("state", "uploaded") != "uploaded" or asset.get("size") != size:
+            return False
+        return not (sha256 and asset.get("digest")) or asset["digest"] == f"sha256:{sha256}"
+
+    def _attempt(self, upload_url: str, path: Path, name: str, size: int) -> Dict:
+        """Send the file once.
+
+        Returns:
+            Asset as returned by the GitHub API
+        """
+        with open(path, "rb") as f:
+            response = self._request(
+                "POST",
+                upload_url,
+                params={"name": name},
+                data=f,
+                headers={"Content-Type": "application/gzip", "Content-Length": str(size)},
+            )
+        # 422 means an asset with this name exists, possibly from an earlier attempt,
+        # 403 without requests remaining is the primary rate limit
+        rate_limited = response.status_code == 403 and response.headers.get("X-RateLimit-Remaining") == "0"
+        if response.status_code in RETRY_STATUSES or response.status_code == 422 or rate_limited:
+            retry_after = response.headers.get("Retry-After", "")
+            if rate_limited and response.headers.get("X-RateLimit-Reset", "").isdigit():
+                retry_after = str(max(0, int(response.headers["X-RateLimit-Reset"]) - int(time.time()) + 1))
+            raise RetryableUploadError(
+                f"HTTP {response.status_code}",
+                retry_after=float(retry_after) if retry_after.isdigit() else 0.0
+            )
+        response.raise_for_status()
+        return response.json()
+
+    def upload(self, release: Dict, path: Path, name: str, sha256: Optional[str] = None) -> UploadResult:
+        """Upload a file as a release asset, retrying transient failures.
+
+        Args:
+            release: Release as returned by the GitHub API
+            path: Path to the file to upload
+            name: Name of the asset
+            sha256: SHA256 hash of the file, used to recognize an upload that already landed
+
+        Returns:
+            Result of the upload
+
+        Raises:
+            RetryableUploadError, requests.RequestException: If the last attempt failed
+        """
+        upload_url = release["upload_url"].split("{")[0]
+        size = path.stat().st_size
+        retry_after = 0.0
+
+        for attempt in range(1, self.retries + 2):
+            if attempt > 1:
+                time.sleep(max(self.backoff_delay(attempt - 1), retry_after))
+
+                # The failed attempt may have reached GitHub anyway
+                existing = self.find_asset(release, name)
+                if existing and self._landed(existing, size, sha256):
+                    self.logger.info(f"Asset {name} landed during an earlier attempt, not uploading it again")
+                    with self._lock:
+                        self.resumed += 1
+                    return UploadResult(name, size, 0.0, attempt - 1, existing)
+                if existing:
+                    self.logger.info(f"Deleting incomplete asset {name} before retrying")
+                    self._request("DELETE", existing["url"]).raise_for_status()
+
+            with self._lock:
+                self.attempts += 1
+            start = time.perf_counter()
+            try:
+                asset = self._attempt(upload_url, path, name, size)
+            except (RetryableUploadError, requests.ConnectionError, requests.Timeout) as e:
+                if attempt > self.retries:
+                    raise
+                # The server asked for this wait, so only the timeout bounds it, not max_backoff
+                retry_after = min(getattr(e, "retry_after", 0.0), self.timeout)
+                self.logger.warning(f"Upload of {name} failed on attempt {attempt}: {e}")
+                continue
+
+            result = UploadResult(name, size, time.perf_counter() - start, attempt, asset)
+            with self._lock:
+                self.uploads += 1
+                self.bytes_sent += size
+                self.seconds += result.seconds
+            self.logger.info(
+                f"Uploaded {name}: {size / 1024 / 1024:.1f} MiB in {result.seconds:.1f} s "
+                f"({result.mib_per_second:.1f} MiB/s, attempt {attempt})"
+            )
+            return result
+
+    def summary(self) -> str:
+        """Describe the upload counters.
+
+        Returns:
+            Human readable summary
+        """
+        rate = self.bytes_sent / 1024 / 1024 / self.seconds if self.seconds else 0.0
+        return (
+            f"Uploads: {self.uploads} uploaded, {self.resumed} already landed, "
+            f"{self.attempts - self.uploads} failed attempts, "
+            f"{self.bytes_sent / 1024 / 1024:.1f} MiB at {rate:.1f} MiB/s per upload"
+        )
+
+    def close(self) -> None:
+        """Close the HTTP session."""
+        self.session.close()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Run a state and upload scenario against the local stand-ins and fail when it exceeds its API call budget.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from github import Auth, Github
+
+from api_metrics import METRICS, check_budget
+from asset_uploader import AssetUploader
+from generate_pex import PexGenerator
+from github_client import GitHubClient
+from pypi_cache import PyPIMetadataCache
+from pypi_client import PyPIClient
+from release_snapshot import ReleaseSnapshot, release_entry
+from standins.github_server import GitHubStandIn
+from standins.pypi_server import PyPIStandIn
+import yaml_io
+
+
+DEFAULT_BUDGET = Path(__file__).with_name("api_budget.yaml")
+
+
+def run_state(packages: int, temp_dir: Path) -> None:
+    """Discover the versions of the packages twice, the second time through the metadata cache."""
+    catalog = {f"package-{i}": [f"1.{minor}.0" for minor in range(20)] for i in range(packages)}
+    with PyPIStandIn(catalog) as standin:
+        for _ in range(2):
+            client = PyPIClient(index_url=standin.index_url, jobs=4,
+                                cache=PyPIMetadataCache(str(temp_dir / "pypi-cache")))
+            client.get_release_versions_many(catalog)
+            client.close()
+
+
+def run_build(assets: int, temp_dir: Path) -> None:
+    """Upload a tarball per release twice, the second run finds every asset already uploaded."""
+    with GitHubStandIn(repo="owner/repo") as standin:
+        github = GitHubClient(github=Github(base_url=standin.base_url, auth=Auth.Token("token")))
+        snapshot = ReleaseSnapshot(github_repo="owner/repo")
+        for i in range(assets):
+            snapshot.put(release_entry(standin.create_release(f"package-v1.{i}.0")))
+
+        tarballs = []
+        for i in range(assets):
+            tarball = temp_dir / f"package-{i}-linux-amd64.tar.gz"
+            tarball.write_bytes(os.urandom(64 * 1024))
+            tarballs.append(tarball)
+
+        for _ in range(2):
+            generator = PexGenerator(
+                package_dir=str(temp_dir), dist_dir=str(temp_dir / "dist"), tmp_dir=str(temp_dir / "tmp"),
+                github_repo="owner/repo", github_token="token", github=github, snapshot=snapshot,
+                uploader=AssetUploader("token", retries=0, client=github)
+            )
+            for i, tarball in enumerate(tarballs):
+                if not generator.upload_to_github_release("package", f"1.{i}.0", tarball):
+                    raise SystemExit(f"Upload of {tarball.name} failed")
+            generator.uploader.close()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Check the API calls of a scenario against a budget")
+    parser.add_argument("--budget", default=str(DEFAULT_BUDGET), help="YAML file declaring the call budget")
+    parser.add_argument("--packages", type=int, default=20, help="Number of packages to discover")
+    parser.add_argument("--assets", type=int, default=8, help="Number of assets to upload")
+    parser.add_argument("--api-metrics", default=os.environ.get("API_METRICS_FILE"),
+                        help="File to write the API calls made to as JSON")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        METRICS.stage = "state"
+        run_state(args.packages, Path(temp_dir))
+        METRICS.stage = "build"
+        run_build(args.assets, Path(temp_dir))
+
+    metrics = METRICS.to_dict()
+    if args.api_metrics:
+        METRICS.dump(args.api_metrics)
+    print(json.dumps(metrics["totals"], indent=2))
+
+    with open(args.budget) as f:
+        budget = yaml_io.load(f) or {}
+    exceeded = check_budget(metrics, budget)
+    for line in exceeded:
+        print(f"Call budget exceeded, {line}")
+    if exceeded:
+        sys.exit(1)
+    print(f"{metrics['totals']['total']} API calls within budget")
+
+
+if __name__ == "__main__":
+    main()
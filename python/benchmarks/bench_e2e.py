@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark state, releases, build and build_info end to end against the local PyPI and GitHub stand-ins.
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from api_metrics import METRICS
+from benchmarks.synthetic_tree import synthetic_versions, write_package_tree
+from generate_pex import PEX_VERSION, PexGenerator
+from github_client import GitHubClient
+from pipeline import Pipeline
+from standins.github_server import GitHubStandIn
+from standins.pypi_server import PyPIStandIn
+import yaml_io
+
+
+REPO = "owner/repo"
+
+# Stages that run offline once PyPI and GitHub are stood in, requirements needs the real index
+E2E_STAGES = ["state", "releases", "build", "build_info", "hermit_manifest"]
+
+
+def seed_builds(generator: PexGenerator, packages: List[str], versions: List[str]) -> Dict[str, bytes]:
+    """Put a small synthetic PEX and tarball of every version in the build cache.
+
+    The build stage then takes its artifacts from the cache instead of
+    running pex, which needs the network.
+
+    Returns:
+        Dict mapping "<package>-v<version>" to the tarball content
+    """
+    tarballs = {}
+    for package in packages:
+        for version in versions:
+            pex_path = generator.get_pex_path(package, version, "3.11")
+            pex_path.parent.mkdir(parents=True, exist_ok=True)
+            pex_path.write_bytes(f"#!/usr/bin/env python3\n# {package} {version}\n".encode() * 512)
+            scripts = generator.create_binary_scripts(pex_path, package, [package])
+            tarball_path, tarball_hash = generator.create_tarball(package, pex_path, scripts)
+
+            requirements = generator.package_dir / package / version / "requirements.txt"
+            key = generator.build_cache.fingerprint(
+                package, requirements, "3.11", PEX_VERSION, generator.os_name, generator.arch_name, [package]
+            )
+            generator.build_cache.put(key, pex_path, tarball_path, tarball_hash)
+            tarballs[f"{package}-v{version}"] = tarball_path.read_bytes()
+    return tarballs
+
+
+def seed_releases(standin: GitHubStandIn, packages: List[str], versions: List[str], released: int,
+                  tarballs: Dict[str, bytes], asset_suffix: str) -> None:
+    """Create complete releases with their asset for the first versions of every package."""
+    for package in packages:
+        for version in versions[:released]:
+            tag_name = f"{package}-v{version}"
+            asset_name = f"{package}-{asset_suffix}.tar.gz"
+            release_info = {
+                "build_info": {
+                    "package": package,
+                    "extra_packages": [],
+                    "config_version": 1,
+                    "python": "3.11",
+                    "version": version,
+                    "binaries": [package],
+                },
+                "asset_info": {},
+            }
+            release = standin.create_release(tag_name, prerelease=True)
+            asset = standin.add_asset(release["id"], asset_name, tarballs[tag_name])
+            release_info["asset_info"][asset_name] = asset["digest"].split(":", 1)[1]
+            with standin._lock:
+                standin.releases[release["id"]]["body"] = f"```yaml\n{yaml_io.dump(release_info)}```"
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline end to end against local stand-ins")
+    parser.add_argument("--packages", type=int, default=5, help="Number of synthetic packages")
+    parser.add_argument("--versions", type=int, default=40, help="Number of versions per package")
+    parser.add_argument("--released", type=float, default=0.5,
+                        help="Fraction of the versions that already have a complete release")
+    parser.add_argument("--latency", type=float, default=0.01, help="Delay in seconds per GitHub and PyPI response")
+    parser.add_argument("--page-size", type=int, default=30, help="Default page size of the GitHub listings")
+    parser.add_argument("--rate-limit", type=int, default=None,
+                        help="GitHub requests per resource and window (default: unlimited)")
+    parser.add_argument("--rate-window", type=float, default=5.0, help="Length in seconds of a rate limit window")
+    parser.add_argument("--write-delay", type=float, default=0.0,
+                        help="Seconds between writing GitHub requests, GitHub recommends 1")
+    parser.add_argument("--release-fetch", default="graphql", choices=["graphql", "rest"],
+                        help="Fetch the releases through GraphQL or page them through REST")
+    parser.add_argument("--log-level", default="ERROR",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+                        help="Set the logging level")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=getattr(logging, args.log_level))
+
+    versions = synthetic_versions(args.versions)
+    released = int(len(versions) * args.released)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        packages = write_package_tree(root, args.packages, args.versions)
+        for package in packages:
+            # The state stage derives the state from PyPI and the releases
+            (root / "python" / package / "state.yaml").unlink()
+
+        catalog = {package: list(versions) for package in packages}
+        with PyPIStandIn(catalog, latency=args.latency) as pypi, \
+                GitHubStandIn(repo=REPO, latency=args.latency, page_size=args.page_size,
+                              rate_limit=args.rate_limit, rate_window=args.rate_window) as github:
+            client = GitHubClient(base_url=github.base_url, seconds_between_requests=None,
+                                  seconds_between_writes=args.write_delay or None)
+            pipeline = Pipeline(
+                package_dir=str(root / "python"),
+                dist_dir=str(root / "dist"),
+                tmp_dir=str(root / "tmp"),
+                github_repo=REPO,
+                github_token="token",
+                github_api_url=github.base_url,
+                pypi_index_url=pypi.index_url,
+                release_fetch=args.release_fetch,
+                jobs=8,
+                github=client,
+            )
+
+            seeder = PexGenerator(
+                package_dir=str(root / "python"), dist_dir=str(root / "seed"), tmp_dir=str(root / "tmp"),
+                github_repo=REPO, github_token="token", github=client
+            )
+            tarballs = seed_builds(seeder, packages, versions)
+            seed_releases(github, packages, versions, released, tarballs, f"{seeder.os_name}-{seeder.arch_name}")
+
+            rows = []
+            for stage in E2E_STAGES:
+                github_before, pypi_before = github.requests, pypi.requests
+                start = time.perf_counter()
+                result = pipeline.run([stage], packages)[stage]
+                elapsed = time.perf_counter() - start
+                rows.append((stage, elapsed, github.requests - github_before, pypi.requests - pypi_before, result))
+
+            with github._lock:
+                complete = sum(
+                    1 for release_id, release in github.releases.items()
+                    if github.assets[release_id] and "build_info" in release["body"]
+                )
+
+    print(f"{args.packages} packages x {args.versions} versions, {released} released per package, "
+          f"{args.latency * 1000:.0f} ms latency, {args.write_delay} s between writes, "
+          f"{args.release_fetch} release fetch")
+    print(f"{'stage':<16} {'seconds':>8} {'github':>7} {'pypi':>6}  result")
+    for stage, elapsed, github_requests, pypi_requests, result in rows:
+        print(f"{stage:<16} {elapsed:>8.2f} {github_requests:>7} {pypi_requests:>6}  {'ok' if result else 'failed'}")
+    print(f"{'total':<16} {sum(row[1] for row in rows):>8.2f} {sum(row[2] for row in rows):>7} "
+          f"{sum(row[3] for row in rows):>6}")
+    print(f"{complete}/{args.packages * args.versions} releases complete, {METRICS.summary()}")
+
+
+if __name__ == "__main__":
+    main()
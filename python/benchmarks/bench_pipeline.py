@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark a no-op run of the single-process pipeline against one process per stage.
+
+Every stage runs against local PyPI and GitHub stand-ins serving a complete
+synthetic catalog. One warm-up run leaves the fingerprints, release snapshot
+and PyPI cache behind, so the timed runs have nothing left to do and show the
+overhead of the stage processes, their clients and the state files.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import yaml_io
+from benchmarks.synthetic_tree import PLATFORMS, synthetic_versions, write_package_tree
+from pipeline import STAGES
+from standins.github_server import GitHubStandIn
+from standins.pypi_server import PyPIStandIn
+
+
+PYTHON_DIR = Path(__file__).resolve().parent.parent
+
+REPO = "owner/repo"
+
+# Script the Taskfile runs for each stage
+STAGE_SCRIPTS = {
+    "state": "generate_state.py",
+    "requirements": "generate_requirements.py",
+    "releases": "generate_releases.py",
+    "build": "generate_pex.py",
+    "build_info": "generate_build_info.py",
+    "hermit_manifest": "generate_hermit_manifest.py",
+}
+
+
+def seed_releases(standin: GitHubStandIn, root: Path, packages: List[str]) -> None:
+    """Create the complete release of every version in the synthetic states.
+
+    The release descriptions and assets match the states, so no stage has
+    anything to change.
+    """
+    for package in packages:
+        state = yaml_io.load((root / "python" / package / "state.yaml").read_text())
+        for version_info in state["versions"]:
+            version = version_info["version"]
+            release = standin.create_release(
+                f"{package}-v{version}", body=f"```yaml\n{yaml_io.dump(version_info['release_info'])}```"
+            )
+            for platform in PLATFORMS:
+                # The synthetic asset hashes are those of this content
+                standin.add_asset(release["id"], f"{package}-{platform}.tar.gz",
+                                  f"{package}-{version}-{platform}".encode())
+
+
+def run(cmd: List[str], cwd: Path, env: Dict[str, str]) -> float:
+    """Run a command and return its wall time in seconds."""
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"{' '.join(cmd[1:2])} failed:\n{result.stderr[-2000:]}")
+    return elapsed
+
+
+def run_mode(mode: str, source: Path, work: Path, packages: List[str], env: Dict[str, str],
+             pypi: PyPIStandIn, github: GitHubStandIn) -> Tuple[float, int, int]:
+    """Run all stages once over a fresh copy of the warmed-up tree.
+
+    Args:
+        mode: "per-stage" to run one process per stage, "single" to run pipeline.py
+        source: Directory holding the warmed-up python/ and tmp/ trees
+        work: Directory to copy the tree to and run in
+        packages: Package directory names
+        env: Environment of the stage processes
+        pypi: PyPI stand-in, to count its requests
+        github: GitHub stand-in, to count its requests
+
+    Returns:
+        Tuple of the seconds taken, the GitHub requests and the PyPI requests
+    """
+    shutil.rmtree(work, ignore_errors=True)
+    shutil.copytree(source, work)
+    github_before, pypi_before = github.requests, pypi.requests
+
+    if mode == "single":
+        seconds = run([sys.executable, str(PYTHON_DIR / "pipeline.py"), *packages], work, env)
+    else:
+        seconds = sum(
+            run([sys.executable, str(PYTHON_DIR / STAGE_SCRIPTS[stage]), *packages], work, env)
+            for stage in STAGES
+        )
+    return seconds, github.requests - github_before, pypi.requests - pypi_before
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark a no-op run of the single-process pipeline")
+    parser.add_argument("--packages", type=int, default=10, help="Number of synthetic packages")
+    parser.add_argument("--versions", type=int, default=100, help="Number of versions per package")
+    parser.add_argument("--latency", type=float, default=0.01, help="Delay in seconds per GitHub and PyPI response")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per mode, the fastest counts")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        source = root / "source"
+        packages = write_package_tree(source, args.packages, args.versions)
+        catalog = {package: synthetic_versions(args.versions) for package in packages}
+
+        with PyPIStandIn(catalog, latency=args.latency) as pypi, \
+                GitHubStandIn(repo=REPO, latency=args.latency) as github:
+            seed_releases(github, source, packages)
+            env = dict(
+                os.environ,
+                PYTHONPATH=str(PYTHON_DIR),
+                GITHUB_TOKEN="token",
+                GITHUB_API_URL=github.base_url,
+                PYPI_INDEX_URL=pypi.index_url,
+            )
+            env.pop("API_METRICS_FILE", None)
+            run([sys.executable, str(PYTHON_DIR / "pipeline.py"), *packages], source, env)
+
+            results = {}
+            for mode in ("per-stage", "single"):
+                runs = [run_mode(mode, source, root / mode, packages, env, pypi, github)
+                        for _ in range(args.repeat)]
+                results[mode] = min(runs)
+
+    print(f"{args.packages} packages x {args.versions} versions, {args.latency * 1000:.0f} ms latency, "
+          f"stages: {', '.join(STAGES)}")
+    print(f"{'mode':<10} {'seconds':>8} {'github':>7} {'pypi':>6}")
+    for mode, (seconds, github_requests, pypi_requests) in results.items():
+        print(f"{mode:<10} {seconds:>8.3f} {github_requests:>7} {pypi_requests:>6}")
+    print(f"speedup: {results['per-stage'][0] / results['single'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent PyPI version discovery against the local PyPI stand-in.
+"""
+
+import argparse
+import logging
+import time
+
+from pypi_client import PyPIClient
+from standins.pypi_server import PyPIStandIn
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark PyPI version discovery by concurrency")
+    parser.add_argument("--packages", type=int, default=200, help="Number of packages to fetch")
+    parser.add_argument("--versions", type=int, default=100, help="Number of versions per package")
+    parser.add_argument("--latency", type=float, default=0.05, help="Delay in seconds per response")
+    parser.add_argument("--jobs", type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help="Concurrency levels to measure")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    packages = {
+        f"package-{i}": [f"1.{minor}.0" for minor in range(args.versions)]
+        for i in range(args.packages)
+    }
+
+    with PyPIStandIn(packages, latency=args.latency) as standin:
+        print(f"{'jobs':>6} {'seconds':>10} {'packages/s':>12} {'speedup':>8}")
+        baseline = None
+        for jobs in args.jobs:
+            client = PyPIClient(index_url=standin.index_url, jobs=jobs)
+            start = time.perf_counter()
+            results = client.get_release_versions_many(packages)
+            elapsed = time.perf_counter() - start
+            client.close()
+
+            failed = [name for name, result in results.items() if isinstance(result, Exception)]
+            if failed:
+                raise SystemExit(f"{len(failed)} packages failed with {jobs} jobs")
+
+            baseline = baseline or elapsed
+            print(f"{jobs:>6} {elapsed:>10.3f} {len(packages) / elapsed:>12.1f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
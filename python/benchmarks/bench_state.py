@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark state generation for a large synthetic catalog served by the local PyPI and GitHub stand-ins.
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_tree import write_package_tree
+from generate_state import StateGenerator
+from github_client import GitHubClient
+from standins.github_server import GitHubStandIn
+from standins.pypi_server import PyPIStandIn, count_versions, synthetic_catalog
+from state_fingerprints import StateFingerprints
+
+
+REPO = "owner/repo"
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark state generation by catalog size")
+    parser.add_argument("--packages", type=int, default=1000, help="Number of synthetic packages")
+    parser.add_argument("--versions", type=int, default=200, help="Number of versions per package on PyPI")
+    parser.add_argument("--prereleases", type=float, default=0.1, help="Fraction of the versions that are pre-releases")
+    parser.add_argument("--yanked", type=float, default=0.02, help="Fraction of the versions that are yanked")
+    parser.add_argument("--files-per-version", type=int, default=2, help="Number of files per version")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated catalog")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay in seconds per PyPI and GitHub response")
+    parser.add_argument("--jobs", type=int, default=8, help="Number of concurrent PyPI requests")
+    parser.add_argument("--runs", type=int, default=2,
+                        help="Number of runs, the runs after the first revalidate the PyPI metadata cache")
+    parser.add_argument("--changed", type=int, default=0,
+                        help="Number of packages that get a new version on PyPI before every run after the first")
+    parser.add_argument("--change-feed", action="store_true",
+                        help="Ask the PyPI changelog which packages changed instead of revalidating every package")
+    parser.add_argument("--full", action="store_true",
+                        help="Generate every state in every run instead of skipping packages with unchanged inputs")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    catalog = synthetic_catalog(args.packages, args.versions, args.prereleases, args.seed)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        # Configs only, the state stage writes the state files
+        packages = write_package_tree(root, args.packages, 0)
+
+        with PyPIStandIn(catalog, latency=args.latency, files_per_version=args.files_per_version,
+                         yanked_ratio=args.yanked, seed=args.seed) as pypi, \
+                GitHubStandIn(repo=REPO, latency=args.latency) as github:
+            versions, prereleases, yanked = count_versions(catalog, pypi.yanked)
+            print(f"{args.packages} packages, {versions} versions ({prereleases} pre-releases, {yanked} yanked), "
+                  f"{args.files_per_version} files per version, {args.latency * 1000:.0f} ms latency, "
+                  f"{args.jobs} jobs")
+            print(f"{'run':<6} {'pypi s':>8} {'github s':>9} {'state s':>8} {'total s':>8} "
+                  f"{'packages/s':>11} {'requests':>9} {'MiB':>7} {'304s':>6} {'skipped':>8}")
+
+            client = GitHubClient(base_url=github.base_url, seconds_between_requests=None,
+                                  seconds_between_writes=None)
+            for run in range(1, args.runs + 1):
+                if run > 1:
+                    for package in packages[:args.changed]:
+                        pypi.publish(package, f"99.0.{run}")
+                requests_before = pypi.requests
+                bytes_before, not_modified_before = pypi.bytes_sent, pypi.not_modified
+                generator = StateGenerator(
+                    package_dir=str(root / "python"),
+                    github_repo=REPO,
+                    github_token="token",
+                    jobs=args.jobs,
+                    pypi_cache_dir=str(root / "pypi-cache"),
+                    github=client,
+                    pypi_index_url=pypi.index_url,
+                    fingerprints=StateFingerprints(str(root / "state-fingerprints.json")),
+                    full=args.full,
+                    change_feed=args.change_feed,
+                )
+
+                start = time.perf_counter()
+                generator.prefetch_pypi_versions(packages)
+                pypi_done = time.perf_counter()
+                generator.prefetch_github_releases(packages)
+                github_done = time.perf_counter()
+                failed = [package for package in packages if not generator.process_package(package)]
+                end = time.perf_counter()
+                generator.pypi.close()
+                generator.fingerprints.save()
+                if failed:
+                    raise SystemExit(f"State generation failed for {len(failed)} packages")
+
+                print(f"{run:<6} {pypi_done - start:>8.2f} {github_done - pypi_done:>9.2f} "
+                      f"{end - github_done:>8.2f} {end - start:>8.2f} {len(packages) / (end - start):>11.1f} "
+                      f"{pypi.requests - requests_before:>9} "
+                      f"{(pypi.bytes_sent - bytes_before) / 1024 / 1024:>7.1f} "
+                      f"{pypi.not_modified - not_modified_before:>6} {generator.skipped:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark answering pending-work questions from the SQLite state store against scanning the state files.
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import yaml_io
+from benchmarks.synthetic_tree import write_package_tree
+from document_store import DocumentStore
+from state_store import StateStore
+
+
+PLATFORM = "linux-arm64"
+
+
+def scan_missing(package_dir: Path, packages) -> list:
+    """List the versions lacking an asset of PLATFORM by loading every state file, as the generators do."""
+    missing = []
+    for package in packages:
+        documents = DocumentStore()
+        state = documents.load(package_dir / package / "state.yaml")
+        for version_info in state["versions"]:
+            if not version_info["requirements"] or not version_info["release"]:
+                continue
+            if f"{package}-{PLATFORM}.tar.gz" not in version_info.get("assets", {}):
+                missing.append((package, version_info["version"]))
+    return missing
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark pending-work queries on the SQLite state store")
+    parser.add_argument("--packages", type=int, default=100, help="Number of synthetic packages")
+    parser.add_argument("--versions", type=int, default=100, help="Number of versions per package")
+    parser.add_argument("--missing", type=int, default=5,
+                        help=f"Number of versions per package without a {PLATFORM} asset")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        package_dir = root / "python"
+        packages = write_package_tree(root, args.packages, args.versions)
+        for package in packages:
+            state_path = package_dir / package / "state.yaml"
+            with open(state_path) as f:
+                state = yaml_io.load(f)
+            for version_info in state["versions"][-args.missing:]:
+                del version_info["assets"][f"{package}-{PLATFORM}.tar.gz"]
+            with open(state_path, "w") as f:
+                yaml_io.dump(state, f)
+
+        start = time.perf_counter()
+        scanned = scan_missing(package_dir, packages)
+        scan_seconds = time.perf_counter() - start
+
+        store = StateStore(str(root / "state.db"))
+        start = time.perf_counter()
+        store.import_tree(package_dir, packages)
+        import_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pending = [item for item in store.pending([PLATFORM]) if item["stage"] == "build"]
+        query_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.completeness()
+        completeness_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for package, version in scanned:
+            store.set_asset(package, version, f"{package}-{PLATFORM}.tar.gz", "0" * 64)
+        update_seconds = time.perf_counter() - start
+        store.close()
+
+        if sorted(scanned) != sorted((item["package"], item["version"]) for item in pending):
+            raise SystemExit("The state store and the state files disagree on the pending builds")
+
+        print(f"{args.packages} packages of {args.versions} versions, {len(scanned)} lacking {PLATFORM}")
+        print(f"{'operation':<22} {'seconds':>8}")
+        print(f"{'scan state files':<22} {scan_seconds:>8.3f}")
+        print(f"{'import into store':<22} {import_seconds:>8.3f}")
+        print(f"{'query pending builds':<22} {query_seconds:>8.3f}")
+        print(f"{'query completeness':<22} {completeness_seconds:>8.3f}")
+        print(f"{'record missing assets':<22} {update_seconds:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
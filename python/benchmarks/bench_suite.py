@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Benchmark every generator stage on synthetic trees against the local stand-ins and compare with stored baselines.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.synthetic_tree import PLATFORMS, write_package_tree
+from generate_build_info import BuildInfoGenerator
+from generate_hermit_manifest import HermitManifestGenerator
+from generate_releases import ReleaseGenerator
+from generate_requirements import RequirementsGenerator
+from generate_state import StateGenerator
+from github_client import GitHubClient
+from release_snapshot import ReleaseSnapshot
+from standins.github_server import GitHubStandIn
+from standins.pypi_server import PyPIStandIn, synthetic_catalog
+import yaml_io
+
+
+PYTHON_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINES = Path(__file__).with_name("bench_baselines.yaml")
+
+REPO = "owner/repo"
+
+# Tree sizes as (packages, versions per package), a third of the versions is released up front
+SIZES = {
+    "small": (10, 30),
+    "medium": (50, 120),
+    "large": (200, 400),
+}
+
+# Stages in pipeline order, the build stage is simulated between releases and build_info
+STAGES = ["state", "requirements", "releases", "build_info", "hermit_manifest"]
+
+METRICS = ["wall_seconds", "cpu_seconds", "peak_rss_mib", "github_requests", "pypi_requests"]
+
+# Differences below these are noise, whatever the relative change
+MIN_DIFFERENCE = {"wall_seconds": 0.05, "cpu_seconds": 0.05, "peak_rss_mib": 5.0}
+
+
+def asset_hashes(package: str, version: str) -> Dict[str, str]:
+    """Get made-up SHA256 hashes of the platform tarballs of a version."""
+    return {
+        f"{package}-{platform}.tar.gz": hashlib.sha256(f"{package}-{version}-{platform}".encode()).hexdigest()
+        for platform in PLATFORMS
+    }
+
+
+def release_body(package: str, version: str) -> str:
+    """Describe a complete release the way build_info does."""
+    release_info = {
+        "build_info": {
+            "package": package,
+            "extra_packages": [],
+            "config_version": 1,
+            "python": "3.11",
+            "version": version,
+            "binaries": [package],
+        },
+        "asset_info": asset_hashes(package, version),
+    }
+    return f"```yaml\n{yaml_io.dump(release_info)}```"
+
+
+def prepare_tree(root: Path, catalog: Dict[str, List[str]], github: GitHubStandIn) -> List[str]:
+    """Write the package configs and seed the releases of the first third of every package's versions.
+
+    Every version gets a lock file, so the requirements stage only writes
+    the missing requirements.in files instead of running uv. Released
+    versions have both files.
+
+    Returns:
+        List of package directory names
+    """
+    packages = write_package_tree(root, len(catalog), 0)
+    for package in packages:
+        (root / "python" / package / "state.yaml").unlink()
+        versions = catalog[package]
+        released = versions[:len(versions) // 3]
+        for version in versions:
+            version_dir = root / "python" / package / version
+            version_dir.mkdir(parents=True, exist_ok=True)
+            (version_dir / "requirements.txt").write_text(f"{package}=={version}\n")
+            if version in released:
+                (version_dir / "requirements.in").write_text(f"{package}=={version}\n")
+                release = github.create_release(f"{package}-v{version}", prerelease=False)
+                with github._lock:
+                    github.releases[release["id"]]["body"] = release_body(package, version)
+    return packages
+
+
+def simulate_build(root: Path, packages: List[str]) -> None:
+    """Record assets for every released version without any, as the build stage would."""
+    for package in packages:
+        state_path = root / "python" / package / "state.yaml"
+        with open(state_path) as f:
+            state = yaml_io.load(f)
+        for version_info in state["versions"]:
+            if version_info["release"] and not version_info["assets"]:
+                version_info["assets"] = asset_hashes(package, version_info["version"])
+        with open(state_path, "w") as f:
+            yaml_io.dump(state, f)
+
+
+def run_stage(stage: str, root: Path, pypi_index_url: str, github_api_url: str) -> None:
+    """Run one stage over all packages of a tree, the way its script does."""
+    package_dir = root / "python"
+    packages = sorted(path.name for path in package_dir.iterdir() if (path / "config.yaml").exists())
+    snapshot = ReleaseSnapshot(str(root / "release-snapshot.json"), REPO)
+    # Request pacing is left out, it would swamp the time spent in the generators
+    github = GitHubClient("token", stage=stage, base_url=github_api_url,
+                          seconds_between_requests=None, seconds_between_writes=None)
+
+    if stage == "state":
+        generator = StateGenerator(str(package_dir), REPO, "token", jobs=8, github=github,
+                                   snapshot=snapshot, pypi_index_url=pypi_index_url)
+        generator.prefetch_pypi_versions(packages)
+        generator.prefetch_github_releases(packages)
+        results = [generator.process_package(package) for package in packages]
+        generator.pypi.close()
+    elif stage == "requirements":
+        generator = RequirementsGenerator(str(package_dir))
+        results = [generator.process_package(package) for package in packages]
+    elif stage == "releases":
+        generator = ReleaseGenerator(str(package_dir), REPO, "token", github=github, snapshot=snapshot)
+        results = [generator.process_package(package) for package in packages]
+    elif stage == "build_info":
+        generator = BuildInfoGenerator(str(package_dir), REPO, "token", github=github, snapshot=snapshot)
+        results = [generator.process_package(package) for package in packages]
+    else:
+        generator = HermitManifestGenerator(str(package_dir))
+        results = [generator.generate_manifest(package) for package in packages]
+
+    snapshot.save()
+    if not all(results):
+        raise SystemExit(f"Stage {stage} failed for {results.count(False)} packages")
+
+
+def peak_rss_mib() -> float:
+    """Get the peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def worker(stage: str, root: Path, pypi_index_url: str, github_api_url: str) -> None:
+    """Run a stage and print its wall time, CPU time and peak RSS as JSON."""
+    logging.basicConfig(level=logging.ERROR)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    run_stage(stage, root, pypi_index_url, github_api_url)
+    print(json.dumps({
+        "wall_seconds": round(time.perf_counter() - wall_start, 3),
+        "cpu_seconds": round(time.process_time() - cpu_start, 3),
+        "peak_rss_mib": round(peak_rss_mib(), 1),
+    }))
+
+
+def measure_size(packages: int, versions: int) -> Dict[str, Dict]:
+    """Run all stages on a fresh tree, each in its own process.
+
+    A process per stage keeps the peak RSS of one stage apart from the
+    others, the stand-ins run in this process and count the requests.
+
+    Returns:
+        Dict mapping stage to its metrics
+    """
+    results = {}
+    catalog = synthetic_catalog(packages, versions, prerelease_ratio=0.1)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        with PyPIStandIn(catalog, yanked_ratio=0.02) as pypi, GitHubStandIn(repo=REPO) as github:
+            package_names = prepare_tree(root, catalog, github)
+            env = dict(os.environ, PYTHONPATH=str(PYTHON_DIR))
+            for stage in STAGES:
+                if stage == "build_info":
+                    simulate_build(root, package_names)
+                github_before, pypi_before = github.requests, pypi.requests
+                completed = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_suite", "--worker", stage, "--root", str(root),
+                     "--pypi-index-url", pypi.index_url, "--github-api-url", github.base_url],
+                    cwd=root, env=env, capture_output=True, text=True
+                )
+                if completed.returncode != 0:
+                    raise SystemExit(f"Stage {stage} failed:\n{completed.stderr}")
+                metrics = json.loads(completed.stdout.strip().splitlines()[-1])
+                metrics["github_requests"] = github.requests - github_before
+                metrics["pypi_requests"] = pypi.requests - pypi_before
+                results[stage] = metrics
+    return results
+
+
+def best_of(runs: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Take the lowest value of every metric over repeated runs."""
+    return {
+        stage: {metric: min(run[stage][metric] for run in runs) for metric in METRICS}
+        for stage in runs[0]
+    }
+
+
+def compare(results: Dict[str, Dict[str, Dict]], baselines: Dict[str, Dict[str, Dict]],
+            threshold: float) -> List[Tuple[str, str, str, float, float]]:
+    """Find the metrics that regressed against the baselines.
+
+    Request counts are deterministic, any increase is a regression. Times
+    and memory regress when they grow by more than the threshold and by
+    more than the noise floor in MIN_DIFFERENCE.
+
+    Args:
+        results: Metrics by size and stage
+        baselines: Baseline metrics by size and stage
+        threshold: Allowed relative growth, e.g. 0.25 for 25%
+
+    Returns:
+        List of (size, stage, metric, baseline, current) of the regressions
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, metrics in stages.items():
+            baseline = baselines.get(size, {}).get(stage)
+            if not baseline:
+                continue
+            for metric, current in metrics.items():
+                if metric not in baseline:
+                    continue
+                expected = baseline[metric]
+                if metric.endswith("_requests"):
+                    regressed = current > expected
+                else:
+                    regressed = (current > expected * (1 + threshold)
+                                 and current - expected > MIN_DIFFERENCE.get(metric, 0.0))
+                if regressed:
+                    regressions.append((size, stage, metric, expected, current))
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, Dict]], baselines: Dict[str, Dict[str, Dict]]) -> None:
+    """Print the metrics per size and stage with the change in wall time against the baseline."""
+    print(f"{'size':<8} {'stage':<16} {'wall s':>8} {'cpu s':>8} {'rss MiB':>8} {'github':>7} {'pypi':>6} "
+          f"{'vs baseline':>12}")
+    for size, stages in results.items():
+        for stage, metrics in stages.items():
+            baseline = baselines.get(size, {}).get(stage, {}).get("wall_seconds")
+            change = f"{(metrics['wall_seconds'] / baseline - 1) * 100:+.0f}%" if baseline else "-"
+            print(f"{size:<8} {stage:<16} {metrics['wall_seconds']:>8.2f} {metrics['cpu_seconds']:>8.2f} "
+                  f"{metrics['peak_rss_mib']:>8.1f} {metrics['github_requests']:>7} {metrics['pypi_requests']:>6} "
+                  f"{change:>12}")
+
+
+def load_baselines(path: str) -> Dict[str, Dict[str, Dict]]:
+    """Load the baselines by size and stage, empty if the file does not exist."""
+    if not Path(path).exists():
+        return {}
+    with open(path) as f:
+        return (yaml_io.load(f) or {}).get("sizes", {})
+
+
+def save_baselines(path: str, baselines: Dict[str, Dict[str, Dict]]) -> None:
+    """Write the baselines by size and stage."""
+    with open(path, "w") as f:
+        f.write("# Per-stage metrics of benchmarks/bench_suite.py, best of the repeated runs.\n"
+                "# Times depend on the machine, record them again with --update-baselines\n"
+                "# on the machine that compares against them.\n")
+        yaml_io.dump({"sizes": baselines}, f, sort_keys=False)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the generator stages and compare with baselines")
+    parser.add_argument("--sizes", default="small",
+                        help=f"Comma separated tree sizes to run, any of: {', '.join(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per size to take the best of")
+    parser.add_argument("--baselines", default=str(DEFAULT_BASELINES), help="YAML file with the baseline metrics")
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("BENCH_THRESHOLD", "0.25")),
+                        help="Allowed relative growth of times and memory before failing, e.g. 0.25 for 25%%")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="Store the results as the baselines of the sizes run instead of comparing")
+    parser.add_argument("--output", help="File to write the results to as JSON")
+    parser.add_argument("--worker", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--root", help=argparse.SUPPRESS)
+    parser.add_argument("--pypi-index-url", help=argparse.SUPPRESS)
+    parser.add_argument("--github-api-url", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, Path(args.root), args.pypi_index_url, args.github_api_url)
+        return
+
+    logging.basicConfig(level=logging.WARNING)
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"Unknown sizes: {', '.join(unknown)}")
+
+    results = {}
+    for size in sizes:
+        packages, versions = SIZES[size]
+        results[size] = best_of([measure_size(packages, versions) for _ in range(max(1, args.repeat))])
+
+    baselines = load_baselines(args.baselines)
+    print_results(results, baselines)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baselines:
+        baselines.update(results)
+        save_baselines(args.baselines, baselines)
+        print(f"Baselines of {', '.join(sizes)} written to {args.baselines}")
+        return
+
+    missing = [size for size in sizes if size not in baselines]
+    if missing:
+        print(f"No baselines for {', '.join(missing)}, record them with --update-baselines")
+    regressions = compare(results, baselines, args.threshold)
+    for size, stage, metric, expected, current in regressions:
+        print(f"Regression in {size} {stage}: {metric} {current} against baseline {expected}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark release tarball creation and compression on a large synthetic PEX.
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from tarball import write_tarball
+
+
+def staged_tarball(tarball_path: Path, files: List[Path]) -> str:
+    """Reference implementation copying to a temp dir, tarring, then re-reading to hash."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for file_path in files:
+            shutil.copy2(file_path, Path(temp_dir) / file_path.name)
+
+        with tarfile.open(tarball_path, "w:gz") as tar:
+            for name in os.listdir(temp_dir):
+                tar.add(os.path.join(temp_dir, name), arcname=name)
+
+    sha256_hash = hashlib.sha256()
+    with open(tarball_path, "rb") as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+
+def write_synthetic_pex(path: Path, size_mb: int) -> None:
+    """Write a PEX-sized file mixing incompressible and compressible blocks, like zipped wheels."""
+    block = 1024 * 1024
+    with open(path, "wb") as f:
+        for i in range(size_mb):
+            if i % 2:
+                f.write(os.urandom(block))
+            else:
+                f.write((b"def function_%d(): return None\n" % i) * (block // 32) + b"\0" * (block % 32))
+
+
+def timed(func, *args) -> Tuple[float, str]:
+    """Run a function and return its wall time and result."""
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark release tarball creation")
+    parser.add_argument("--size-mb", type=int, default=256, help="Size of the synthetic PEX in MiB")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs to take the best of")
+    parser.add_argument("--compress-jobs", default="2,4",
+                        help="Comma separated thread counts to benchmark the parallel gzip writer with")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        pex_path = root / "package.pex"
+        write_synthetic_pex(pex_path, args.size_mb)
+        script_path = root / "package"
+        script_path.write_text("#!/bin/bash\nPEX_SCRIPT=package exec \"$(dirname \"$0\")/package.pex\" \"$@\"\n")
+        files = [pex_path, script_path]
+
+        variants = [("copy, tar, re-read", staged_tarball, root / "staged.tar.gz"),
+                    ("single pass", write_tarball, root / "streamed.tar.gz")]
+        for jobs in [int(jobs) for jobs in args.compress_jobs.split(",") if jobs.strip()]:
+            tarball_path = root / f"parallel-{jobs}.tar.gz"
+            variants.append((f"parallel gzip x{jobs}", lambda path, files, jobs=jobs: write_tarball(path, files, jobs),
+                             tarball_path))
+
+        results = []
+        for label, func, tarball_path in variants:
+            runs = [timed(func, tarball_path, files) for _ in range(args.repeat)]
+            if hashlib.sha256(tarball_path.read_bytes()).hexdigest() != runs[-1][1]:
+                raise SystemExit(f"Reported SHA256 of {tarball_path.name} does not match its contents")
+            with tarfile.open(tarball_path, "r:gz") as tar:
+                if tar.extractfile("package.pex").read() != pex_path.read_bytes():
+                    raise SystemExit(f"{tarball_path.name} does not round trip")
+            results.append((label, min(elapsed for elapsed, _ in runs), tarball_path.stat().st_size))
+
+    baseline = results[0][1]
+    print(f"{args.size_mb} MiB PEX")
+    print(f"{'':<22} {'time':>9} {'MiB/s':>8} {'size MiB':>9} {'speedup':>8}")
+    for label, elapsed, size in results:
+        print(f"{label:<22} {elapsed:>7.3f} s {args.size_mb / elapsed:>8.1f} {size / 1024 / 1024:>9.2f} "
+              f"{baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark serial, single-attempt asset uploads against concurrent, retrying uploads.
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+from asset_uploader import AssetUploader
+from standins.github_server import GitHubStandIn
+from tarball import file_sha256
+
+
+def upload_all(standin: GitHubStandIn, files: List[Path], jobs: int, retries: int) -> Tuple[float, int]:
+    """Upload every file to its own release.
+
+    Returns:
+        Tuple of (wall time in seconds, number of assets that landed intact)
+    """
+    uploader = AssetUploader("token", jobs=jobs, retries=retries, backoff=0.05, max_backoff=1.0)
+    releases = [standin.create_release(f"bench-{time.monotonic_ns()}-{i}") for i in range(len(files))]
+
+    def upload(release, path):
+        try:
+            uploader.upload(release, path, "bench.tar.gz", file_sha256(path))
+        except Exception:
+            pass
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(upload, releases, files))
+    elapsed = time.perf_counter() - start
+    uploader.close()
+
+    landed = sum(
+        standin.assets[release["id"]].get("bench.tar.gz", {}).get("digest") == f"sha256:{file_sha256(path)}"
+        for release, path in zip(releases, files)
+    )
+    return elapsed, landed
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark release asset uploads against a local stand-in")
+    parser.add_argument("--assets", type=int, default=32, help="Number of assets to upload")
+    parser.add_argument("--size-mb", type=float, default=2.0, help="Size of every asset in MiB")
+    parser.add_argument("--latency", type=float, default=0.2, help="Delay in seconds per response")
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="Fraction of uploads that fail")
+    parser.add_argument("--jobs", type=int, default=4, help="Number of concurrent uploads")
+    parser.add_argument("--retries", type=int, default=4, help="Number of retries per upload")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = []
+        for i in range(args.assets):
+            path = Path(temp_dir) / f"asset-{i}.tar.gz"
+            path.write_bytes(os.urandom(int(args.size_mb * 1024 * 1024)))
+            files.append(path)
+
+        with GitHubStandIn(latency=args.latency, failure_rate=args.failure_rate, seed=1) as standin:
+            serial = upload_all(standin, files, jobs=1, retries=0)
+            concurrent = upload_all(standin, files, jobs=args.jobs, retries=args.retries)
+
+    total_mb = args.assets * args.size_mb
+    print(f"{args.assets} assets x {args.size_mb} MiB, {args.latency} s latency, "
+          f"{args.failure_rate:.0%} injected failures")
+    for label, (elapsed, landed) in [("serial, no retries", serial),
+                                     (f"{args.jobs} jobs, {args.retries} retries", concurrent)]:
+        print(f"{label:<22} {elapsed:>7.2f} s {total_mb / elapsed:>7.1f} MiB/s  {landed}/{args.assets} landed")
+
+
+if __name__ == "__main__":
+    main()
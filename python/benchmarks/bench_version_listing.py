@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark listing PyPI versions through the JSON API against the PEP 691 Simple API.
+"""
+
+import argparse
+import logging
+import time
+import tracemalloc
+
+from pypi_client import PyPIClient
+from standins.pypi_server import PyPIStandIn, count_versions, synthetic_catalog
+
+
+APIS = ["json", "simple"]
+
+
+def list_versions(index_url: str, api: str, packages, trace: bool):
+    """List the versions of all packages with a fresh client.
+
+    Args:
+        index_url: Base URL of the PyPI JSON API
+        api: Version listing API of the client
+        packages: Names of the packages to list
+        trace: Measure the peak memory of the listing, which slows it down
+
+    Returns:
+        Tuple of the seconds taken, the peak traced memory in bytes and the flags of all versions
+    """
+    client = PyPIClient(index_url=index_url, api=api)
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    for package in packages:
+        client.get_release_versions(package)
+    seconds = time.perf_counter() - start
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    client.close()
+    return seconds, peak, client.version_info
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark listing PyPI versions by API")
+    parser.add_argument("--packages", type=int, default=20, help="Number of synthetic packages")
+    parser.add_argument("--versions", type=int, default=1000, help="Number of versions per package")
+    parser.add_argument("--prereleases", type=float, default=0.1, help="Fraction of the versions that are pre-releases")
+    parser.add_argument("--yanked", type=float, default=0.02, help="Fraction of the versions that are yanked")
+    parser.add_argument("--files-per-version", type=int, default=4, help="Number of files per version")
+    parser.add_argument("--description-size", type=int, default=50000,
+                        help="Size in bytes of the project description in JSON API documents")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated catalog")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay in seconds per PyPI response")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed listings per API, the fastest counts")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    catalog = synthetic_catalog(args.packages, args.versions, args.prereleases, args.seed)
+    with PyPIStandIn(catalog, latency=args.latency, files_per_version=args.files_per_version,
+                     yanked_ratio=args.yanked, seed=args.seed, description_size=args.description_size) as pypi:
+        versions, prereleases, yanked = count_versions(catalog, pypi.yanked)
+        print(f"{args.packages} packages, {versions} versions ({prereleases} pre-releases, {yanked} yanked), "
+              f"{args.files_per_version} files per version, {args.latency * 1000:.0f} ms latency")
+        print(f"{'api':<8} {'seconds':>8} {'ms/package':>11} {'KiB/package':>12} {'peak KiB':>9}")
+
+        results = {}
+        for api in APIS:
+            # Render every document once, so the timings exclude the stand-in building them
+            list_versions(pypi.index_url, api, catalog, trace=False)
+            bytes_before = pypi.bytes_sent
+            seconds = min(list_versions(pypi.index_url, api, catalog, trace=False)[0] for _ in range(args.repeat))
+            sent = (pypi.bytes_sent - bytes_before) / args.repeat
+            _, peak, results[api] = list_versions(pypi.index_url, api, catalog, trace=True)
+            print(f"{api:<8} {seconds:>8.3f} {seconds / len(catalog) * 1000:>11.2f} "
+                  f"{sent / len(catalog) / 1024:>12.1f} {peak / 1024:>9.0f}")
+
+        if results["json"] != results["simple"]:
+            raise SystemExit("The APIs disagree on the versions or their flags")
+
+
+if __name__ == "__main__":
+    main()
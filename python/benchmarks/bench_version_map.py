@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark mapping PyPI versions to configured Python ranges in generate_state.py.
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+import semver
+
+from generate_state import StateGenerator
+import pep440
+
+
+def nested_loop_version_map(versions_config: List[Dict], all_versions: List[str]) -> Dict[str, str]:
+    """Reference implementation comparing every range against every other range and version."""
+    version_map = {}
+    for version_info in versions_config:
+        version = version_info["version"]
+        python_version = version_info["python"]
+
+        next_version = None
+        for v in versions_config:
+            if semver.compare(v["version"], version) > 0:
+                if next_version is None or semver.compare(v["version"], next_version) < 0:
+                    next_version = v["version"]
+
+        for v in all_versions:
+            if semver.compare(v, version) >= 0 and (next_version is None or semver.compare(v, next_version) < 0):
+                version_map[v] = python_version
+
+    return version_map
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the version to Python range mapping")
+    parser.add_argument("--versions", type=int, default=5000, help="Number of PyPI versions")
+    parser.add_argument("--ranges", type=int, default=40, help="Number of configured ranges")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    all_versions = set()
+    while len(all_versions) < args.versions:
+        version = f"{rng.randrange(30)}.{rng.randrange(40)}.{rng.randrange(20)}"
+        if rng.random() < 0.1:
+            version += f"-rc.{rng.randrange(5)}"
+        all_versions.add(version)
+    all_versions = sorted(all_versions, key=lambda v: semver.Version.parse(v))
+
+    versions_config = [
+        {"version": version, "python": f"3.{9 + i % 4}"}
+        for i, version in enumerate(sorted(rng.sample(all_versions, args.ranges), key=lambda v: semver.Version.parse(v)))
+    ]
+
+    start = time.perf_counter()
+    expected = nested_loop_version_map(versions_config, all_versions)
+    nested_elapsed = time.perf_counter() - start
+
+    pep440.parse.cache_clear()
+    start = time.perf_counter()
+    actual = StateGenerator.build_version_map(versions_config, all_versions)
+    interval_elapsed = time.perf_counter() - start
+
+    if list(actual.items()) != list(expected.items()):
+        raise SystemExit("Interval index result differs from the nested loop result")
+
+    print(f"{args.versions} versions, {args.ranges} ranges")
+    print(f"nested loop:    {nested_elapsed * 1000:>10.1f} ms")
+    print(f"interval index: {interval_elapsed * 1000:>10.1f} ms")
+    print(f"speedup:        {nested_elapsed / interval_elapsed:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
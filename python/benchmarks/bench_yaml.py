@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading and saving large state files with the pure-Python YAML implementation and with yaml_io.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+import yaml_io
+from benchmarks.synthetic_tree import write_package_tree
+from release_snapshot import parse_release_info
+
+
+def best_of(repeat: int, function) -> float:
+    """Run a function repeatedly.
+
+    Args:
+        repeat: Number of runs
+        function: Function to run without arguments
+
+    Returns:
+        Seconds taken by the fastest run
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark YAML loading and saving of large state files")
+    parser.add_argument("--packages", type=int, default=3, help="Number of synthetic packages")
+    parser.add_argument("--versions", type=int, default=1000, help="Number of versions per package")
+    parser.add_argument("--repeat", type=int, default=2, help="Number of runs per operation, the fastest counts")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        packages = write_package_tree(root, args.packages, args.versions)
+        texts = [(root / "python" / package / "state.yaml").read_text() for package in packages]
+
+    documents = [yaml.safe_load(text) for text in texts]
+    bodies = [
+        f"```yaml\n{yaml.dump(version['release_info'], default_flow_style=False)}```"
+        for document in documents for version in document["versions"]
+    ]
+    size = sum(len(text) for text in texts)
+
+    for document, text in zip(documents, texts):
+        if yaml_io.load(text) != document or yaml_io.dump(document) != text:
+            raise SystemExit("yaml_io does not round-trip the state files byte for byte")
+
+    operations = [
+        ("load state", lambda: [yaml.safe_load(text) for text in texts],
+         lambda: [yaml_io.load(text) for text in texts]),
+        ("dump state", lambda: [yaml.dump(document, default_flow_style=False) for document in documents],
+         lambda: [yaml_io.dump(document) for document in documents]),
+        ("release bodies", lambda: [yaml.safe_load(body[8:-3]) for body in bodies],
+         lambda: [parse_release_info(body) for body in bodies]),
+    ]
+
+    print(f"{args.packages} state files of {args.versions} versions, {size / 1024 / 1024:.1f} MiB, "
+          f"{len(bodies)} release bodies, libyaml {'available' if yaml_io.LIBYAML else 'not available'}")
+    print(f"{'operation':<16} {'pure s':>8} {'yaml_io s':>10} {'speedup':>8}")
+    for name, pure, fast in operations:
+        pure_seconds = best_of(args.repeat, pure)
+        fast_seconds = best_of(args.repeat, fast)
+        print(f"{name:<16} {pure_seconds:>8.3f} {fast_seconds:>10.3f} {pure_seconds / fast_seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Generate synthetic package trees shaped like python/<pkg>/ for benchmarks.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import List
+
+import yaml_io
+
+
+PLATFORMS = ["linux-amd64", "linux-arm64", "darwin-amd64", "darwin-arm64"]
+
+
+def synthetic_versions(count: int) -> List[str]:
+    """Generate ascending version strings.
+
+    Args:
+        count: Number of versions
+
+    Returns:
+        List of versions like 1.0.0, 1.0.1, ...
+    """
+    return [f"{1 + i // 400}.{i // 20 % 20}.{i % 20}" for i in range(count)]
+
+
+def write_package_tree(root: Path, packages: int, versions: int, python_version: str = "3.11") -> List[str]:
+    """Write config, completed state and lock files for synthetic packages.
+
+    Every version has requirements, a release and all platform assets, so
+    a pipeline run over the tree has nothing left to do.
+
+    Args:
+        root: Directory to create python/ in
+        packages: Number of packages
+        versions: Number of versions per package
+        python_version: Python version of every version
+
+    Returns:
+        List of package directory names
+    """
+    package_names = []
+    for i in range(packages):
+        package_name = f"package-{i}"
+        package_path = root / "python" / package_name
+        package_path.mkdir(parents=True, exist_ok=True)
+        binaries = [package_name]
+
+        config = {
+            "package": package_name,
+            "description": f"Synthetic package {i}",
+            "binaries": binaries,
+            "versions": [{"version": "1.0.0", "python": python_version}],
+        }
+        with open(package_path / "config.yaml", "w") as f:
+            yaml_io.dump(config, f)
+
+        state_versions = []
+        for version in synthetic_versions(versions):
+            version_path = package_path / version
+            version_path.mkdir(exist_ok=True)
+            (version_path / "requirements.in").write_text(f"{package_name}=={version}\n")
+            (version_path / "requirements.txt").write_text(f"{package_name}=={version}\n")
+
+            assets = {
+                f"{package_name}-{platform}.tar.gz": hashlib.sha256(f"{package_name}-{version}-{platform}".encode()).hexdigest()
+                for platform in PLATFORMS
+            }
+            build_info = {
+                "package": package_name,
+                "extra_packages": [],
+                "config_version": 1,
+                "python": python_version,
+                "version": version,
+                "binaries": binaries,
+            }
+            state_versions.append({
+                "version": version,
+                "python": python_version,
+                "requirements": True,
+                "release": True,
+                "assets": assets,
+                "release_info": {"build_info": build_info, "asset_info": dict(assets)},
+            })
+
+        with open(package_path / "state.yaml", "w") as f:
+            yaml_io.dump({"config_version": 1, "versions": state_versions}, f)
+
+        package_names.append(package_name)
+
+    return package_names
@@ -0,0 +1,206 @@
+"""
+Build cache storing PEX files and tarballs by a fingerprint of their inputs.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def link_or_copy(source: Path, target: Path) -> None:
+    """Hard link a file to a new path, copying it if linking is not possible.
+
+    An existing target is removed first, so the file it may be linked to
+    is never written through.
+
+    Args:
+        source: Existing file
+        target: Path to create
+    """
+    try:
+        target.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(source, target)
+    except OSError:
+        # Different file system or no hard link support
+        shutil.copy2(source, target)
+
+
+class BuildCache:
+    """Local directory store for build artifacts keyed by input fingerprint.
+
+    The fingerprint covers everything that determines the PEX: the package,
+    the locked requirements, the Python version, the pex version, the
+    platform and the binaries. When none of them changed the stored PEX and tarball are
+    reused, including after a release has been recreated. Artifacts are hard
+    linked in and out of the cache, so they take no extra disk space while
+    the built files exist, and the least recently used entries are evicted
+    above a total size. The directory can be kept between runs.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024):
+        """Initialize the build cache.
+
+        Args:
+            cache_dir: Directory to store the artifacts in
+            max_bytes: Maximum total size of the cache before entries are evicted
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger('build_cache')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(package_name: str, requirements_file: Path, python_version: str, pex_version: str,
+                    os_name: str, arch_name: str, binaries: List[str]) -> str:
+        """Compute the fingerprint of the inputs of a build.
+
+        The artifacts are named after the package and the scripts call its
+        binaries, so packages with the same lock file do not share entries.
+
+        Args:
+            package_name: Name of the package the artifacts are built for
+            requirements_file: Path to the locked requirements.txt
+            python_version: Python version to build with
+            pex_version: Version of pex used to build
+            os_name: Operating system name
+            arch_name: Architecture name
+            binaries: List of binary names
+
+        Returns:
+            Hex encoded SHA256 of the inputs
+        """
+        inputs = {
+            "package": package_name,
+            "requirements_sha256": hashlib.sha256(requirements_file.read_bytes()).hexdigest(),
+            "python": str(python_version),
+            "pex": pex_version,
+            "os": os_name,
+            "arch": arch_name,
+            "binaries": list(binaries),
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        """Get the directory of a cache entry."""
+        return self.cache_dir / key[:2] / key
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Look up the artifacts of a build.
+
+        Args:
+            key: Fingerprint of the build inputs
+
+        Returns:
+            Dict with "pex", "tarball" paths and "sha256" of the tarball, or None if not cached
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(entry_dir / "meta.json", "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+
+        if meta is None or not (entry_dir / meta["pex"]).exists() or not (entry_dir / meta["tarball"]).exists():
+            self._record(hit=False)
+            return None
+
+        pex_path = entry_dir / meta["pex"]
+        tarball_path = entry_dir / meta["tarball"]
+        # Mark the entry as recently used, so it is evicted last
+        now = time.time()
+        try:
+            os.utime(entry_dir, (now, now))
+        except FileNotFoundError:
+            pass
+        self._record(hit=True)
+        return {"pex": pex_path, "tarball": tarball_path, "sha256": meta["sha256"]}
+
+    def _record(self, hit: bool) -> None:
+        """Count a cache hit or miss."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key: str, pex_path: Path, tarball_path: Path, tarball_hash: str) -> None:
+        """Store the artifacts of a build.
+
+        Args:
+            key: Fingerprint of the build inputs
+            pex_path: Path to the built PEX file
+            tarball_path: Path to the created tarball
+            tarball_hash: SHA256 hash of the tarball
+        """
+        entry_dir = self._entry_dir(key)
+        if entry_dir.exists():
+            return
+        entry_dir.parent.mkdir(parents=True, exist_ok=True)
+
+        # Stage the entry next to its final location and move it in place at once
+        staging_dir = Path(tempfile.mkdtemp(dir=entry_dir.parent, prefix=f".{key}-"))
+        try:
+            link_or_copy(pex_path, staging_dir / pex_path.name)
+            link_or_copy(tarball_path, staging_dir / tarball_path.name)
+            with open(staging_dir / "meta.json", "w") as f:
+                json.dump({"pex": pex_path.name, "tarball": tarball_path.name, "sha256": tarball_hash}, f)
+            os.rename(staging_dir, entry_dir)
+            self.logger.debug(f"Stored build {key} in {entry_dir}")
+        except OSError as e:
+            # Another build stored the same key first
+            self.logger.debug(f"Could not store build {key}: {e}")
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _entries(self) -> List[Path]:
+        """List the entry directories in the cache."""
+        return [entry for entry in self.cache_dir.glob("??/*") if entry.is_dir() and not entry.name.startswith(".")]
+
+    def prune(self) -> int:
+        """Evict the least recently used entries until the cache fits in max_bytes.
+
+        Returns:
+            Number of evicted entries
+        """
+        sized = []
+        for entry in self._entries():
+            try:
+                size = sum(path.stat().st_size for path in entry.iterdir())
+                sized.append((entry.stat().st_mtime, size, entry))
+            except FileNotFoundError:
+                continue
+
+        total_bytes = sum(size for _, size, _ in sized)
+        evicted = 0
+        for _, size, entry in sorted(sized, key=lambda item: item[0]):
+            if total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_bytes -= size
+            evicted += 1
+
+        if evicted:
+            self.logger.info(f"Evicted {evicted} build cache entries, {total_bytes / 1024 / 1024:.1f} MiB left")
+        return evicted
+
+    def summary(self) -> str:
+        """Describe the hit and miss counters.
+
+        Returns:
+            Human readable summary
+        """
+        return f"Build cache: {self.hits} hits, {self.misses} misses"
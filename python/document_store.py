@@ -0,0 +1,118 @@
+"""
+YAML document store shared by the generators for config, state and asset files.
+"""
+
+import copy
+import fnmatch
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import yaml_io
+
+
+class DocumentStore:
+    """Load and save the YAML documents under the package directory.
+
+    Parsed documents are cached, so a file read by one generator is not
+    parsed again by the next one in the same process. By default writes go
+    straight to disk. A deferred store keeps writes in memory until flush()
+    is called, which lets the pipeline runner write each file once per
+    checkpoint instead of once per stage.
+    """
+
+    def __init__(self, deferred: bool = False):
+        """Initialize the document store.
+
+        Args:
+            deferred: Keep writes in memory until flush() is called
+        """
+        self.deferred = deferred
+        self.logger = logging.getLogger('document_store')
+        self._documents: Dict[Path, Any] = {}
+        self._dirty: Dict[Path, bool] = {}
+
+    def exists(self, path: Union[str, Path]) -> bool:
+        """Check if a document exists in memory or on disk.
+
+        Args:
+            path: Path of the YAML file
+
+        Returns:
+            True if the document exists, False otherwise
+        """
+        path = Path(path)
+        return path in self._documents or path.exists()
+
+    def load(self, path: Union[str, Path]) -> Any:
+        """Load a YAML document.
+
+        Callers get their own copy, so changes only become visible to other
+        callers once they are saved.
+
+        Args:
+            path: Path of the YAML file
+
+        Returns:
+            The parsed document
+        """
+        path = Path(path)
+        if path not in self._documents:
+            with open(path, "r") as f:
+                self._documents[path] = yaml_io.load(f)
+
+        return copy.deepcopy(self._documents[path])
+
+    def save(self, path: Union[str, Path], document: Any) -> None:
+        """Save a YAML document.
+
+        Args:
+            path: Path of the YAML file
+            document: Document to save
+        """
+        path = Path(path)
+        self._documents[path] = copy.deepcopy(document)
+        self._dirty[path] = True
+
+        if not self.deferred:
+            self._write(path)
+
+    def glob(self, directory: Union[str, Path], pattern: str) -> List[Path]:
+        """Find documents in a directory matching a pattern, including unsaved ones.
+
+        Args:
+            directory: Directory to search
+            pattern: Glob pattern for the file name
+
+        Returns:
+            Sorted list of matching paths
+        """
+        directory = Path(directory)
+        paths = set(directory.glob(pattern))
+        paths.update(path for path in self._documents
+                     if path.parent == directory and fnmatch.fnmatch(path.name, pattern))
+        return sorted(paths)
+
+    def flush(self) -> int:
+        """Write all documents changed since the last flush to disk.
+
+        Returns:
+            Number of files written
+        """
+        dirty = [path for path, is_dirty in self._dirty.items() if is_dirty]
+        for path in dirty:
+            self._write(path)
+
+        if dirty and self.deferred:
+            self.logger.info(f"Flushed {len(dirty)} documents to disk")
+        return len(dirty)
+
+    def _write(self, path: Path) -> None:
+        """Write a single document to disk.
+
+        Args:
+            path: Path of the YAML file
+        """
+        with open(path, "w") as f:
+            yaml_io.dump(self._documents[path], f)
+        self._dirty[path] = False
@@ -4,27 +4,37 @@ Generate build information for Python packages and update GitHub release descrip
 """
 
 import argparse
+import glob
 import os
 import sys
 import logging
 import re
-import glob
 from pathlib import Path
 from typing import Dict, Optional, List
-import yaml
-from github import Github, GithubException
+from github import GithubException
+from api_metrics import METRICS
+from document_store import DocumentStore
+from github_client import GitHubClient
+from release_snapshot import ReleaseSnapshot
+import yaml_io
 
 
 class BuildInfoGenerator:
     """Generate build information for Python packages and update GitHub release descriptions."""
 
-    def __init__(self, package_dir: str, github_repo: str, github_token: Optional[str] = None):
+    def __init__(self, package_dir: str, github_repo: str, github_token: Optional[str] = None,
+                 github: Optional[GitHubClient] = None, documents: Optional[DocumentStore] = None,
+                 snapshot: Optional[ReleaseSnapshot] = None, github_api_url: Optional[str] = None):
         """Initialize the build info generator.
 
         Args:
             package_dir: Directory containing the package configurations
             github_repo: GitHub repository name (owner/repo)
             github_token: GitHub token for authentication
+            github: Shared GitHub client, created from github_token if None
+            documents: Shared document store, a write-through store if None
+            snapshot: Release snapshot to look releases up in and record changes to, kept in memory if None
+            github_api_url: Base URL of the GitHub REST API, e.g. of a local stand-in, the public API if None
         """
         self.package_dir = Path(package_dir)
         self.github_repo = github_repo
@@ -37,7 +47,9 @@ class BuildInfoGenerator:
             sys.exit(1)
         
         # Initialize GitHub client
-        self.github = Github(self.github_token)
+        self.github = github or GitHubClient(self.github_token, stage="build_info", base_url=github_api_url)
+        self.documents = documents or DocumentStore()
+        self.snapshot = snapshot or ReleaseSnapshot(github_repo=github_repo)
         self.logger.info(f"BuildInfoGenerator initialized for repo: {github_repo}")
 
     def load_config(self, package_name: str) -> Dict:
@@ -54,8 +66,7 @@ class BuildInfoGenerator:
             self.logger.error(f"Config file not found: {config_path}")
             sys.exit(1)
         
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
+        config = self.documents.load(config_path)
             
         # If package name is not specified in config, use directory name
         if "package" not in config:
@@ -75,8 +86,7 @@ class BuildInfoGenerator:
         state_path = self.package_dir / package_name / "state.yaml"
         
         # Check for platform-specific asset files
-        asset_pattern = str(self.package_dir / package_name / "asset-*.yaml")
-        asset_files = glob.glob(asset_pattern)
+        asset_files = self.documents.glob(self.package_dir / package_name, "asset-*.yaml")
         
         if asset_files:
             self.logger.info(f"Found {len(asset_files)} platform-specific asset files for {package_name}")
@@ -85,8 +95,7 @@ class BuildInfoGenerator:
             merged_state = None
             for asset_file in asset_files:
                 self.logger.debug(f"Loading asset file: {asset_file}")
-                with open(asset_file, "r") as f:
-                    asset_state = yaml.safe_load(f)
+                asset_state = self.documents.load(asset_file)
                 
                 if merged_state is None:
                     merged_state = asset_state
@@ -105,19 +114,17 @@ class BuildInfoGenerator:
                                 merged_state['versions'][i]['assets'].update(asset_versions[version]['assets'])
             
             # Save the merged state to state.yaml
-            with open(state_path, "w") as f:
-                yaml.dump(merged_state, f, default_flow_style=False)
+            self.documents.save(state_path, merged_state)
             
             self.logger.info(f"Merged platform-specific assets into {state_path}")
             return merged_state
         
         # Fall back to state.yaml if no asset files found
-        if not state_path.exists():
+        if not self.documents.exists(state_path):
             self.logger.error(f"State file not found: {state_path}")
             sys.exit(1)
         
-        with open(state_path, "r") as f:
-            state = yaml.safe_load(f)
+        state = self.documents.load(state_path)
             
         return state
 
@@ -197,26 +204,31 @@ class BuildInfoGenerator:
                 else:
                     self.logger.info(f"Asset information for {tag_name} has changed, updating release description")
             
-            # Get the repository
-            repo = self.github.get_repo(self.github_repo)
-            
+            # Get the release, from the snapshot if it is listed there
             try:
-                release = repo.get_release(tag_name)
+                release = self.snapshot.get_release(self.github, tag_name)
             except GithubException:
                 self.logger.error(f"Release {tag_name} not found")
                 return False
             
             # Convert to YAML string
-            release_info_yaml = yaml.dump(release_info, default_flow_style=False)
+            release_info_yaml = yaml_io.dump(release_info)
 
             is_prerelease = not self.check_version_complete(asset_info, package_name, version)
 
             # Update release description
-            release.update_release(
-                name=release.title,
-                message=f"```yaml\n{release_info_yaml}```",
-                prerelease=is_prerelease
-            )
+            try:
+                release.update_release(
+                    name=release.title,
+                    message=f"```yaml\n{release_info_yaml}```",
+                    prerelease=is_prerelease
+                )
+            except GithubException as e:
+                # The snapshot may list a release that was deleted since
+                if e.status == 404:
+                    self.snapshot.remove(tag_name)
+                raise
+            self.snapshot.update(tag_name, release_info=release_info, prerelease=is_prerelease)
             
             self.logger.info(f"Updated release description for {tag_name} prerelease={is_prerelease}")
             return True
@@ -287,6 +299,17 @@ def main():
     parser.add_argument("--github-token", help="GitHub token for authentication")
     parser.add_argument("--github-repo", default="vgijssel/hermit-python-packages",
                         help="GitHub repository name (owner/repo)")
+    parser.add_argument("--github-api-url", default=os.environ.get("GITHUB_API_URL", "https://api.github.com"),
+                        help="Base URL of the GitHub REST API, e.g. of a local stand-in")
+    parser.add_argument("--release-snapshot",
+                        default=os.environ.get("RELEASE_SNAPSHOT", "python/release-snapshot.json"),
+                        help="File the state stage saved the releases to, updated with the new descriptions")
+    parser.add_argument("--merge-release-snapshots", nargs="*",
+                        default=os.environ.get("MERGE_RELEASE_SNAPSHOTS", "").split(),
+                        help="Snapshots saved by the build jobs or glob patterns of them, "
+                             "their asset changes are merged in first")
+    parser.add_argument("--api-metrics", default=os.environ.get("API_METRICS_FILE"),
+                        help="File to write the API calls made to as JSON on exit")
     parser.add_argument("--log-level", default="INFO", 
                         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
                         help="Set the logging level")
@@ -300,6 +323,8 @@ def main():
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     logger = logging.getLogger('build_info_generator')
+    METRICS.stage = "build_info"
+    METRICS.dump_at_exit(args.api_metrics)
     
     package_dir = Path("python")
     if not package_dir.exists():
@@ -310,16 +335,26 @@ def main():
         generator = BuildInfoGenerator(
             package_dir=package_dir,
             github_token=args.github_token,
-            github_repo=args.github_repo
+            github_repo=args.github_repo,
+            github_api_url=args.github_api_url,
+            snapshot=ReleaseSnapshot(args.release_snapshot, args.github_repo)
         )
+        merge_paths = sorted({path for pattern in args.merge_release_snapshots for path in glob.glob(pattern)})
+        if merge_paths:
+            generator.snapshot.merge(merge_paths)
         
         success = True
         for package in args.package:
             logger.info(f"Processing package: {package}")
-            if not generator.process_package(package):
-                logger.error(f"Failed to process package {package}")
-                success = False
+            with METRICS.package_context(package):
+                if not generator.process_package(package):
+                    logger.error(f"Failed to process package {package}")
+                    success = False
+        generator.snapshot.save()
         
+        logger.info(generator.snapshot.summary())
+        logger.info(generator.github.summary())
+        logger.info(METRICS.summary())
         if not success:
             sys.exit(1)
     except Exception as e:
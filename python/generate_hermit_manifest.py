@@ -9,22 +9,25 @@ import sys
 import logging
 from pathlib import Path
 from typing import Dict, List, Set, Optional
-import yaml
+from document_store import DocumentStore
 from jinja2 import Template
+import pep440
 
 
 class HermitManifestGenerator:
     """Generate Hermit manifest files for Python packages based on state.yaml files."""
 
-    def __init__(self, package_dir: str):
+    def __init__(self, package_dir: str, documents: Optional[DocumentStore] = None):
         """Initialize the Hermit manifest generator.
 
         Args:
             package_dir: Directory containing the package configurations
+            documents: Shared document store, a write-through store if None
         """
         self.package_dir = Path(package_dir)
         self.repo_root = Path.cwd()
         self.logger = logging.getLogger('hermit_manifest_generator')
+        self.documents = documents or DocumentStore()
 
     def load_config(self, package_name: str) -> Dict:
         """Load the package configuration from config.yaml.
@@ -40,8 +43,7 @@ class HermitManifestGenerator:
             self.logger.error(f"Config file not found: {config_path}")
             sys.exit(1)
         
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
+        config = self.documents.load(config_path)
             
         # If package name is not specified in config, use directory name
         if "package" not in config:
@@ -59,12 +61,11 @@ class HermitManifestGenerator:
             Dict containing the package state
         """
         state_path = self.package_dir / package_name / "state.yaml"
-        if not state_path.exists():
+        if not self.documents.exists(state_path):
             self.logger.error(f"State file not found: {state_path}")
             sys.exit(1)
         
-        with open(state_path, "r") as f:
-            state = yaml.safe_load(f)
+        state = self.documents.load(state_path)
             
         return state
 
@@ -169,8 +170,8 @@ sha256sums = {
                 self.logger.warning(f"No complete versions found for {package_name}")
                 return True
             
-            # sort complete versions by version key inside the dict
-            complete_versions = sorted(complete_versions, key=lambda x: x['version'], reverse=True)
+            # sort complete versions by PEP 440 order of the version key inside the dict
+            complete_versions = sorted(complete_versions, key=lambda x: pep440.parse(str(x['version'])), reverse=True)
 
             self.logger.info(f"Found {len(complete_versions)} complete versions: {', '.join([v['version'] for v in complete_versions])}")
 
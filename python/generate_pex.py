@@ -4,25 +4,38 @@ Generate PEX files for Python packages based on state.yaml files.
 """
 
 import argparse
-import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import os
 import platform
 import subprocess
 import sys
-import tarfile
-import tempfile
 import logging
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
-import shutil
-import yaml
-from github import Github, GithubException
+from github.GitRelease import GitRelease
+from api_metrics import METRICS
+from asset_uploader import AssetUploader
+from document_store import DocumentStore
+from github_client import GitHubClient
+from build_cache import BuildCache, link_or_copy
+from release_snapshot import ReleaseSnapshot
+from tarball import file_sha256, write_tarball
+from wheel_cache import WheelCache
+
+
+# Version of pex used to build, part of the build cache fingerprint
+PEX_VERSION = "2.37.0"
 
 
 class PexGenerator:
     """Generate PEX files for Python packages based on state.yaml files."""
 
-    def __init__(self, package_dir: str, dist_dir: str, tmp_dir: str, github_repo: str, github_token: Optional[str] = None):
+    def __init__(self, package_dir: str, dist_dir: str, tmp_dir: str, github_repo: str, github_token: Optional[str] = None,
+                 github: Optional[GitHubClient] = None, documents: Optional[DocumentStore] = None,
+                 build_jobs: Optional[int] = None, wheel_cache: Optional[WheelCache] = None,
+                 build_cache: Optional[BuildCache] = None, compress_jobs: int = 1, rebuild: bool = False,
+                 uploader: Optional[AssetUploader] = None, snapshot: Optional[ReleaseSnapshot] = None,
+                 github_api_url: Optional[str] = None):
         """Initialize the PEX generator.
 
         Args:
@@ -31,12 +44,25 @@ class PexGenerator:
             tmp_dir: Directory for temporary files
             github_repo: GitHub repository name (owner/repo)
             github_token: GitHub token for authentication
+            github: Shared GitHub client, created from github_token if None
+            documents: Shared document store, a write-through store if None
+            build_jobs: Number of versions to build concurrently, defaults to the CPU count
+            wheel_cache: Wheel cache shared by all builds, created under tmp_dir if None
+            build_cache: Store of built artifacts by input fingerprint, created under tmp_dir if None
+            compress_jobs: Number of threads compressing each tarball, 1 uses the standard gzip writer
+            rebuild: Also build versions that already have an asset, only uploading changed tarballs
+            uploader: Uploader of release assets, created from github_token if None
+            snapshot: Release snapshot to look releases and assets up in, kept in memory if None
+            github_api_url: Base URL of the GitHub REST API, e.g. of a local stand-in, the public API if None
         """
         self.package_dir = Path(package_dir)
         self.dist_dir = Path(dist_dir)
         self.tmp_dir = Path(tmp_dir)
         self.github_repo = github_repo
         self.github_token = github_token or os.environ.get("GITHUB_TOKEN")
+        self.build_jobs = max(1, build_jobs or os.cpu_count() or 1)
+        self.compress_jobs = max(1, compress_jobs)
+        self.rebuild = rebuild
         self.logger = logging.getLogger('pex_generator')
         
         # Hard failure if GitHub token is missing
@@ -47,6 +73,9 @@ class PexGenerator:
         # Create directories if they don't exist
         self.dist_dir.mkdir(parents=True, exist_ok=True)
         self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.wheel_cache = wheel_cache or WheelCache(self.tmp_dir / "wheel-cache")
+        self.build_cache = build_cache or BuildCache(self.tmp_dir / "build-cache")
+        self.uploader = uploader or AssetUploader(self.github_token)
 
         # Get OS and architecture information
         os_name = platform.system().lower()
@@ -63,7 +92,11 @@ class PexGenerator:
         self.logger.info(f"Platform detected: {self.os_name}-{self.arch_name}")
         
         # Initialize GitHub client
-        self.github = Github(self.github_token)
+        self.github = github or GitHubClient(self.github_token, stage="build", base_url=github_api_url)
+        self.documents = documents or DocumentStore()
+        self.snapshot = snapshot or ReleaseSnapshot(github_repo=github_repo)
+        if self.uploader.client is None:
+            self.uploader.client = self.github
         self.logger.info(f"PexGenerator initialized for repo: {github_repo}")
 
     def load_config(self, package_name: str) -> Dict:
@@ -74,14 +107,15 @@ class PexGenerator:
             
         Returns:
             Dict containing the package configuration
+
+        Raises:
+            FileNotFoundError: If the package has no config.yaml
         """
         config_path = self.package_dir / package_name / "config.yaml"
         if not config_path.exists():
-            self.logger.error(f"Config file not found: {config_path}")
-            sys.exit(1)
+            raise FileNotFoundError(f"Config file not found: {config_path}")
         
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
+        config = self.documents.load(config_path)
             
         # If package name is not specified in config, use directory name
         if "package" not in config:
@@ -97,14 +131,15 @@ class PexGenerator:
             
         Returns:
             Dict containing the package state
+
+        Raises:
+            FileNotFoundError: If the package has no state.yaml
         """
         state_path = self.package_dir / package_name / "state.yaml"
-        if not state_path.exists():
-            self.logger.error(f"State file not found: {state_path}")
-            sys.exit(1)
+        if not self.documents.exists(state_path):
+            raise FileNotFoundError(f"State file not found: {state_path}")
         
-        with open(state_path, "r") as f:
-            state = yaml.safe_load(f)
+        state = self.documents.load(state_path)
             
         return state
 
@@ -119,11 +154,36 @@ class PexGenerator:
         asset_filename = f"asset-{self.os_name}-{self.arch_name}.yaml"
         asset_path = self.package_dir / package_name / asset_filename
         
-        with open(asset_path, "w") as f:
-            yaml.dump(state, f, default_flow_style=False)
+        self.documents.save(asset_path, state)
         
         self.logger.info(f"Platform-specific asset state saved to {asset_path}")
 
+    def get_pex_path(self, package_name: str, version: str, python_version: str) -> Path:
+        """Get the path of the PEX file for the specified package version.
+        
+        Args:
+            package_name: Name of the package
+            version: Version of the package
+            python_version: Python version to use
+            
+        Returns:
+            Path to the PEX file
+        """
+        pex_filename = f"{package_name}.pex"
+        return self.dist_dir / "python" / str(python_version) / package_name / str(version) / pex_filename
+
+    def get_tarball_path(self, package_name: str, pex_path: Path) -> Path:
+        """Get the path of the tarball holding a PEX file and its binary scripts.
+
+        Args:
+            package_name: Name of the package
+            pex_path: Path to the PEX file
+
+        Returns:
+            Path to the tarball, named after the OS and architecture
+        """
+        return pex_path.parent / f"{package_name}-{self.os_name}-{self.arch_name}.tar.gz"
+
     def build_pex(self, package_name: str, version: str, python_version: str) -> Path:
         """Build a PEX file for the specified package version.
         
@@ -134,14 +194,11 @@ class PexGenerator:
             
         Returns:
             Path to the built PEX file
-        """
-        pex_filename = f"{package_name}.pex"
-        pex_path = self.dist_dir / "python" / str(python_version) / package_name / str(version) / pex_filename
 
-        # Skip if PEX file already exists
-        if pex_path.exists():
-            self.logger.info(f"PEX file already exists: {pex_path}")
-            return pex_path
+        Raises:
+            FileNotFoundError: If the version has no requirements.txt, only failing this version
+        """
+        pex_path = self.get_pex_path(package_name, version, python_version)
         
         self.logger.info(f"Building PEX for {package_name}=={version} with Python {python_version}")
         
@@ -150,12 +207,14 @@ class PexGenerator:
         req_txt_file = version_dir / "requirements.txt"
         
         if not req_txt_file.exists():
-            self.logger.error(f"Requirements file not found: {req_txt_file}")
-            sys.exit(1)
+            raise FileNotFoundError(f"Requirements file not found: {req_txt_file}")
 
         # Ensure the output directory exists
         pex_path.parent.mkdir(parents=True, exist_ok=True)
 
+        hits, misses = self.wheel_cache.lookup(req_txt_file)
+        self.logger.info(f"Wheel cache for {package_name}=={version}: {hits} hits, {misses} misses")
+
         # Run uv tool to create PEX file
         cmd = [
             "uv",
@@ -166,16 +225,18 @@ class PexGenerator:
             "--isolated",
             "--managed-python",
             "--from",
-            "pex==2.37.0",
+            f"pex=={PEX_VERSION}",
             "pex",
             "-r", str(req_txt_file),
             "-o", str(pex_path),
+            *self.wheel_cache.pex_args(),
         ]
             
         try:
             self.logger.debug(f"Running command: {' '.join(cmd)}")
             subprocess.run(cmd, check=True, capture_output=True)
             self.logger.info(f"Successfully built PEX: {pex_path}")
+            self.wheel_cache.refresh()
             return pex_path
         except subprocess.CalledProcessError as e:
             if hasattr(e, 'stderr') and e.stderr:
@@ -235,49 +296,100 @@ PEX_SCRIPT={binary} exec "$SCRIPT_DIR/{pex_path.name}" "$@"
         Returns:
             Tuple of (path to the created tarball, SHA256 hash of the tarball)
         """
-        # Create tarball filename with OS and architecture
-        tarball_filename = f"{package_name}-{self.os_name}-{self.arch_name}.tar.gz"
-        tarball_path = pex_path.parent / tarball_filename
+        tarball_path = self.get_tarball_path(package_name, pex_path)
         
-        # Create a temporary directory to stage files
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_dir_path = Path(temp_dir)
-            
-            # Copy PEX file to temp directory
-            shutil.copy2(pex_path, temp_dir_path / pex_path.name)
-            
-            # Copy binary scripts to temp directory
-            for script_path in script_paths:
-                shutil.copy2(script_path, temp_dir_path / script_path.name)
-            
-            # Create tarball
-            with tarfile.open(tarball_path, "w:gz") as tar:
-                for file_path in os.listdir(temp_dir):
-                    tar.add(os.path.join(temp_dir, file_path), arcname=file_path)
-            
-            self.logger.info(f"Created tarball: {tarball_path}")
-            
-            # Calculate SHA256 hash of the tarball
-            sha256_hash = hashlib.sha256()
-            with open(tarball_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    sha256_hash.update(chunk)
-            
-            tarball_hash = sha256_hash.hexdigest()
-            self.logger.debug(f"SHA256 hash: {tarball_hash}")
-            
-            # No longer writing hash to file
-            self.logger.info(f"Calculated SHA256 hash: {tarball_hash}")
-            
-            return tarball_path, tarball_hash
+        # Stream the PEX and scripts straight into the tarball, hashing as it is written
+        tarball_hash = write_tarball(tarball_path, [pex_path, *script_paths], compress_jobs=self.compress_jobs)
+        self.logger.info(f"Created tarball: {tarball_path}")
+        self.logger.info(f"Calculated SHA256 hash: {tarball_hash}")
+        
+        return tarball_path, tarball_hash
+
+    def build_version(self, package_name: str, version: str, python_version: str, binaries: List[str]) -> Tuple[Path, str]:
+        """Build the PEX, binary scripts and tarball for a single version.
+
+        Versions share no files, so this is safe to run concurrently for
+        different versions of a package. Artifacts built before from the
+        same inputs are taken from the build cache instead of rebuilding.
+
+        Args:
+            package_name: Name of the package
+            version: Version of the package
+            python_version: Python version to use
+            binaries: List of binary names to create scripts for
+
+        Returns:
+            Tuple of (path to the created tarball, SHA256 hash of the tarball)
+        """
+        req_txt_file = self.package_dir / package_name / version / "requirements.txt"
+        if not req_txt_file.exists():
+            # Let build_pex report the missing requirements
+            pex_path = self.build_pex(package_name, version, python_version)
+            script_paths = self.create_binary_scripts(pex_path, package_name, binaries)
+            return self.create_tarball(package_name, pex_path, script_paths)
+
+        key = self.build_cache.fingerprint(
+            package_name, req_txt_file, python_version, PEX_VERSION, self.os_name, self.arch_name, binaries
+        )
+        cached = self.build_cache.get(key)
+        if cached:
+            self.logger.info(f"Reusing cached build {key[:12]} for {package_name}=={version}")
+            pex_path = self.get_pex_path(package_name, version, python_version)
+            pex_path.parent.mkdir(parents=True, exist_ok=True)
+            link_or_copy(cached["pex"], pex_path)
+            self.create_binary_scripts(pex_path, package_name, binaries)
+            tarball_path = pex_path.parent / cached["tarball"].name
+            link_or_copy(cached["tarball"], tarball_path)
+            return tarball_path, cached["sha256"]
+
+        # Earlier outputs may be hard links into the build cache, don't write through them
+        pex_path = self.get_pex_path(package_name, version, python_version)
+        for output in (pex_path, self.get_tarball_path(package_name, pex_path)):
+            try:
+                output.unlink()
+            except FileNotFoundError:
+                pass
+
+        pex_path = self.build_pex(package_name, version, python_version)
+        script_paths = self.create_binary_scripts(pex_path, package_name, binaries)
+        tarball_path, tarball_hash = self.create_tarball(package_name, pex_path, script_paths)
+        self.build_cache.put(key, pex_path, tarball_path, tarball_hash)
+        return tarball_path, tarball_hash
+
+    def get_release_assets(self, tag_name: str) -> Tuple[GitRelease, Dict[str, Dict]]:
+        """Get a release and an index of its assets from the release snapshot.
 
-    def upload_to_github_release(self, package_name: str, version: str, tarball_path: Path) -> bool:
+        A release missing from the snapshot is fetched once, its assets come
+        from the release response itself, so no asset pages are requested.
+
+        Args:
+            tag_name: Tag of the release
+
+        Returns:
+            Tuple of (release, dict mapping asset name to its id, size and digest)
+        """
+        release = self.snapshot.get_release(self.github, tag_name)
+        return release, self.snapshot.assets(tag_name)
+
+    def upload_to_github_release(self, package_name: str, version: str, tarball_path: Path,
+                                 tarball_hash: Optional[str] = None, recorded_hash: Optional[str] = None) -> bool:
         """Upload the tarball to a GitHub release.
         
+        An asset with the same name, size and SHA256 digest is left as it is,
+        an asset with the same name but other content is replaced. When the
+        API reported no digest for the asset, the hash recorded in the state
+        or release description stands in for it, and without one an asset of
+        the same size counts as the same. Transient upload failures are
+        retried by the uploader. Safe to call concurrently for different
+        versions.
+        
         Args:
             package_name: Name of the package
             version: Version of the package
             tarball_path: Path to the tarball
+            tarball_hash: SHA256 hash of the tarball, computed from the file if None
+            recorded_hash: SHA256 hash recorded for the asset in the state, read from the
+                release description in the snapshot if None
             
         Returns:
             bool: True if successful, False otherwise
@@ -285,25 +397,37 @@ PEX_SCRIPT={binary} exec "$SCRIPT_DIR/{pex_path.name}" "$@"
         try:
             # Format the tag name
             tag_name = f"{package_name}-v{version}"
-            
-            # Get the repository
-            repo = self.github.get_repo(self.github_repo)
-            release = repo.get_release(tag_name)
+            release, assets = self.get_release_assets(tag_name)
             
             # Check if asset already exists
             asset_name = tarball_path.name
-            for asset in release.get_assets():
-                if asset.name == asset_name:
-                    self.logger.info(f"Asset {asset_name} already exists, deleting it")
-                    asset.delete_asset()
-                    break
+            existing = assets.get(asset_name)
+            if tarball_hash is None:
+                tarball_hash = file_sha256(tarball_path)
+            if existing:
+                if existing.get("digest"):
+                    same_content = existing["digest"] == f"sha256:{tarball_hash}"
+                else:
+                    if recorded_hash is None:
+                        release_info = (self.snapshot.get(tag_name) or {}).get("release_info") or {}
+                        recorded_hash = (release_info.get("asset_info") or {}).get(asset_name)
+                    same_content = recorded_hash is None or recorded_hash == tarball_hash
+                if existing["size"] == tarball_path.stat().st_size and same_content:
+                    self.logger.info(f"Asset {asset_name} is already uploaded with the same content, skipping upload")
+                    return True
+                
+                self.logger.info(f"Asset {asset_name} already exists with other content, replacing it")
+                repo = self.github.get_repo(self.github_repo)
+                repo.get_release_asset(existing["id"]).delete_asset()
+                self.snapshot.set_asset(tag_name, asset_name, None)
             
             self.logger.info(f"Uploading tarball: {tarball_path}")
-            release.upload_asset(
-                path=str(tarball_path),
-                name=asset_name,
-                content_type="application/gzip"
-            )
+            result = self.uploader.upload(release.raw_data, tarball_path, asset_name, tarball_hash)
+            self.snapshot.set_asset(tag_name, asset_name, {
+                "id": result.asset["id"],
+                "size": result.asset.get("size"),
+                "digest": f"sha256:{tarball_hash}",
+            })
             
             self.logger.info(f"Successfully uploaded tarball to release: {release.html_url}")
             return True
@@ -312,6 +436,34 @@ PEX_SCRIPT={binary} exec "$SCRIPT_DIR/{pex_path.name}" "$@"
             self.logger.error(f"Error uploading to GitHub release: {e}", exc_info=True)
             return False
 
+    @staticmethod
+    def recorded_asset_hash(version_info: Dict, asset_name: str) -> Optional[str]:
+        """Get the hash recorded for an asset in the state or in the release description.
+
+        Args:
+            version_info: Version entry of the state
+            asset_name: Name of the asset
+
+        Returns:
+            SHA256 hash of the asset, or None if none was recorded
+        """
+        assets = version_info.get('assets') or {}
+        if assets.get(asset_name):
+            return assets[asset_name]
+        release_info = version_info.get('release_info') or {}
+        return (release_info.get('asset_info') or {}).get(asset_name)
+
+    def close(self) -> None:
+        """Report the cache and upload counters, evict cache entries above their size limits and save the snapshot."""
+        self.logger.info(self.build_cache.summary())
+        self.logger.info(self.wheel_cache.summary())
+        self.logger.info(self.uploader.summary())
+        self.logger.info(self.snapshot.summary())
+        self.wheel_cache.prune()
+        self.build_cache.prune()
+        self.uploader.close()
+        self.snapshot.save()
+
     def process_package(self, package_name: str) -> bool:
         """Process a package: build PEX files and upload to GitHub releases.
         
@@ -338,10 +490,11 @@ PEX_SCRIPT={binary} exec "$SCRIPT_DIR/{pex_path.name}" "$@"
                 self.logger.info(f"No versions found in state file for {package_name}")
                 return True
             
-            has_changes = False
+            # Select the versions that still need an asset for this platform
+            asset_name = f"{actual_package_name}-{self.os_name}-{self.arch_name}.tar.gz"
+            pending = []
             for version_info in versions:
                 version = version_info['version']
-                python_version = version_info['python']
                 has_requirements = version_info.get('requirements', False)
                 has_release = version_info.get('release', False)
                 assets = version_info.get('assets', {})
@@ -351,37 +504,66 @@ PEX_SCRIPT={binary} exec "$SCRIPT_DIR/{pex_path.name}" "$@"
                 # Only process versions with requirements and releases
                 if has_requirements and has_release:
                     # Check if we need to build for this platform
-                    asset_name = f"{actual_package_name}-{self.os_name}-{self.arch_name}.tar.gz"
-                    if asset_name in assets:
+                    if asset_name in assets and not self.rebuild:
                         self.logger.info(f"Asset {asset_name} already exists for {actual_package_name} {version}, skipping")
                         continue
-                    
-                    try:
-                        # Build PEX file
-                        pex_path = self.build_pex(actual_package_name, version, python_version)
+                    pending.append(version_info)
+            
+            # Build and upload versions concurrently, state updates stay on this thread
+            is_success = True
+            with ThreadPoolExecutor(max_workers=self.build_jobs) as executor, \
+                    ThreadPoolExecutor(max_workers=self.uploader.jobs) as upload_executor:
+                builds = {
+                    executor.submit(self.build_version, actual_package_name, version_info['version'],
+                                    version_info['python'], binaries): version_info
+                    for version_info in pending
+                }
+                uploads = {}
+                if builds:
+                    self.logger.info(f"Building {len(builds)} versions of {actual_package_name} with {self.build_jobs} jobs")
+                
+                remaining = set(builds)
+                while remaining:
+                    done, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in uploads:
+                            version_info, tarball_hash = uploads[future]
+                            version = version_info['version']
+                            if future.result():
+                                # Update state with the new asset and checkpoint it
+                                version_info.setdefault('assets', {})[asset_name] = tarball_hash
+                                self.save_state(package_name, state)
+                            else:
+                                self.logger.error(f"Failed to upload {asset_name} for {actual_package_name} {version}")
+                                is_success = False
+                            continue
                         
-                        # Create binary scripts
-                        script_paths = self.create_binary_scripts(pex_path, actual_package_name, binaries)
+                        version_info = builds[future]
+                        version = version_info['version']
+                        try:
+                            tarball_path, tarball_hash = future.result()
+                        except Exception as e:
+                            self.logger.error(f"Error processing {actual_package_name} {version}: {e}", exc_info=True)
+                            is_success = False
+                            continue
                         
-                        # Create tarball and calculate hash
-                        tarball_path, tarball_hash = self.create_tarball(actual_package_name, pex_path, script_paths)
+                        # An identical tarball is already published, leave the release and state alone
+                        if self.recorded_asset_hash(version_info, asset_name) == tarball_hash:
+                            self.logger.info(f"Asset {asset_name} for {actual_package_name} {version} is unchanged, skipping upload")
+                            if asset_name not in version_info.get('assets', {}):
+                                version_info.setdefault('assets', {})[asset_name] = tarball_hash
+                                self.save_state(package_name, state)
+                            continue
                         
-                        # Upload to GitHub release
-                        success = self.upload_to_github_release(actual_package_name, version, tarball_path)
-                        if success:
-                            # Update state with the new asset
-                            version_info['assets'][asset_name] = tarball_hash
-                            has_changes = True
-                        else:
-                            self.logger.error(f"Failed to upload {asset_name} for {actual_package_name} {version}")
-                            
-                    except Exception as e:
-                        self.logger.error(f"Error processing {actual_package_name} {version}: {e}", exc_info=True)
-                        return False
-            
-            # Save state if there were changes
-            if has_changes:
-                self.save_state(package_name, state)
+                        # Upload to GitHub release while the other versions keep building
+                        upload = upload_executor.submit(self.upload_to_github_release, actual_package_name,
+                                                        version, tarball_path, tarball_hash,
+                                                        self.recorded_asset_hash(version_info, asset_name))
+                        uploads[upload] = (version_info, tarball_hash)
+                        remaining.add(upload)
+            
+            if not is_success:
+                return False
                 
             self.logger.info(f"Successfully processed package: {package_name}")
             return True
@@ -398,9 +580,32 @@ def main():
                         help="Directory to store built PEX files")
     parser.add_argument("--tmp-dir", default=os.environ.get("TMP_DIR", "tmp"),
                         help="Directory for temporary files")
+    parser.add_argument("--build-jobs", type=int, default=int(os.environ.get("BUILD_JOBS", "0")) or None,
+                        help="Number of versions to build concurrently (default: CPU count)")
+    parser.add_argument("--compress-jobs", type=int, default=int(os.environ.get("COMPRESS_JOBS", "1")),
+                        help="Number of threads compressing each tarball, 1 uses the standard gzip writer")
+    parser.add_argument("--upload-jobs", type=int, default=int(os.environ.get("UPLOAD_JOBS", "4")),
+                        help="Number of assets to upload concurrently")
+    parser.add_argument("--upload-retries", type=int, default=int(os.environ.get("UPLOAD_RETRIES", "4")),
+                        help="Number of times a failed upload is retried")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Also build versions that already have an asset, only uploading changed tarballs")
+    parser.add_argument("--build-cache-dir", default=None,
+                        help="Directory of the build artifact cache (default: <tmp-dir>/build-cache)")
+    parser.add_argument("--build-cache-max-mb", type=int, default=int(os.environ.get("BUILD_CACHE_MAX_MB", "1024")),
+                        help="Maximum size of the build artifact cache")
+    parser.add_argument("--wheel-cache-max-mb", type=int, default=int(os.environ.get("WHEEL_CACHE_MAX_MB", "1024")),
+                        help="Maximum size of the shared wheel cache under the tmp dir")
     parser.add_argument("--github-token", help="GitHub token for authentication")
     parser.add_argument("--github-repo", default="vgijssel/hermit-python-packages",
                         help="GitHub repository name (owner/repo)")
+    parser.add_argument("--github-api-url", default=os.environ.get("GITHUB_API_URL", "https://api.github.com"),
+                        help="Base URL of the GitHub REST API, e.g. of a local stand-in")
+    parser.add_argument("--release-snapshot",
+                        default=os.environ.get("RELEASE_SNAPSHOT", "python/release-snapshot.json"),
+                        help="File the state stage saved the releases to, updated with the uploaded assets")
+    parser.add_argument("--api-metrics", default=os.environ.get("API_METRICS_FILE"),
+                        help="File to write the API calls made to as JSON on exit")
     parser.add_argument("--log-level", default="INFO", 
                         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
                         help="Set the logging level")
@@ -414,6 +619,8 @@ def main():
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     logger = logging.getLogger('pex_generator')
+    METRICS.stage = "build"
+    METRICS.dump_at_exit(args.api_metrics)
     
     package_dir = Path("python")
     if not package_dir.exists():
@@ -426,16 +633,29 @@ def main():
             dist_dir=args.dist_dir,
             tmp_dir=args.tmp_dir,
             github_token=args.github_token,
-            github_repo=args.github_repo
+            github_repo=args.github_repo,
+            github_api_url=args.github_api_url,
+            build_jobs=args.build_jobs,
+            compress_jobs=args.compress_jobs,
+            rebuild=args.rebuild,
+            uploader=AssetUploader(args.github_token, jobs=args.upload_jobs, retries=args.upload_retries),
+            wheel_cache=WheelCache(Path(args.tmp_dir) / "wheel-cache", max_bytes=args.wheel_cache_max_mb * 1024 * 1024),
+            build_cache=BuildCache(args.build_cache_dir or Path(args.tmp_dir) / "build-cache",
+                                   max_bytes=args.build_cache_max_mb * 1024 * 1024),
+            snapshot=ReleaseSnapshot(args.release_snapshot, args.github_repo)
         )
         
         success = True
         for package in args.package:
             logger.info(f"Processing package: {package}")
-            if not generator.process_package(package):
-                logger.error(f"Failed to process package {package}")
-                success = False
+            with METRICS.package_context(package):
+                if not generator.process_package(package):
+                    logger.error(f"Failed to process package {package}")
+                    success = False
+        generator.close()
         
+        logger.info(generator.github.summary())
+        logger.info(METRICS.summary())
         if not success:
             sys.exit(1)
     except Exception as e:
@@ -9,20 +9,29 @@ import sys
 import logging
 from pathlib import Path
 from typing import Dict, Optional, Tuple, List
-import yaml
-from github import Github, GithubException
+from github import GithubException
+from api_metrics import METRICS
+from document_store import DocumentStore
+from github_client import GitHubClient
+from release_snapshot import ReleaseSnapshot, release_entry
 
 
 class ReleaseGenerator:
     """Generate GitHub releases for Python packages based on state.yaml files."""
 
-    def __init__(self, package_dir: str, github_repo: str, github_token: Optional[str] = None):
+    def __init__(self, package_dir: str, github_repo: str, github_token: Optional[str] = None,
+                 github: Optional[GitHubClient] = None, documents: Optional[DocumentStore] = None,
+                 snapshot: Optional[ReleaseSnapshot] = None, github_api_url: Optional[str] = None):
         """Initialize the release generator.
 
         Args:
             package_dir: Directory containing the package configurations
             github_repo: GitHub repository name (owner/repo)
             github_token: GitHub token for authentication
+            github: Shared GitHub client, created from github_token if None
+            documents: Shared document store, a write-through store if None
+            snapshot: Release snapshot to look releases up in and record changes to, kept in memory if None
+            github_api_url: Base URL of the GitHub REST API, e.g. of a local stand-in, the public API if None
         """
         self.package_dir = Path(package_dir)
         self.github_repo = github_repo
@@ -35,7 +44,9 @@ class ReleaseGenerator:
             sys.exit(1)
         
         # Initialize GitHub client
-        self.github = Github(self.github_token)
+        self.github = github or GitHubClient(self.github_token, stage="releases", base_url=github_api_url)
+        self.documents = documents or DocumentStore()
+        self.snapshot = snapshot or ReleaseSnapshot(github_repo=github_repo)
         self.logger.info(f"ReleaseGenerator initialized for repo: {github_repo}")
 
     def load_config(self, package_name: str) -> Dict:
@@ -52,8 +63,7 @@ class ReleaseGenerator:
             print(f"Error: Config file not found: {config_path}")
             sys.exit(1)
         
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
+        config = self.documents.load(config_path)
             
         # If package name is not specified in config, use directory name
         if "package" not in config:
@@ -71,12 +81,11 @@ class ReleaseGenerator:
             Dict containing the package state
         """
         state_path = self.package_dir / package_name / "state.yaml"
-        if not state_path.exists():
+        if not self.documents.exists(state_path):
             print(f"Error: State file not found: {state_path}")
             sys.exit(1)
         
-        with open(state_path, "r") as f:
-            state = yaml.safe_load(f)
+        state = self.documents.load(state_path)
             
         return state
 
@@ -88,8 +97,7 @@ class ReleaseGenerator:
             state: State to save
         """
         state_path = self.package_dir / package_name / "state.yaml"
-        with open(state_path, "w") as f:
-            yaml.dump(state, f, default_flow_style=False)
+        self.documents.save(state_path, state)
         
         self.logger.info(f"State saved to {state_path}")
 
@@ -111,11 +119,12 @@ class ReleaseGenerator:
             repo = self.github.get_repo(self.github_repo)
             
             try:
-                # Get the release
-                release = repo.get_release(tag_name)
+                # Get the release, from the snapshot if it is listed there
+                release = self.snapshot.get_release(self.github, tag_name)
                 
                 # Delete the release
                 release.delete_release()
+                self.snapshot.remove(tag_name)
                 self.logger.info(f"Successfully deleted release: {tag_name}")
                 
                 # Delete the tag
@@ -128,6 +137,7 @@ class ReleaseGenerator:
                 
                 return True
             except GithubException as e:
+                self.snapshot.remove(tag_name)
                 self.logger.warning(f"Release {tag_name} not found: {e}")
                 return True  # Consider it a success if the release doesn't exist
                 
@@ -164,6 +174,7 @@ class ReleaseGenerator:
                 draft=False,
                 prerelease=True  # Create in prerelease mode
             )
+            self.snapshot.put(release_entry(release.raw_data))
             self.logger.info(f"Successfully created release: {tag_name}")
             return True, release
                 
@@ -284,6 +295,13 @@ def main():
     parser.add_argument("--github-token", help="GitHub token for authentication")
     parser.add_argument("--github-repo", default="vgijssel/hermit-python-packages",
                         help="GitHub repository name (owner/repo)")
+    parser.add_argument("--github-api-url", default=os.environ.get("GITHUB_API_URL", "https://api.github.com"),
+                        help="Base URL of the GitHub REST API, e.g. of a local stand-in")
+    parser.add_argument("--release-snapshot",
+                        default=os.environ.get("RELEASE_SNAPSHOT", "python/release-snapshot.json"),
+                        help="File the state stage saved the releases to, updated with the created releases")
+    parser.add_argument("--api-metrics", default=os.environ.get("API_METRICS_FILE"),
+                        help="File to write the API calls made to as JSON on exit")
     parser.add_argument("--log-level", default="INFO", 
                         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
                         help="Set the logging level")
@@ -297,6 +315,8 @@ def main():
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     logger = logging.getLogger('release_generator')
+    METRICS.stage = "releases"
+    METRICS.dump_at_exit(args.api_metrics)
     
     package_dir = Path("python")
     if not package_dir.exists():
@@ -307,16 +327,23 @@ def main():
         generator = ReleaseGenerator(
             package_dir=package_dir,
             github_token=args.github_token,
-            github_repo=args.github_repo
+            github_repo=args.github_repo,
+            github_api_url=args.github_api_url,
+            snapshot=ReleaseSnapshot(args.release_snapshot, args.github_repo)
         )
         
         success = True
         for package in args.package:
             logger.info(f"Processing package: {package}")
-            if not generator.process_package(package):
-                logger.error(f"Failed to process package {package}")
-                success = False
+            with METRICS.package_context(package):
+                if not generator.process_package(package):
+                    logger.error(f"Failed to process package {package}")
+                    success = False
+        generator.snapshot.save()
         
+        logger.info(generator.snapshot.summary())
+        logger.info(generator.github.summary())
+        logger.info(METRICS.summary())
         if not success:
             sys.exit(1)
     except Exception as e:
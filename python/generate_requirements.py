@@ -10,20 +10,22 @@ import sys
 import logging
 from pathlib import Path
 from typing import Dict, List, Optional
-import yaml
+from document_store import DocumentStore
 
 
 class RequirementsGenerator:
     """Generate requirements files for Python packages based on state.yaml files."""
 
-    def __init__(self, package_dir: str):
+    def __init__(self, package_dir: str, documents: Optional[DocumentStore] = None):
         """Initialize the requirements generator.
 
         Args:
             package_dir: Directory containing the package configurations
+            documents: Shared document store, a write-through store if None
         """
         self.package_dir = Path(package_dir)
         self.logger = logging.getLogger('requirements_generator')
+        self.documents = documents or DocumentStore()
 
     def load_config(self, package_name: str) -> Dict:
         """Load the package configuration from config.yaml.
@@ -39,8 +41,7 @@ class RequirementsGenerator:
             self.logger.error(f"Config file not found: {config_path}")
             sys.exit(1)
         
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
+        config = self.documents.load(config_path)
             
         # If package name is not specified in config, use directory name
         if "package" not in config:
@@ -58,12 +59,11 @@ class RequirementsGenerator:
             Dict containing the package state
         """
         state_path = self.package_dir / package_name / "state.yaml"
-        if not state_path.exists():
+        if not self.documents.exists(state_path):
             self.logger.error(f"State file not found: {state_path}")
             sys.exit(1)
         
-        with open(state_path, "r") as f:
-            state = yaml.safe_load(f)
+        state = self.documents.load(state_path)
             
         return state
 
@@ -75,8 +75,7 @@ class RequirementsGenerator:
             state: State to save
         """
         state_path = self.package_dir / package_name / "state.yaml"
-        with open(state_path, "w") as f:
-            yaml.dump(state, f, default_flow_style=False)
+        self.documents.save(state_path, state)
         
         self.logger.info(f"State saved to {state_path}")
 
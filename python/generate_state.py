@@ -4,29 +4,53 @@ Generate state files for Python packages based on config.yaml files.
 """
 
 import argparse
+import bisect
 import os
 import sys
 import hashlib
 import logging
 from pathlib import Path
 from typing import Dict, List, Optional, Any
-import yaml
-import requests
-import semver
-import re
-from github import Github, GithubException
+from api_metrics import METRICS
+from document_store import DocumentStore
+from github_client import GitHubClient
+from github_releases import ReleaseFetcher
+from pypi_cache import PyPIMetadataCache
+from pypi_client import DEFAULT_INDEX_URL, PyPIClient, canonical_name
+from release_snapshot import ReleaseSnapshot, parse_release_info, release_entry
+from state_fingerprints import StateFingerprints, state_fingerprint
+import pep440
 
 
 class StateGenerator:
     """Generate state files for Python packages based on config.yaml files."""
 
-    def __init__(self, package_dir: str, github_repo: str, github_token: Optional[str] = None):
+    def __init__(self, package_dir: str, github_repo: str, github_token: Optional[str] = None, jobs: int = 1,
+                 pypi_cache_dir: Optional[str] = None,
+                 github: Optional[GitHubClient] = None, documents: Optional[DocumentStore] = None,
+                 pypi: Optional[PyPIClient] = None, release_fetch: str = "graphql",
+                 snapshot: Optional[ReleaseSnapshot] = None, github_api_url: Optional[str] = None,
+                 pypi_index_url: Optional[str] = None, fingerprints: Optional[StateFingerprints] = None,
+                 full: bool = False, change_feed: bool = False, pypi_api: str = "json"):
         """Initialize the state generator.
 
         Args:
             package_dir: Directory containing the package configurations
             github_repo: GitHub repository name (owner/repo)
             github_token: GitHub token for authentication
+            jobs: Number of concurrent PyPI requests
+            pypi_cache_dir: Directory for the PyPI metadata cache, disabled if None
+            github: Shared GitHub client, created from github_token if None
+            documents: Shared document store, a write-through store if None
+            pypi: Shared PyPI client, created from jobs and pypi_cache_dir if None
+            release_fetch: Fetch the releases through "graphql" or page them through "rest"
+            snapshot: Release snapshot refreshed for the later stages, kept in memory if None
+            github_api_url: Base URL of the GitHub REST API, e.g. of a local stand-in, the public API if None
+            pypi_index_url: Base URL of the PyPI JSON API, e.g. of a mirror or local stand-in, pypi.org if None
+            fingerprints: Fingerprints of the inputs of the states, every package is generated if None
+            full: Generate the state of every package even if its fingerprint is unchanged
+            change_feed: Only fetch the packages the PyPI changelog reports changes for, needs fingerprints
+            pypi_api: List the PyPI versions through the "json" or the lighter PEP 691 "simple" API
         """
         self.package_dir = Path(package_dir)
         self.github_repo = github_repo
@@ -39,13 +63,32 @@ class StateGenerator:
             sys.exit(1)
         
         # Initialize GitHub client
-        self.github = Github(self.github_token)
+        self.github = github or GitHubClient(self.github_token, stage="state", base_url=github_api_url)
+        self.documents = documents or DocumentStore()
+        self.snapshot = snapshot or ReleaseSnapshot(github_repo=github_repo)
         self.logger.info(f"StateGenerator initialized for repo: {github_repo}")
+
+        # Shared PyPI client and the versions prefetched through it
+        if pypi is None:
+            pypi_cache = PyPIMetadataCache(pypi_cache_dir) if pypi_cache_dir else None
+            pypi = PyPIClient(index_url=pypi_index_url or DEFAULT_INDEX_URL, jobs=jobs, cache=pypi_cache,
+                              api=pypi_api)
+        self.pypi = pypi
+        self.pypi_versions = {}
         
-        # Cache all GitHub releases
+        # GitHub releases, cached on first use or by prefetch_github_releases
+        self.release_fetch = release_fetch
         self.github_releases = {}
         self.github_release_assets = {}
-        self._cache_github_releases()
+        self.releases_cached = False
+        self.release_digests: Optional[Dict[str, str]] = None
+
+        # Packages whose PyPI serial, config, requirements and releases are unchanged are skipped
+        self.fingerprints = fingerprints
+        self.full = full
+        self.skipped = 0
+        self.change_feed = change_feed
+        self.feed_serials: Dict[str, int] = {}
 
     def load_config(self, package_name: str) -> Dict:
         """Load the package configuration from config.yaml.
@@ -61,16 +104,15 @@ class StateGenerator:
             print(f"Error: Config file not found: {config_path}")
             sys.exit(1)
         
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
+        config = self.documents.load(config_path)
             
         # If package name is not specified in config, use directory name
         if "package" not in config:
             config["package"] = package_name
         
-        # Sort versions by semver if they exist
+        # Sort versions by PEP 440 order if they exist
         if "versions" in config:
-            config["versions"] = sorted(config["versions"], key=lambda v: semver.VersionInfo.parse(v["version"]))
+            config["versions"] = sorted(config["versions"], key=lambda v: pep440.parse(str(v["version"])))
             
         return config
 
@@ -82,28 +124,117 @@ class StateGenerator:
             min_version: Minimum version to include
             
         Returns:
-            List of versions sorted by semver
+            List of versions sorted by PEP 440 order, pre-releases excluded
         """
-        url = f"https://pypi.org/pypi/{package_name}/json"
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        data = response.json()
-        all_versions = list(data["releases"].keys())
+        if package_name in self.pypi_versions:
+            all_versions = self.pypi_versions.pop(package_name)
+            if isinstance(all_versions, Exception):
+                raise all_versions
+        else:
+            all_versions = self.pypi.get_release_versions(package_name)
         
-        # Filter versions that are >= min_version
-        valid_versions = []
-        for version in all_versions:
-            try:
-                if semver.compare(version, min_version) >= 0:
-                    valid_versions.append(version)
-            except ValueError:
-                # Skip versions that don't follow semver
+        # Keep final and post-releases >= min_version, invalid versions are skipped
+        return pep440.filter_versions(all_versions, min_version)
+
+    def prefetch_pypi_versions(self, package_names: List[str]) -> None:
+        """Fetch the PyPI versions of all given packages concurrently.
+
+        The results are consumed by get_pypi_versions, so the per-package
+        processing afterwards does not wait on the network. With the change
+        feed only the packages the PyPI changelog reports changes for are
+        fetched, none when the changelog serial did not move.
+
+        Args:
+            package_names: Package directory names (under python/)
+        """
+        pypi_names = {}
+        for package_name in package_names:
+            config_path = self.package_dir / package_name / "config.yaml"
+            if not config_path.exists():
                 continue
-                
-        # Sort versions
-        valid_versions.sort(key=lambda v: semver.VersionInfo.parse(v))
-        return valid_versions
+            config = self.documents.load(config_path) or {}
+            pypi_names[package_name] = config.get("package", package_name)
+
+        to_fetch = list(pypi_names.values())
+        if self.change_feed and self.fingerprints is not None:
+            to_fetch = self.apply_change_feed(pypi_names)
+        self.pypi_versions.update(self.pypi.get_release_versions_many(to_fetch))
+
+    def apply_change_feed(self, pypi_names: Dict[str, str]) -> List[str]:
+        """Ask the PyPI changelog which packages changed since the last run.
+
+        Packages without changes keep the serial of their stored fingerprint,
+        so they are skipped without a request of their own. The latest
+        serial of the index is checked first, when it did not move since the
+        last run no package changed and the changelog is not read. The first run
+        and a failing changelog fall back to fetching every package. The
+        serial the changelog was processed up to only advances when every
+        package was checked, otherwise a change to a package left out of
+        this run would never be seen.
+
+        Args:
+            pypi_names: Dict mapping package directory name to PyPI package name
+
+        Returns:
+            PyPI names of the packages to fetch
+        """
+        since = self.fingerprints.changelog_serial
+        all_packages = {path.parent.name for path in self.package_dir.glob("*/config.yaml")}
+        complete = all_packages <= set(pypi_names)
+        try:
+            if since is None:
+                # Take the serial before fetching, changes made meanwhile show up in the next run
+                if complete:
+                    self.fingerprints.set_changelog_serial(self.pypi.changelog_last_serial())
+                return list(pypi_names.values())
+            last_serial = self.pypi.changelog_last_serial()
+            changed = set()
+            if last_serial != since:
+                changed, last_serial = self.pypi.changed_since(since)
+        except Exception as e:
+            self.logger.warning(f"PyPI changelog unavailable, fetching every package: {e}")
+            return list(pypi_names.values())
+
+        to_fetch = []
+        for package_name, pypi_name in pypi_names.items():
+            stored = self.fingerprints.get(package_name)
+            if stored and canonical_name(pypi_name) not in changed:
+                self.feed_serials[pypi_name] = stored["pypi_serial"]
+            else:
+                to_fetch.append(pypi_name)
+        if complete:
+            self.fingerprints.set_changelog_serial(last_serial)
+        else:
+            self.logger.info(f"Keeping PyPI changelog serial {since}, "
+                             f"{len(all_packages - set(pypi_names))} packages were not checked")
+        self.logger.info(f"PyPI changelog since serial {since}: fetching {len(to_fetch)} of {len(pypi_names)} packages")
+        return to_fetch
+
+    @staticmethod
+    def build_version_map(versions_config: List[Dict], all_versions: List[str]) -> Dict[str, str]:
+        """Map each package version to the Python version of the configured range it falls in.
+
+        Each config entry covers its version up to, but excluding, the next
+        configured version. The range starts are sorted once and every
+        package version is assigned with a binary search.
+
+        Args:
+            versions_config: Config entries with "version" and "python" keys
+            all_versions: Package versions sorted by PEP 440 order
+
+        Returns:
+            Dict mapping package version to Python version, in version order
+        """
+        ranges = sorted(versions_config, key=lambda v: pep440.parse(str(v["version"])))
+        starts = [pep440.parse(str(v["version"])) for v in ranges]
+
+        version_map = {}
+        for version in all_versions:
+            index = bisect.bisect_right(starts, pep440.parse(version)) - 1
+            if index >= 0:
+                version_map[version] = ranges[index]["python"]
+
+        return version_map
 
     def check_requirements_exist(self, package_name: str, version: str) -> bool:
         """Check if requirements files exist for the given package and version.
@@ -121,12 +252,103 @@ class StateGenerator:
         
         return req_in_file.exists() and req_txt_file.exists()
 
+    def prefetch_github_releases(self, package_names: List[str]) -> None:
+        """Cache the GitHub releases of the given packages only.
+
+        Args:
+            package_names: Package directory names (under python/)
+        """
+        tag_prefixes = []
+        for package_name in package_names:
+            config_path = self.package_dir / package_name / "config.yaml"
+            if not config_path.exists():
+                continue
+            config = self.documents.load(config_path) or {}
+            tag_prefixes.append(f"{config.get('package', package_name)}-v")
+
+        self.cache_github_releases(tag_prefixes)
+
+    def cache_github_releases(self, tag_prefixes: Optional[List[str]] = None) -> None:
+        """Cache the GitHub releases to avoid multiple API calls.
+
+        The listed releases also replace those in the release snapshot. A
+        snapshot saved by an earlier run within its maximum age is used
+        instead of listing the releases again, unless every state is
+        generated in full.
+
+        Args:
+            tag_prefixes: Only cache releases with tags starting with these, all releases if None
+        """
+        if self.snapshot.loaded and not self.full:
+            self._cache_github_releases_snapshot(tag_prefixes)
+        elif self.release_fetch == "rest":
+            self._cache_github_releases()
+        else:
+            self._cache_github_releases_graphql(tag_prefixes)
+        self.releases_cached = True
+        self.release_digests = None
+
+    def _cache_github_releases_snapshot(self, tag_prefixes: Optional[List[str]] = None) -> None:
+        """Cache the GitHub releases kept in the release snapshot of an earlier run.
+
+        Every stage records the releases and assets it creates, edits and
+        deletes in the snapshot, so it matches GitHub without a listing.
+        """
+        prefixes = tuple(tag_prefixes) if tag_prefixes is not None else None
+        for entry in self.snapshot.entries():
+            tag_name = entry["tag_name"]
+            if prefixes is not None and not tag_name.startswith(prefixes):
+                continue
+            release_info = entry.get("release_info")
+            self.github_releases[tag_name] = {
+                "exists": True,
+                "is_prerelease": bool(entry.get("prerelease")),
+                "release_info": release_info,
+            }
+            self.github_release_assets[tag_name] = dict((release_info or {}).get("asset_info") or {})
+        self.logger.info(f"Cached {len(self.github_releases)} GitHub releases from the release snapshot")
+
+    def _cache_github_releases_graphql(self, tag_prefixes: Optional[List[str]] = None) -> None:
+        """Cache GitHub releases fetched 100 at a time through GraphQL."""
+        try:
+            self.logger.info(f"Caching GitHub releases from {self.github_repo} through GraphQL")
+            fetcher = ReleaseFetcher(self.github, self.github_repo)
+            entries = []
+
+            # Releases are parsed while the next page is on its way
+            for release in fetcher.iter_releases(tag_prefixes):
+                tag_name = release["tag_name"]
+                release_info = self._extract_build_info_from_description(release["description"])
+
+                self.github_releases[tag_name] = {
+                    "exists": True,
+                    "is_prerelease": release["is_prerelease"],
+                    "release_info": release_info,
+                }
+                self.github_release_assets[tag_name] = dict((release_info or {}).get("asset_info") or {})
+                entries.append({
+                    "id": release["id"],
+                    "name": release["name"],
+                    "tag_name": tag_name,
+                    "prerelease": release["is_prerelease"],
+                    "release_info": release_info,
+                    "assets": release["assets"],
+                })
+
+            self.snapshot.replace(entries, tag_prefixes)
+
+            self.logger.info(f"Cached {len(self.github_releases)} GitHub releases in {fetcher.queries} queries")
+        except Exception as e:
+            self.logger.error(f"Error caching GitHub releases: {e}", exc_info=True)
+            sys.exit(1)
+
     def _cache_github_releases(self):
         """Cache all GitHub releases to avoid multiple API calls."""
         try:
             self.logger.info(f"Caching all GitHub releases from {self.github_repo}")
             repo = self.github.get_repo(self.github_repo)
             releases = repo.get_releases()
+            entries = []
             
             for release in releases:
                 tag_name = release.tag_name
@@ -146,7 +368,10 @@ class StateGenerator:
                         assets[asset_name] = sha256
                 
                 self.github_release_assets[tag_name] = assets
-                
+                # raw_data would fetch every listed release again to complete it
+                entries.append(release_entry(release._rawData, release_info))
+
+            self.snapshot.replace(entries)
             self.logger.info(f"Cached {len(self.github_releases)} GitHub releases")
         except Exception as e:
             self.logger.error(f"Error caching GitHub releases: {e}", exc_info=True)
@@ -161,21 +386,7 @@ class StateGenerator:
         Returns:
             Dict containing build information or None if not found
         """
-        if not description:
-            return None
-            
-        # Look for YAML block in the description
-        yaml_match = re.search(r'```yaml\n(.*?)```', description, re.DOTALL)
-        if not yaml_match:
-            return None
-            
-        yaml_content = yaml_match.group(1)
-        try:
-            release_info = yaml.safe_load(yaml_content)
-            return release_info
-        except Exception as e:
-            self.logger.error(f"Error parsing release info YAML: {e}")
-            return None
+        return parse_release_info(description, self.logger)
 
     def check_github_release(self, package_name: str, version: str) -> Dict:
         """Check if a GitHub release exists for the given package and version.
@@ -188,6 +399,8 @@ class StateGenerator:
             Dict containing release information
         """
         tag_name = f"{package_name}-v{version}"
+        if not self.releases_cached:
+            self.cache_github_releases()
         
         # Check if release exists in cache
         if tag_name in self.github_releases:
@@ -225,31 +438,15 @@ class StateGenerator:
             print(f"Error: No versions specified for {package_name}")
             sys.exit(1)
         
-        # Sort versions by semver and get the lowest version
-        sorted_versions = sorted(versions_config, key=lambda v: semver.VersionInfo.parse(v["version"]))
-        min_version = sorted_versions[0]["version"]
+        # Versions are sorted by load_config, so the first one is the lowest
+        min_version = str(versions_config[0]["version"])
         
         # Get all versions from PyPI
         all_versions = self.get_pypi_versions(actual_package_name, min_version)
         self.logger.info(f"Found {len(all_versions)} versions for {actual_package_name} >= {min_version}")
 
         # Map Python versions to package versions
-        version_map = {}
-        for version_info in versions_config:
-            version = version_info["version"]
-            python_version = version_info["python"]
-            
-            # Find all versions >= this version but < next specified version
-            next_version = None
-            for v in versions_config:
-                if semver.compare(v["version"], version) > 0:
-                    if next_version is None or semver.compare(v["version"], next_version) < 0:
-                        next_version = v["version"]
-            
-            # Filter versions
-            for v in all_versions:
-                if semver.compare(v, version) >= 0 and (next_version is None or semver.compare(v, next_version) < 0):
-                    version_map[v] = python_version
+        version_map = self.build_version_map(versions_config, all_versions)
 
         # Generate state for each version
         state = {
@@ -287,14 +484,55 @@ class StateGenerator:
             state: State to save
         """
         state_path = self.package_dir / package_name / "state.yaml"
-        with open(state_path, "w") as f:
-            yaml.dump(state, f, default_flow_style=False)
+        self.documents.save(state_path, state)
         
         self.logger.info(f"State saved to {state_path}")
 
+    def package_fingerprint(self, package_name: str) -> Optional[Dict]:
+        """Get the fingerprint of the inputs the state of a package is generated from.
+
+        The PyPI versions are fetched here unless they were prefetched, and
+        kept for generate_state.
+
+        Args:
+            package_name: Package directory name (under python/)
+
+        Returns:
+            Fingerprint of the PyPI serial, config, requirements and releases, None if PyPI sent no serial
+        """
+        config = self.load_config(package_name)
+        actual_package_name = config['package']
+        if actual_package_name in self.feed_serials:
+            # Unchanged according to the changelog, fetched by generate_state only if needed
+            pypi_serial = self.feed_serials[actual_package_name]
+        else:
+            if actual_package_name not in self.pypi_versions:
+                try:
+                    self.pypi_versions[actual_package_name] = self.pypi.get_release_versions(actual_package_name)
+                except Exception as e:
+                    self.pypi_versions[actual_package_name] = e
+            if isinstance(self.pypi_versions[actual_package_name], Exception):
+                return None
+            pypi_serial = self.pypi.serials.get(actual_package_name)
+
+        if not self.releases_cached:
+            self.cache_github_releases()
+        if self.release_digests is None:
+            self.release_digests = self.snapshot.package_digests()
+
+        return state_fingerprint(
+            pypi_serial,
+            self.package_dir / package_name / "config.yaml",
+            self.release_digests.get(actual_package_name, ""),
+        )
+
     def process_package(self, package_name: str) -> bool:
         """Process a package: generate and save state.
         
+        With fingerprints the package is skipped when its state exists and
+        was generated from the same PyPI serial, config, requirements files
+        and releases.
+
         Args:
             package_name: Name of the package
             
@@ -303,12 +541,28 @@ class StateGenerator:
         """
         try:
             self.logger.info(f"Starting to process package: {package_name}")
+            fingerprint = None
+            if self.fingerprints is not None:
+                fingerprint = self.package_fingerprint(package_name)
+                state_path = self.package_dir / package_name / "state.yaml"
+                if (not self.full and self.fingerprints.matches(package_name, fingerprint)
+                        and self.documents.exists(state_path)):
+                    self.pypi_versions.pop(self.load_config(package_name)['package'], None)
+                    self.skipped += 1
+                    self.logger.info(f"Skipping package {package_name}, PyPI, config, requirements and releases are unchanged")
+                    return True
+
             state = self.generate_state(package_name)
             self.save_state(package_name, state)
+            if self.fingerprints is not None:
+                self.fingerprints.put(package_name, fingerprint)
             self.logger.info(f"Successfully processed package: {package_name}")
             return True
         except Exception as e:
             self.logger.error(f"Error processing package {package_name}: {e}", exc_info=True)
+            # Generate it again next run, even if the changelog reports no change by then
+            if self.fingerprints is not None:
+                self.fingerprints.put(package_name, None)
             return False
 
 
@@ -319,6 +573,35 @@ def main():
     parser.add_argument("--github-token", help="GitHub token for authentication")
     parser.add_argument("--github-repo", default="vgijssel/hermit-python-packages",
                         help="GitHub repository name (owner/repo)")
+    parser.add_argument("--github-api-url", default=os.environ.get("GITHUB_API_URL", "https://api.github.com"),
+                        help="Base URL of the GitHub REST API, e.g. of a local stand-in")
+    parser.add_argument("--pypi-index-url", default=os.environ.get("PYPI_INDEX_URL", DEFAULT_INDEX_URL),
+                        help="Base URL of the PyPI JSON API, e.g. of a mirror or local stand-in")
+    parser.add_argument("--pypi-api", default=os.environ.get("PYPI_API", "json"), choices=["json", "simple"],
+                        help="List the PyPI versions through the JSON API or the lighter PEP 691 Simple API")
+    parser.add_argument("--jobs", type=int, default=int(os.environ.get("PYPI_JOBS", "8")),
+                        help="Number of concurrent PyPI requests")
+    parser.add_argument("--pypi-cache-dir",
+                        default=os.path.join(os.environ.get("TMP_DIR", "tmp"), "pypi-cache"),
+                        help="Directory for the PyPI metadata cache")
+    parser.add_argument("--no-pypi-cache", action="store_true",
+                        help="Always download the full PyPI metadata")
+    parser.add_argument("--release-fetch", default=os.environ.get("RELEASE_FETCH", "graphql"),
+                        choices=["graphql", "rest"],
+                        help="Fetch the releases of the packages through GraphQL or page all of them through REST")
+    parser.add_argument("--release-snapshot",
+                        default=os.environ.get("RELEASE_SNAPSHOT", "python/release-snapshot.json"),
+                        help="File to save the listed releases to for the later stages, "
+                             "a snapshot of an earlier run is used instead of listing them")
+    parser.add_argument("--state-fingerprints",
+                        default=os.environ.get("STATE_FINGERPRINTS", "python/state-fingerprints.json"),
+                        help="File recording the inputs of every state, to skip packages whose inputs are unchanged")
+    parser.add_argument("--full", action="store_true",
+                        help="List the releases and generate the state of every package, even if unchanged")
+    parser.add_argument("--no-change-feed", dest="change_feed", action="store_false",
+                        help="Fetch every package instead of asking the PyPI changelog which packages changed")
+    parser.add_argument("--api-metrics", default=os.environ.get("API_METRICS_FILE"),
+                        help="File to write the API calls made to as JSON on exit")
     parser.add_argument("--log-level", default="INFO", 
                         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
                         help="Set the logging level")
@@ -332,6 +615,8 @@ def main():
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     logger = logging.getLogger('state_generator')
+    METRICS.stage = "state"
+    METRICS.dump_at_exit(args.api_metrics)
     
     package_dir = Path("python")
     if not package_dir.exists():
@@ -342,16 +627,35 @@ def main():
         generator = StateGenerator(
             package_dir=package_dir,
             github_token=args.github_token,
-            github_repo=args.github_repo
+            github_repo=args.github_repo,
+            github_api_url=args.github_api_url,
+            pypi_index_url=args.pypi_index_url,
+            pypi_api=args.pypi_api,
+            jobs=args.jobs,
+            pypi_cache_dir=None if args.no_pypi_cache else args.pypi_cache_dir,
+            release_fetch=args.release_fetch,
+            snapshot=ReleaseSnapshot(args.release_snapshot, args.github_repo),
+            fingerprints=StateFingerprints(args.state_fingerprints),
+            full=args.full,
+            change_feed=args.change_feed
         )
+        generator.prefetch_pypi_versions(args.package)
+        generator.prefetch_github_releases(args.package)
         
         success = True
         for package in args.package:
             logger.info(f"Processing package: {package}")
-            if not generator.process_package(package):
-                logger.error(f"Failed to process package {package}")
-                success = False
+            with METRICS.package_context(package):
+                if not generator.process_package(package):
+                    logger.error(f"Failed to process package {package}")
+                    success = False
+        generator.pypi.close()
+        generator.snapshot.save()
+        generator.fingerprints.save()
+        logger.info(f"Skipped {generator.skipped} of {len(args.package)} packages with unchanged inputs")
         
+        logger.info(generator.github.summary())
+        logger.info(METRICS.summary())
         if not success:
             sys.exit(1)
     except Exception as e:
@@ -0,0 +1,281 @@
+"""
+Rate-limit-aware GitHub client shared by the generators.
+"""
+
+import importlib.metadata
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+from github import Auth, Consts, Github, GithubException, GithubRetry
+from github.Repository import Repository
+
+from api_metrics import METRICS, ApiMetrics
+
+
+# The request hooks replace private attributes of this PyGithub release, as pinned in 3rdparty/python
+PYGITHUB_VERSION = "2.1.1"
+
+# Requester attributes the hooks replace
+REQUESTER_HOOKS = ("NEW_DEBUG_FRAME", "DEBUG_ON_RESPONSE", "_Requester__connectionClass")
+
+
+def is_rate_limited(status: int, headers: Mapping[str, str]) -> bool:
+    """Tell a rate limited response from other 403 and 429 responses, like a missing permission.
+
+    Args:
+        status: HTTP status of the response
+        headers: Response headers with lowercase names
+
+    Returns:
+        True if the response asks to retry later or the request budget is used up
+    """
+    return status in (403, 429) and ("retry-after" in headers or headers.get("x-ratelimit-remaining") == "0")
+
+
+class RateLimitRetry(GithubRetry):
+    """GithubRetry that also retries 429 responses and counts rate limited responses.
+
+    GithubRetry already waits until X-RateLimit-Reset on a primary limit and
+    for secondary_rate_wait seconds on a secondary limit.
+    """
+
+    def __init__(self, client: Optional["GitHubClient"] = None, **kwargs):
+        kwargs.setdefault("status_forcelist", [429, *range(500, 600)])
+        super().__init__(**kwargs)
+        self.client = client
+
+    def new(self, **kw) -> "RateLimitRetry":
+        retry = super().new(**kw)
+        retry.client = self.client
+        return retry
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if self.client and response is not None and is_rate_limited(
+                response.status, {name.lower(): value for name, value in response.headers.items()}):
+            self.client.record_limited()
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+class GitHubClient:
+    """Wrap a PyGithub client to pace requests by the rate limit and count them per stage.
+
+    Every response updates the remaining request budget from the
+    X-RateLimit-Remaining and X-RateLimit-Reset headers. Once fewer than
+    min_remaining requests are left, requests are spread evenly over the time
+    until the reset instead of running into the limit. Rate limited
+    responses are retried with backoff by RateLimitRetry. Repositories are
+    fetched once and shared. Attributes other than get_repo are passed to
+    the wrapped Github object.
+    """
+
+    def __init__(self, github_token: Optional[str] = None, stage: str = "default", min_remaining: int = 100,
+                 secondary_rate_wait: float = 60.0, retries: int = 10, github: Optional[Github] = None,
+                 metrics: Optional[ApiMetrics] = None, base_url: Optional[str] = None,
+                 seconds_between_requests: Optional[float] = 0.25, seconds_between_writes: Optional[float] = 1.0):
+        """Initialize the GitHub client.
+
+        Args:
+            github_token: GitHub token for authentication
+            stage: Stage the requests are attributed to until it is changed
+            min_remaining: Remaining request budget below which requests are paced
+            secondary_rate_wait: Seconds to wait before retrying after a secondary rate limit
+            retries: Maximum number of retries of a request
+            github: Existing PyGithub client to wrap instead of creating one
+            metrics: API metrics to record the requests in, the process wide metrics if None
+            base_url: Base URL of the REST API, e.g. of GitHub Enterprise or a local stand-in
+            seconds_between_requests: Minimum delay between requests, as GitHub recommends
+            seconds_between_writes: Minimum delay between writing requests, as GitHub recommends
+        """
+        self.min_remaining = min_remaining
+        self.logger = logging.getLogger('github_client')
+        self.remaining: Optional[int] = None
+        self.limit: Optional[int] = None
+        self.reset_time = 0.0
+        self.stage = stage
+        self.requests: Dict[str, int] = {}
+        self.limited = 0
+        self.throttled_seconds = 0.0
+        self.metrics = metrics or METRICS
+        self._repos: Dict[str, Repository] = {}
+        self._lock = threading.Lock()
+        self.requester = None
+
+        if github is None:
+            retry = RateLimitRetry(self, total=retries, secondary_rate_wait=secondary_rate_wait)
+            auth = Auth.Token(github_token) if github_token else None
+            github = Github(
+                base_url=base_url or Consts.DEFAULT_BASE_URL,
+                auth=auth,
+                retry=retry,
+                seconds_between_requests=seconds_between_requests,
+                seconds_between_writes=seconds_between_writes,
+            )
+        self.github = github
+        self._install_hooks()
+
+    def _install_hooks(self) -> None:
+        """Observe every request made through the wrapped client and the objects it returns.
+
+        Raises:
+            RuntimeError: If the installed PyGithub is not the release the hooks were written for
+        """
+        requester = getattr(self.github, "requester", None) or getattr(self.github, "_Github__requester", None)
+        self.requester = requester
+        if requester is None:
+            self.logger.warning("Cannot observe GitHub requests, rate limit pacing is disabled")
+            return
+
+        version = importlib.metadata.version("PyGithub")
+        missing = [name for name in REQUESTER_HOOKS if not hasattr(requester, name)]
+        if version != PYGITHUB_VERSION or missing:
+            raise RuntimeError(
+                f"GitHubClient hooks into private attributes of PyGithub {PYGITHUB_VERSION}, found {version}"
+                + (f" without {', '.join(missing)}" if missing else "")
+                + ". Check the hooks against the new release before updating PYGITHUB_VERSION."
+            )
+
+        # PyGithub calls these around every request, they do nothing unless its debugging is enabled
+        new_frame = requester.NEW_DEBUG_FRAME
+        on_response = requester.DEBUG_ON_RESPONSE
+
+        def before_request(request_headers):
+            self.throttle()
+            new_frame(request_headers)
+
+        def after_response(status, response_headers, data):
+            self.record_response(status, response_headers)
+            on_response(status, response_headers, data)
+
+        requester.NEW_DEBUG_FRAME = before_request
+        requester.DEBUG_ON_RESPONSE = after_response
+
+        # The debug hooks do not see the URL, the sessions of the connections do
+        connection_class = requester._Requester__connectionClass
+
+        def instrumented_connection(*args, **kwargs):
+            connection = connection_class(*args, **kwargs)
+            self.metrics.instrument(connection.session, "github")
+            return connection
+
+        requester._Requester__connectionClass = instrumented_connection
+
+    def __getattr__(self, name: str):
+        return getattr(self.github, name)
+
+    def get_repo(self, full_name: str) -> Repository:
+        """Get a repository, fetching it only once.
+
+        Args:
+            full_name: Repository name (owner/repo)
+
+        Returns:
+            The repository
+        """
+        with self._lock:
+            repo = self._repos.get(full_name)
+        if repo is None:
+            repo = self.github.get_repo(full_name)
+            with self._lock:
+                repo = self._repos.setdefault(full_name, repo)
+        return repo
+
+    def graphql(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict:
+        """Run a GraphQL query.
+
+        Args:
+            query: GraphQL query document
+            variables: Values of the query variables
+
+        Returns:
+            The "data" member of the response
+
+        Raises:
+            GithubException: If the response reports errors
+        """
+        if self.requester is None:
+            raise RuntimeError("GraphQL queries need access to the PyGithub requester")
+        headers, response = self.requester.requestJsonAndCheck(
+            "POST", "/graphql", input={"query": query, "variables": variables or {}}
+        )
+        if response.get("errors"):
+            raise GithubException(200, response, headers)
+        return response["data"]
+
+    @contextmanager
+    def stage_context(self, stage: str) -> Iterator[None]:
+        """Attribute the requests made inside the context to a stage.
+
+        Args:
+            stage: Name of the stage
+        """
+        previous = self.stage
+        self.stage = stage
+        try:
+            yield
+        finally:
+            self.stage = previous
+
+    def throttle(self) -> None:
+        """Wait before a request when the remaining budget runs low."""
+        with self._lock:
+            remaining, reset_time = self.remaining, self.reset_time
+        if remaining is None or remaining >= self.min_remaining:
+            return
+
+        until_reset = max(0.0, reset_time - time.time())
+        if remaining <= 0:
+            # Out of requests, wait for the reset plus a second as the reset is rounded
+            delay = until_reset + 1
+        else:
+            delay = until_reset / remaining
+        if delay <= 0:
+            return
+
+        log = self.logger.info if remaining <= 0 else self.logger.debug
+        log(f"{remaining} GitHub requests left until the reset in {until_reset:.0f} s, waiting {delay:.1f} s")
+        with self._lock:
+            self.throttled_seconds += delay
+        time.sleep(delay)
+
+    def record_response(self, status: int, headers: Mapping[str, str]) -> None:
+        """Count a response and update the rate limit budget from its headers.
+
+        Args:
+            status: HTTP status of the response
+            headers: Response headers
+        """
+        headers = {name.lower(): value for name, value in headers.items()}
+        # GraphQL and search have budgets of their own, pacing follows the REST budget
+        core = headers.get("x-ratelimit-resource", "core") == "core"
+        with self._lock:
+            self.requests[self.stage] = self.requests.get(self.stage, 0) + 1
+            if core and "x-ratelimit-remaining" in headers:
+                self.remaining = int(float(headers["x-ratelimit-remaining"]))
+            if core and "x-ratelimit-limit" in headers:
+                self.limit = int(float(headers["x-ratelimit-limit"]))
+            if core and "x-ratelimit-reset" in headers:
+                self.reset_time = float(headers["x-ratelimit-reset"])
+            if is_rate_limited(status, headers):
+                self.limited += 1
+
+    def record_limited(self) -> None:
+        """Count a rate limited response that is retried."""
+        with self._lock:
+            self.requests[self.stage] = self.requests.get(self.stage, 0) + 1
+            self.limited += 1
+
+    def summary(self) -> str:
+        """Describe the requests made per stage and the rate limit state.
+
+        Returns:
+            Human readable summary
+        """
+        stages = ", ".join(f"{stage} {count}" for stage, count in self.requests.items()) or "none"
+        budget = f"{self.remaining}/{self.limit} left" if self.remaining is not None else "budget unknown"
+        return (
+            f"GitHub requests: {stages} ({budget}, {self.limited} rate limited, "
+            f"{self.throttled_seconds:.0f} s throttled)"
+        )
@@ -0,0 +1,253 @@
+"""
+Fetch the GitHub releases of a repository in pages of 100 through the GraphQL API.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from github import GithubException
+
+from github_client import GitHubClient
+
+
+PAGE_SIZE = 100
+
+# Above this many tag prefixes the whole release listing is cheaper than a tag lookup per prefix
+MAX_TAG_PREFIXES = 10
+
+# Enough for the assets of all platforms, the assets of releases with more are paged separately
+ASSET_PAGE_SIZE = 20
+
+ASSET_FIELDS = "databaseId name size{digest}"
+
+RELEASE_FIELDS = """
+    databaseId
+    name
+    tagName
+    isPrerelease
+    description
+    releaseAssets(first: {asset_page_size}) {{
+      pageInfo {{ hasNextPage endCursor }}
+      nodes {{ {asset_fields} }}
+    }}
+"""
+
+LISTING_QUERY = """
+query($owner: String!, $name: String!, $cursor: String) {{
+  repository(owner: $owner, name: $name) {{
+    releases(first: {page_size}, after: $cursor, orderBy: {{field: CREATED_AT, direction: DESC}}) {{
+      pageInfo {{ hasNextPage endCursor }}
+      nodes {{ {fields} }}
+    }}
+  }}
+}}
+"""
+
+TAGS_QUERY = """
+query($owner: String!, $name: String!, $prefix: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    refs(refPrefix: "refs/tags/", query: $prefix, first: %d, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes { name }
+    }
+  }
+}
+""" % PAGE_SIZE
+
+ASSETS_QUERY = """
+query($owner: String!, $name: String!, $tag: String!, $assetCursor: String) {{
+  repository(owner: $owner, name: $name) {{
+    release: release(tagName: $tag) {{
+      releaseAssets(first: {page_size}, after: $assetCursor) {{
+        pageInfo {{ hasNextPage endCursor }}
+        nodes {{ {asset_fields} }}
+      }}
+    }}
+  }}
+}}
+"""
+
+
+class ReleaseFetcher:
+    """Stream the releases of a repository from the GraphQL API.
+
+    Only the fields the state needs are requested, 100 releases per query.
+    The next page is requested on a background thread while the caller
+    processes the current one. With a few tag prefixes the matching tags
+    are looked up first and only their releases are fetched, otherwise the
+    whole listing is paged and filtered.
+    """
+
+    def __init__(self, github: GitHubClient, github_repo: str):
+        """Initialize the release fetcher.
+
+        Args:
+            github: GitHub client to query through
+            github_repo: GitHub repository name (owner/repo)
+        """
+        self.github = github
+        self.owner, self.name = github_repo.split("/", 1)
+        self.logger = logging.getLogger('release_fetcher')
+        self.with_digest = True
+        # Counted by the prefetch thread and the caller
+        self.queries = 0
+        self._queries_lock = threading.Lock()
+
+    def _count_query(self) -> None:
+        """Count a query sent to the API."""
+        with self._queries_lock:
+            self.queries += 1
+
+    def _asset_fields(self) -> str:
+        """Fields requested per release asset, with the digest while the API knows it."""
+        return ASSET_FIELDS.format(digest=" digest" if self.with_digest else "")
+
+    def _query(self, build_query: Callable[[str], str], variables: Dict) -> Dict:
+        """Run a query, leaving out asset digests when the API does not know them."""
+        while True:
+            fields = RELEASE_FIELDS.format(asset_page_size=ASSET_PAGE_SIZE, asset_fields=self._asset_fields())
+            try:
+                self._count_query()
+                return self.github.graphql(build_query(fields), dict(variables, owner=self.owner, name=self.name))
+            except GithubException as e:
+                if self.with_digest and "digest" in str(e.data):
+                    self.logger.info("GraphQL API has no release asset digests, fetching without them")
+                    self.with_digest = False
+                    continue
+                raise
+
+    def _listing_page(self, cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+        """Fetch one page of the release listing."""
+        data = self._query(
+            lambda fields: LISTING_QUERY.format(page_size=PAGE_SIZE, fields=fields),
+            {"cursor": cursor}
+        )
+        releases = data["repository"]["releases"]
+        page_info = releases["pageInfo"]
+        return releases["nodes"], page_info["endCursor"] if page_info["hasNextPage"] else None
+
+    def _remaining_assets(self, tag: str, cursor: str) -> List[Dict]:
+        """Fetch the assets of a release following the first page."""
+        assets = []
+        while cursor:
+            data = self._query(
+                lambda fields: ASSETS_QUERY.format(page_size=PAGE_SIZE, asset_fields=self._asset_fields()),
+                {"tag": tag, "assetCursor": cursor}
+            )
+            release = data["repository"]["release"]
+            if not release:
+                # Deleted since the first page
+                break
+            page = release["releaseAssets"]
+            assets.extend(page["nodes"])
+            cursor = page["pageInfo"]["endCursor"] if page["pageInfo"]["hasNextPage"] else None
+        return assets
+
+    def _tags(self, prefix: str) -> List[str]:
+        """Find the tags starting with a prefix."""
+        tags = []
+        cursor = None
+        while True:
+            self._count_query()
+            data = self.github.graphql(
+                TAGS_QUERY, {"owner": self.owner, "name": self.name, "prefix": prefix, "cursor": cursor}
+            )
+            refs = data["repository"]["refs"]
+            # The ref query matches anywhere in the name
+            tags.extend(node["name"] for node in refs["nodes"] if node["name"].startswith(prefix))
+            if not refs["pageInfo"]["hasNextPage"]:
+                return tags
+            cursor = refs["pageInfo"]["endCursor"]
+
+    def _release_batch(self, tags: Sequence[str]) -> List[Dict]:
+        """Fetch the releases of up to a page of tags in one query."""
+        def build_query(fields: str) -> str:
+            parameters = ", ".join(f"$t{i}: String!" for i in range(len(tags)))
+            aliases = "\n".join(f"r{i}: release(tagName: $t{i}) {{ {fields} }}" for i in range(len(tags)))
+            return (
+                f"query($owner: String!, $name: String!, {parameters}) {{\n"
+                f"  repository(owner: $owner, name: $name) {{\n{aliases}\n  }}\n}}"
+            )
+
+        data = self._query(build_query, {f"t{i}": tag for i, tag in enumerate(tags)})
+        return [node for node in data["repository"].values() if node]
+
+    @staticmethod
+    def _prefetched(pages: Iterator[Callable[[], Tuple[List[Dict], bool]]]) -> Iterator[List[Dict]]:
+        """Yield pages while the next one is being fetched."""
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            fetch = next(pages, None)
+            future = executor.submit(fetch) if fetch else None
+            while future:
+                nodes, more = future.result()
+                fetch = next(pages, None) if more else None
+                future = executor.submit(fetch) if fetch else None
+                yield nodes
+
+    def _listing_pages(self) -> Iterator[List[Dict]]:
+        """Page through all releases."""
+        state = {"cursor": None}
+
+        def fetch():
+            nodes, state["cursor"] = self._listing_page(state["cursor"])
+            return nodes, state["cursor"] is not None
+
+        def fetches():
+            while True:
+                yield fetch
+
+        return self._prefetched(fetches())
+
+    def _tagged_pages(self, tag_prefixes: Sequence[str]) -> Iterator[List[Dict]]:
+        """Fetch the releases of the tags with the given prefixes."""
+        tags = [tag for prefix in tag_prefixes for tag in self._tags(prefix)]
+        batches = [tags[i:i + PAGE_SIZE] for i in range(0, len(tags), PAGE_SIZE)]
+        fetches = iter([
+            (lambda batch=batch, last=index == len(batches) - 1: (self._release_batch(batch), not last))
+            for index, batch in enumerate(batches)
+        ])
+        return self._prefetched(fetches)
+
+    def iter_releases(self, tag_prefixes: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Stream releases, optionally only those with a tag starting with one of the prefixes.
+
+        Args:
+            tag_prefixes: Tag prefixes to keep, all releases if None
+
+        Returns:
+            Iterator of dicts with the release "id", "name", "tag_name",
+            "is_prerelease", "description" and "assets" mapping asset name to
+            its "id", "size" and "digest"
+        """
+        if tag_prefixes is not None and len(tag_prefixes) <= MAX_TAG_PREFIXES:
+            pages = self._tagged_pages(tag_prefixes)
+        else:
+            pages = self._listing_pages()
+
+        prefixes = tuple(tag_prefixes) if tag_prefixes is not None else None
+        for nodes in pages:
+            for node in nodes:
+                if prefixes is not None and not node["tagName"].startswith(prefixes):
+                    continue
+                assets = node["releaseAssets"]["nodes"]
+                if node["releaseAssets"]["pageInfo"]["hasNextPage"]:
+                    self.logger.debug(f"Release {node['tagName']} has more than {ASSET_PAGE_SIZE} assets, "
+                                      f"fetching the rest")
+                    assets = assets + self._remaining_assets(
+                        node["tagName"], node["releaseAssets"]["pageInfo"]["endCursor"]
+                    )
+                yield {
+                    "id": node.get("databaseId"),
+                    "name": node.get("name") or node["tagName"],
+                    "tag_name": node["tagName"],
+                    "is_prerelease": node["isPrerelease"],
+                    "description": node.get("description") or "",
+                    "assets": {
+                        asset["name"]: {
+                            "id": asset.get("databaseId"), "size": asset.get("size"), "digest": asset.get("digest")
+                        }
+                        for asset in assets
+                    },
+                }
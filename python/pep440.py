@@ -0,0 +1,199 @@
+"""
+PEP 440 version parsing and ordering and PEP 503 name normalization shared by the generators.
+"""
+
+import functools
+import math
+import re
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+
+def canonical_name(name: str) -> str:
+    """Normalize a package name as PyPI does, so aliases compare equal.
+
+    Args:
+        name: Package name
+
+    Returns:
+        Lowercase name with runs of "-", "_" and "." replaced by "-"
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+# Regular expression from PEP 440, Appendix B
+VERSION_PATTERN = r"""
+    v?
+    (?:
+        (?:(?P<epoch>[0-9]+)!)?
+        (?P<release>[0-9]+(?:\.[0-9]+)*)
+        (?P<pre>
+            [-_\.]?
+            (?P<pre_l>alpha|a|beta|b|preview|pre|c|rc)
+            [-_\.]?
+            (?P<pre_n>[0-9]+)?
+        )?
+        (?P<post>
+            (?:-(?P<post_n1>[0-9]+))
+            |
+            (?:
+                [-_\.]?
+                (?P<post_l>post|rev|r)
+                [-_\.]?
+                (?P<post_n2>[0-9]+)?
+            )
+        )?
+        (?P<dev>
+            [-_\.]?
+            (?P<dev_l>dev)
+            [-_\.]?
+            (?P<dev_n>[0-9]+)?
+        )?
+    )
+    (?:\+(?P<local>[a-z0-9]+(?:[-_\.][a-z0-9]+)*))?
+"""
+
+_VERSION_RE = re.compile(r"^\s*" + VERSION_PATTERN + r"\s*$", re.VERBOSE | re.IGNORECASE)
+
+# Pre-release phases in PEP 440 order; a final release sorts after all of them
+_PRE_PHASES = {"a": 0, "alpha": 0, "b": 1, "beta": 1, "c": 2, "pre": 2, "preview": 2, "rc": 2}
+_FINAL = 3
+# A dev release of a final version sorts before its pre-releases
+_DEV_ONLY = -1
+
+
+class InvalidVersion(ValueError):
+    """Raised when a version string is not valid according to PEP 440."""
+
+
+class VersionKey(NamedTuple):
+    """Comparable key of a parsed version.
+
+    Tuple ordering of the fields is PEP 440 ordering, so keys can be sorted,
+    compared, hashed and bisected directly. Equal versions such as "1.0" and
+    "1.0.0" have equal keys.
+    """
+
+    epoch: int
+    release: Tuple[int, ...]
+    pre: Tuple[int, int]
+    post: int
+    dev: float
+    local: Tuple[Tuple[int, int, str], ...]
+
+    @property
+    def is_prerelease(self) -> bool:
+        """Whether the version is a pre-release or a development release."""
+        return self.pre[0] != _FINAL or self.dev != math.inf
+
+    @property
+    def is_postrelease(self) -> bool:
+        """Whether the version is a post-release."""
+        return self.post >= 0
+
+
+@functools.lru_cache(maxsize=None)
+def parse(version: str) -> VersionKey:
+    """Parse a version string into its comparable key.
+
+    Results are cached, so parsing the same string again returns the same
+    key object.
+
+    Args:
+        version: Version string
+
+    Returns:
+        VersionKey ordered according to PEP 440
+
+    Raises:
+        InvalidVersion: If the version is not valid according to PEP 440
+    """
+    match = _VERSION_RE.match(version)
+    if not match:
+        raise InvalidVersion(f"Invalid version: {version!r}")
+
+    epoch = int(match.group("epoch") or 0)
+
+    # Trailing zeros do not change the version, so 1.0 == 1.0.0
+    release = tuple(int(part) for part in match.group("release").split("."))
+    while len(release) > 1 and release[-1] == 0:
+        release = release[:-1]
+
+    post_n = match.group("post_n1") or match.group("post_n2")
+    post = int(post_n or 0) if match.group("post") else -1
+    dev = int(match.group("dev_n") or 0) if match.group("dev") else math.inf
+
+    if match.group("pre"):
+        pre = (_PRE_PHASES[match.group("pre_l").lower()], int(match.group("pre_n") or 0))
+    elif post < 0 and dev != math.inf:
+        pre = (_DEV_ONLY, 0)
+    else:
+        pre = (_FINAL, 0)
+
+    # Numeric local segments sort after alphanumeric ones
+    local = ()
+    if match.group("local"):
+        local = tuple(
+            (1, int(part), "") if part.isdigit() else (0, 0, part.lower())
+            for part in re.split(r"[-_\.]", match.group("local"))
+        )
+
+    return VersionKey(epoch, release, pre, post, dev, local)
+
+
+def try_parse(version: str) -> Optional[VersionKey]:
+    """Parse a version string, returning None if it is not valid.
+
+    Args:
+        version: Version string
+
+    Returns:
+        VersionKey or None
+    """
+    try:
+        return parse(version)
+    except InvalidVersion:
+        return None
+
+
+def sort_versions(versions: Iterable[str], reverse: bool = False) -> List[str]:
+    """Sort version strings according to PEP 440.
+
+    Args:
+        versions: Version strings, all of which must be valid
+        reverse: Sort from newest to oldest
+
+    Returns:
+        Sorted list of version strings
+    """
+    return sorted(versions, key=parse, reverse=reverse)
+
+
+def filter_versions(versions: Iterable[str], min_version: Optional[str] = None,
+                    include_prereleases: bool = False) -> List[str]:
+    """Select the valid versions at or above min_version, sorted oldest first.
+
+    Invalid versions are dropped. Each version is parsed only once.
+
+    Args:
+        versions: Version strings
+        min_version: Lowest version to include
+        include_prereleases: Include pre-releases and development releases
+
+    Returns:
+        Sorted list of the selected version strings
+    """
+    min_key = parse(min_version) if min_version is not None else None
+
+    selected = []
+    for version in versions:
+        key = try_parse(version)
+        if key is None:
+            continue
+        if min_key is not None and key < min_key:
+            continue
+        if not include_prereleases and key.is_prerelease:
+            continue
+        selected.append((key, version))
+
+    selected.sort(key=lambda item: item[0])
+    return [version for _, version in selected]
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Run the generator stages in a single process over a shared in-memory state.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from api_metrics import METRICS
+from asset_uploader import AssetUploader
+from document_store import DocumentStore
+from github_client import GitHubClient
+from generate_build_info import BuildInfoGenerator
+from generate_hermit_manifest import HermitManifestGenerator
+from generate_pex import PexGenerator
+from generate_releases import ReleaseGenerator
+from generate_requirements import RequirementsGenerator
+from generate_state import StateGenerator
+from pypi_cache import PyPIMetadataCache
+from pypi_client import DEFAULT_INDEX_URL, PyPIClient
+from release_snapshot import ReleaseSnapshot
+from state_fingerprints import StateFingerprints
+
+
+# Stages in the order the Taskfile runs them
+STAGES = ["state", "requirements", "releases", "build", "build_info", "hermit_manifest"]
+
+
+class Pipeline:
+    """Run a subset of the generator stages with shared clients and state."""
+
+    def __init__(self, package_dir: str, dist_dir: str, tmp_dir: str, github_repo: str,
+                 github_token: Optional[str] = None, jobs: int = 1, pypi_cache_dir: Optional[str] = None,
+                 checkpoint: str = "stage", build_jobs: Optional[int] = None, compress_jobs: int = 1,
+                 rebuild: bool = False, upload_jobs: int = 4, release_fetch: str = "graphql",
+                 release_snapshot: Optional[str] = None, github_api_url: Optional[str] = None,
+                 github: Optional[GitHubClient] = None, pypi_index_url: Optional[str] = None,
+                 state_fingerprints: Optional[str] = None, full_state: bool = False,
+                 change_feed: bool = False, pypi_api: str = "json"):
+        """Initialize the pipeline.
+
+        Args:
+            package_dir: Directory containing the package configurations
+            dist_dir: Directory to store the built PEX files
+            tmp_dir: Directory for temporary files
+            github_repo: GitHub repository name (owner/repo)
+            github_token: GitHub token for authentication
+            jobs: Number of concurrent PyPI requests
+            pypi_cache_dir: Directory for the PyPI metadata cache, disabled if None
+            checkpoint: When to write state to disk, after every "stage" or only at the "end"
+            build_jobs: Number of versions to build concurrently, defaults to the CPU count
+            compress_jobs: Number of threads compressing each tarball
+            rebuild: Also build versions that already have an asset, only uploading changed tarballs
+            upload_jobs: Number of assets to upload concurrently
+            release_fetch: Fetch the releases through "graphql" or page them through "rest"
+            release_snapshot: File to keep the release snapshot in between runs, kept in memory if None
+            github_api_url: Base URL of the GitHub REST API, e.g. of a local stand-in, the public API if None
+            github: GitHub client shared by all stages, created from github_token on first use if None
+            pypi_index_url: Base URL of the PyPI JSON API, e.g. of a mirror or local stand-in, pypi.org if None
+            state_fingerprints: File recording the inputs of every state, every state is generated if None
+            full_state: Generate the state of every package even if its inputs are unchanged
+            change_feed: Only fetch the packages the PyPI changelog reports changes for, needs state_fingerprints
+            pypi_api: List the PyPI versions through the "json" or the lighter PEP 691 "simple" API
+        """
+        self.package_dir = Path(package_dir)
+        self.dist_dir = dist_dir
+        self.tmp_dir = tmp_dir
+        self.github_repo = github_repo
+        self.github_token = github_token or os.environ.get("GITHUB_TOKEN")
+        self.checkpoint = checkpoint
+        self.build_jobs = build_jobs
+        self.compress_jobs = compress_jobs
+        self.rebuild = rebuild
+        self.upload_jobs = upload_jobs
+        self.release_fetch = release_fetch
+        self.github_api_url = github_api_url
+        self.logger = logging.getLogger('pipeline')
+
+        self.documents = DocumentStore(deferred=True)
+        self.snapshot = ReleaseSnapshot(release_snapshot, github_repo)
+        self.fingerprints = StateFingerprints(state_fingerprints) if state_fingerprints else None
+        self.full_state = full_state
+        self.change_feed = change_feed
+        pypi_cache = PyPIMetadataCache(pypi_cache_dir) if pypi_cache_dir else None
+        self.pypi = PyPIClient(index_url=pypi_index_url or DEFAULT_INDEX_URL, jobs=jobs, cache=pypi_cache,
+                               api=pypi_api)
+        self._github = github
+        self.stage = "default"
+
+    @property
+    def github(self) -> GitHubClient:
+        """GitHub client shared by all stages, created on first use."""
+        if self._github is None:
+            if not self.github_token:
+                self.logger.error("GITHUB_TOKEN not set. GitHub API operations will fail.")
+                sys.exit(1)
+            self._github = GitHubClient(self.github_token, stage=self.stage, base_url=self.github_api_url)
+        return self._github
+
+    def run_state(self, packages: List[str]) -> bool:
+        """Generate the state of the packages."""
+        generator = StateGenerator(
+            package_dir=self.package_dir,
+            github_repo=self.github_repo,
+            github_token=self.github_token,
+            github=self.github,
+            documents=self.documents,
+            pypi=self.pypi,
+            release_fetch=self.release_fetch,
+            snapshot=self.snapshot,
+            fingerprints=self.fingerprints,
+            full=self.full_state,
+            change_feed=self.change_feed
+        )
+        generator.prefetch_pypi_versions(packages)
+        generator.prefetch_github_releases(packages)
+        success = self._run_each(packages, generator.process_package)
+        if self.fingerprints is not None:
+            self.logger.info(f"Skipped the state of {generator.skipped} packages with unchanged inputs")
+        return success
+
+    def run_requirements(self, packages: List[str]) -> bool:
+        """Generate the requirements of the packages."""
+        generator = RequirementsGenerator(package_dir=self.package_dir, documents=self.documents)
+        return self._run_each(packages, generator.process_package)
+
+    def run_releases(self, packages: List[str]) -> bool:
+        """Create the GitHub releases of the packages."""
+        generator = ReleaseGenerator(
+            package_dir=self.package_dir,
+            github_repo=self.github_repo,
+            github_token=self.github_token,
+            github=self.github,
+            documents=self.documents,
+            snapshot=self.snapshot
+        )
+        return self._run_each(packages, generator.process_package)
+
+    def run_build(self, packages: List[str]) -> bool:
+        """Build and upload the PEX files of the packages."""
+        generator = PexGenerator(
+            package_dir=self.package_dir,
+            dist_dir=self.dist_dir,
+            tmp_dir=self.tmp_dir,
+            github_repo=self.github_repo,
+            github_token=self.github_token,
+            github=self.github,
+            documents=self.documents,
+            build_jobs=self.build_jobs,
+            compress_jobs=self.compress_jobs,
+            rebuild=self.rebuild,
+            uploader=AssetUploader(self.github_token, jobs=self.upload_jobs),
+            snapshot=self.snapshot
+        )
+        try:
+            return self._run_each(packages, generator.process_package)
+        finally:
+            generator.close()
+
+    def run_build_info(self, packages: List[str]) -> bool:
+        """Update the GitHub release descriptions of the packages."""
+        generator = BuildInfoGenerator(
+            package_dir=self.package_dir,
+            github_repo=self.github_repo,
+            github_token=self.github_token,
+            github=self.github,
+            documents=self.documents,
+            snapshot=self.snapshot
+        )
+        return self._run_each(packages, generator.process_package)
+
+    def run_hermit_manifest(self, packages: List[str]) -> bool:
+        """Generate the Hermit manifests of the packages."""
+        generator = HermitManifestGenerator(package_dir=self.package_dir, documents=self.documents)
+        return self._run_each(packages, generator.generate_manifest)
+
+    def _run_each(self, packages: List[str], process: Callable[[str], bool]) -> bool:
+        """Run a stage for each package, continuing after failures.
+
+        Args:
+            packages: Package directory names (under python/)
+            process: Function processing a single package
+
+        Returns:
+            bool: True if all packages succeeded, False otherwise
+        """
+        success = True
+        for package in packages:
+            self.logger.info(f"Processing package: {package}")
+            with METRICS.package_context(package):
+                if not process(package):
+                    self.logger.error(f"Failed to process package {package}")
+                    success = False
+        return success
+
+    def run(self, stages: List[str], packages: List[str]) -> Dict[str, bool]:
+        """Run the given stages in pipeline order.
+
+        A failed stage does not stop the following stages, matching
+        continue-on-error in the workflow.
+
+        Args:
+            stages: Names of the stages to run
+            packages: Package directory names (under python/)
+
+        Returns:
+            Dict mapping stage name to whether it succeeded
+        """
+        results = {}
+        try:
+            for stage in [s for s in STAGES if s in stages]:
+                self.logger.info(f"Running stage: {stage}")
+                self.stage = stage
+                METRICS.stage = stage
+                if self._github is not None:
+                    self._github.stage = stage
+                try:
+                    results[stage] = getattr(self, f"run_{stage}")(packages)
+                except Exception as e:
+                    self.logger.error(f"Error in stage {stage}: {e}", exc_info=True)
+                    results[stage] = False
+
+                if self.checkpoint == "stage":
+                    self.documents.flush()
+                    self.snapshot.save()
+                    if self.fingerprints is not None:
+                        self.fingerprints.save()
+        finally:
+            self.documents.flush()
+            self.snapshot.save()
+            if self.fingerprints is not None:
+                self.fingerprints.save()
+            self.logger.info(self.snapshot.summary())
+            self.pypi.close()
+            if self._github is not None:
+                self.logger.info(self._github.summary())
+            self.logger.info(METRICS.summary())
+
+        return results
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Run the generator stages in a single process")
+    parser.add_argument("package", nargs='+', help="Package directory name(s) (under python/)")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Comma separated stages to run, any of: {', '.join(STAGES)}")
+    parser.add_argument("--checkpoint", default="stage", choices=["stage", "end"],
+                        help="Write state to disk after every stage or only at the end")
+    parser.add_argument("--dist-dir", default=os.environ.get("DIST_DIR", "dist"),
+                        help="Directory to store built PEX files")
+    parser.add_argument("--tmp-dir", default=os.environ.get("TMP_DIR", "tmp"),
+                        help="Directory for temporary files")
+    parser.add_argument("--pypi-index-url", default=os.environ.get("PYPI_INDEX_URL", DEFAULT_INDEX_URL),
+                        help="Base URL of the PyPI JSON API, e.g. of a mirror or local stand-in")
+    parser.add_argument("--pypi-api", default=os.environ.get("PYPI_API", "json"), choices=["json", "simple"],
+                        help="List the PyPI versions through the JSON API or the lighter PEP 691 Simple API")
+    parser.add_argument("--jobs", type=int, default=int(os.environ.get("PYPI_JOBS", "8")),
+                        help="Number of concurrent PyPI requests")
+    parser.add_argument("--pypi-cache-dir",
+                        default=os.path.join(os.environ.get("TMP_DIR", "tmp"), "pypi-cache"),
+                        help="Directory for the PyPI metadata cache")
+    parser.add_argument("--no-pypi-cache", action="store_true",
+                        help="Always download the full PyPI metadata")
+    parser.add_argument("--release-fetch", default=os.environ.get("RELEASE_FETCH", "graphql"),
+                        choices=["graphql", "rest"],
+                        help="Fetch the releases of the packages through GraphQL or page all of them through REST")
+    parser.add_argument("--api-metrics", default=os.environ.get("API_METRICS_FILE"),
+                        help="File to write the API calls made to as JSON on exit")
+    parser.add_argument("--release-snapshot",
+                        default=os.environ.get("RELEASE_SNAPSHOT", "python/release-snapshot.json"),
+                        help="File to keep the release snapshot in between runs")
+    parser.add_argument("--state-fingerprints",
+                        default=os.environ.get("STATE_FINGERPRINTS", "python/state-fingerprints.json"),
+                        help="File recording the inputs of every state, to skip packages whose inputs are unchanged")
+    parser.add_argument("--full-state", action="store_true",
+                        help="List the releases and generate the state of every package, even if unchanged")
+    parser.add_argument("--no-change-feed", dest="change_feed", action="store_false",
+                        help="Fetch every package instead of asking the PyPI changelog which packages changed")
+    parser.add_argument("--build-jobs", type=int, default=int(os.environ.get("BUILD_JOBS", "0")) or None,
+                        help="Number of versions to build concurrently (default: CPU count)")
+    parser.add_argument("--compress-jobs", type=int, default=int(os.environ.get("COMPRESS_JOBS", "1")),
+                        help="Number of threads compressing each tarball, 1 uses the standard gzip writer")
+    parser.add_argument("--upload-jobs", type=int, default=int(os.environ.get("UPLOAD_JOBS", "4")),
+                        help="Number of assets to upload concurrently")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Also build versions that already have an asset, only uploading changed tarballs")
+    parser.add_argument("--github-token", help="GitHub token for authentication")
+    parser.add_argument("--github-repo", default="vgijssel/hermit-python-packages",
+                        help="GitHub repository name (owner/repo)")
+    parser.add_argument("--github-api-url", default=os.environ.get("GITHUB_API_URL", "https://api.github.com"),
+                        help="Base URL of the GitHub REST API, e.g. of a local stand-in")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+                        help="Set the logging level")
+
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    logger = logging.getLogger('pipeline')
+    METRICS.dump_at_exit(args.api_metrics)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        logger.error(f"Unknown stages: {', '.join(unknown)}")
+        sys.exit(1)
+
+    package_dir = Path("python")
+    if not package_dir.exists():
+        logger.error(f"Package directory not found: {package_dir}")
+        sys.exit(1)
+
+    try:
+        pipeline = Pipeline(
+            package_dir=package_dir,
+            dist_dir=args.dist_dir,
+            tmp_dir=args.tmp_dir,
+            github_repo=args.github_repo,
+            github_api_url=args.github_api_url,
+            github_token=args.github_token,
+            pypi_index_url=args.pypi_index_url,
+            pypi_api=args.pypi_api,
+            jobs=args.jobs,
+            pypi_cache_dir=None if args.no_pypi_cache else args.pypi_cache_dir,
+            checkpoint=args.checkpoint,
+            build_jobs=args.build_jobs,
+            compress_jobs=args.compress_jobs,
+            rebuild=args.rebuild,
+            upload_jobs=args.upload_jobs,
+            release_fetch=args.release_fetch,
+            release_snapshot=args.release_snapshot,
+            state_fingerprints=args.state_fingerprints,
+            full_state=args.full_state,
+            change_feed=args.change_feed
+        )
+        results = pipeline.run(stages, args.package)
+
+        failed = [stage for stage, success in results.items() if not success]
+        if failed:
+            logger.error(f"Failed stages: {', '.join(failed)}")
+            sys.exit(1)
+    except Exception as e:
+        logger.error(f"Error: {e}", exc_info=True)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
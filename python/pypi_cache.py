@@ -0,0 +1,172 @@
+"""
+Persistent on-disk cache for PyPI JSON metadata with conditional revalidation.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pep440 import canonical_name
+
+
+class PyPIMetadataCache:
+    """Store the parsed version list of each package with its validators.
+
+    Each package is stored as a small JSON file holding the versions together
+    with the ETag, Last-Modified and X-PyPI-Last-Serial values of the response
+    it came from, so the next request can be made conditional. Entries are
+    kept apart per index and API, as their validators only apply to the URL
+    they came from.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 64 * 1024 * 1024, max_age: float = 7 * 24 * 3600):
+        """Initialize the metadata cache.
+
+        Args:
+            cache_dir: Directory to store the cache entries in
+            max_bytes: Maximum total size of all entries before the least recently used are evicted
+            max_age: Maximum age in seconds of an entry since it was last used
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.logger = logging.getLogger('pypi_cache')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, package_name: str, index_url: str, api: str) -> Path:
+        """Get the path of the entry for a package.
+
+        Args:
+            package_name: Name of the package
+            index_url: Base URL of the PyPI JSON API the versions were listed from
+            api: API the versions were listed through, "json" or "simple"
+
+        Returns:
+            Path to the JSON entry file
+        """
+        # Aliases of a name share one entry, canonical names contain no "."
+        index = hashlib.sha256(index_url.rstrip("/").encode()).hexdigest()[:16]
+        return self.cache_dir / f"{canonical_name(package_name)}.{api}.{index}.json"
+
+    def get(self, package_name: str, index_url: str, api: str) -> Optional[Dict]:
+        """Get the cache entry for a package.
+
+        Args:
+            package_name: Name of the package
+            index_url: Base URL of the PyPI JSON API
+            api: Version listing API, "json" or "simple"
+
+        Returns:
+            Dict with versions, etag, last_modified and serial or None if not cached
+        """
+        entry_path = self._entry_path(package_name, index_url, api)
+        try:
+            with open(entry_path, "r") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable cache entry {entry_path}: {e}")
+            return None
+
+        if time.time() - entry_path.stat().st_mtime > self.max_age:
+            self.logger.debug(f"Cache entry for {package_name} expired")
+            return None
+
+        return entry
+
+    def put(self, package_name: str, index_url: str, api: str, versions: List[str], etag: Optional[str] = None,
+            last_modified: Optional[str] = None, serial: Optional[int] = None,
+            version_info: Optional[Dict[str, Dict]] = None) -> None:
+        """Store the versions of a package with the validators of its response.
+
+        Args:
+            package_name: Name of the package
+            index_url: Base URL of the PyPI JSON API
+            api: Version listing API, "json" or "simple"
+            versions: Versions listed by PyPI
+            etag: ETag header of the response
+            last_modified: Last-Modified header of the response
+            serial: X-PyPI-Last-Serial header of the response
+            version_info: Yanked and requires-python flags per version
+        """
+        entry = {
+            "package": package_name,
+            "index_url": index_url,
+            "api": api,
+            "versions": versions,
+            "etag": etag,
+            "last_modified": last_modified,
+            "serial": serial,
+            "version_info": version_info,
+        }
+
+        # Write atomically so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._entry_path(package_name, index_url, api))
+
+    def touch(self, package_name: str, index_url: str, api: str) -> None:
+        """Mark the entry of a package as used, resetting its age.
+
+        Args:
+            package_name: Name of the package
+            index_url: Base URL of the PyPI JSON API
+            api: Version listing API, "json" or "simple"
+        """
+        try:
+            os.utime(self._entry_path(package_name, index_url, api))
+        except FileNotFoundError:
+            pass
+
+    def record(self, hit: bool) -> None:
+        """Count a cache hit or miss.
+
+        Args:
+            hit: True when the cached versions were used
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def prune(self) -> int:
+        """Evict expired entries and the least recently used ones above max_bytes.
+
+        Returns:
+            Number of evicted entries
+        """
+        now = time.time()
+        entries = []
+        for entry_path in self.cache_dir.glob("*.json"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+        evicted = 0
+        total_bytes = sum(size for _, size, _ in entries)
+        # Oldest first, so expired entries and then the least recently used go first
+        for mtime, size, entry_path in sorted(entries):
+            if now - mtime <= self.max_age and total_bytes <= self.max_bytes:
+                break
+            entry_path.unlink(missing_ok=True)
+            total_bytes -= size
+            evicted += 1
+
+        if evicted:
+            self.logger.info(f"Evicted {evicted} PyPI cache entries from {self.cache_dir}")
+        return evicted
@@ -0,0 +1,312 @@
+"""
+Shared, connection-pooled client for the PyPI JSON and Simple APIs.
+"""
+
+import logging
+import re
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from api_metrics import METRICS, ApiMetrics
+from pep440 import canonical_name
+from pypi_cache import PyPIMetadataCache
+
+
+DEFAULT_INDEX_URL = "https://pypi.org/pypi"
+
+# Accept header value selecting the PEP 691 JSON form of the Simple API
+SIMPLE_JSON = "application/vnd.pypi.simple.v1+json"
+
+# Archive extensions of source distributions, longest first
+SDIST_EXTENSIONS = (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".zip", ".tar")
+
+
+def file_version(filename: str) -> Optional[str]:
+    """Get the version of a distribution file from its name.
+
+    Args:
+        filename: Name of a wheel, egg or source distribution
+
+    Returns:
+        Version part of the name, None if the name has no recognizable version
+    """
+    if filename.endswith((".whl", ".egg")):
+        parts = filename.split("-", 2)
+        return parts[1] if len(parts) > 2 else None
+    for extension in SDIST_EXTENSIONS:
+        if filename.endswith(extension):
+            stem = filename[:-len(extension)]
+            return stem.rsplit("-", 1)[1] if "-" in stem else None
+    return None
+
+
+def version_flags(files: List[Dict], requires_python_key: str) -> Dict:
+    """Summarize the files of a version.
+
+    Args:
+        files: File entries of the version
+        requires_python_key: Key of the Requires-Python value in the entries
+
+    Returns:
+        Dict with "yanked", True if the version has files and all are yanked,
+        and "requires_python", the first Requires-Python of the files
+    """
+    return {
+        "yanked": bool(files) and all(file.get("yanked") for file in files),
+        "requires_python": next((file[requires_python_key] for file in files if file.get(requires_python_key)), None),
+    }
+
+
+class PyPIClient:
+    """Fetch package metadata from PyPI over a shared, pooled HTTP session."""
+
+    def __init__(self, index_url: str = DEFAULT_INDEX_URL, jobs: int = 1,
+                 max_connections_per_host: Optional[int] = None, timeout: float = 30.0,
+                 cache: Optional[PyPIMetadataCache] = None, metrics: Optional[ApiMetrics] = None,
+                 api: str = "json", simple_url: Optional[str] = None):
+        """Initialize the PyPI client.
+
+        Args:
+            index_url: Base URL of the PyPI JSON API
+            jobs: Maximum number of requests in flight at the same time
+            max_connections_per_host: Maximum number of pooled connections per host,
+                defaults to the number of jobs
+            timeout: Timeout in seconds for a single request
+            cache: Metadata cache used to make requests conditional
+            metrics: API metrics to record the requests in, the process wide metrics if None
+            api: List versions through the "json" API or the much smaller PEP 691 "simple" API
+            simple_url: Base URL of the Simple API, derived from index_url if None
+        """
+        self.index_url = index_url.rstrip("/")
+        self.api = api
+        self.simple_url = (simple_url or re.sub(r"/pypi$", "/simple", self.index_url)).rstrip("/")
+        self.jobs = max(1, jobs)
+        self.max_connections_per_host = max(1, max_connections_per_host or self.jobs)
+        self.timeout = timeout
+        self.cache = cache
+        self.logger = logging.getLogger('pypi_client')
+        # Last serial PyPI reported per package, None if it sent none
+        self.serials: Dict[str, Optional[int]] = {}
+        # Yanked and requires-python flags per version of every listed package
+        self.version_info: Dict[str, Dict[str, Dict]] = {}
+
+        # One session for all requests so TLS connections are reused. The pool
+        # blocks instead of opening extra connections once a host is saturated.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.max_connections_per_host,
+            pool_maxsize=self.max_connections_per_host,
+            pool_block=True,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        (metrics or METRICS).instrument(self.session, "pypi")
+
+    def get_release_versions(self, package_name: str) -> List[str]:
+        """Get all release versions of a package as listed by PyPI.
+
+        The yanked and requires-python flags of the versions are kept in
+        version_info.
+
+        Args:
+            package_name: Name of the package
+
+        Returns:
+            List of version strings in the order PyPI returns them
+        """
+        headers = {}
+        if self.api == "simple":
+            url = f"{self.simple_url}/{canonical_name(package_name)}/"
+            headers["Accept"] = SIMPLE_JSON
+        else:
+            url = f"{self.index_url}/{package_name}/json"
+        entry = self.cache.get(package_name, self.index_url, self.api) if self.cache else None
+
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        # Stream so the body is only parsed when the cached entry is stale
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if entry and response.status_code == 304:
+                self.logger.debug(f"PyPI metadata for {package_name} not modified")
+                self._drain(response)
+                self.serials[package_name] = entry.get("serial")
+                self.version_info[package_name] = entry.get("version_info") or {}
+                self.cache.touch(package_name, self.index_url, self.api)
+                self.cache.record(hit=True)
+                return entry["versions"]
+
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            serial = self._parse_serial(response.headers.get("X-PyPI-Last-Serial"))
+            self.serials[package_name] = serial
+
+            if entry and serial is not None and serial == entry.get("serial"):
+                self.logger.debug(f"PyPI serial for {package_name} unchanged at {serial}")
+                self._drain(response)
+                self.version_info[package_name] = entry.get("version_info") or {}
+                self.cache.put(package_name, self.index_url, self.api, entry["versions"], etag, last_modified,
+                               serial, entry.get("version_info"))
+                self.cache.record(hit=True)
+                return entry["versions"]
+
+            data = response.json()
+
+        if self.api == "simple":
+            version_info = self._simple_version_info(data)
+        else:
+            version_info = {
+                version: version_flags(files, "requires_python") for version, files in data["releases"].items()
+            }
+        del data
+        versions = list(version_info)
+        self.version_info[package_name] = version_info
+        if self.cache:
+            self.cache.put(package_name, self.index_url, self.api, versions, etag, last_modified, serial,
+                           version_info)
+            self.cache.record(hit=False)
+        return versions
+
+    @staticmethod
+    def _drain(response: requests.Response) -> None:
+        """Read the rest of a streamed response without keeping it.
+
+        A streamed response closed before its body was read closes its
+        connection instead of returning it to the pool.
+
+        Args:
+            response: Streamed response
+        """
+        for _ in response.iter_content(65536):
+            pass
+
+    @staticmethod
+    def _simple_version_info(data: Dict) -> Dict[str, Dict]:
+        """Group the files of a PEP 691 project page by version.
+
+        Pages of API version 1.1 and later list the versions (PEP 700),
+        including those without files. Older pages only list files, their
+        versions are taken from the file names.
+
+        Args:
+            data: Project page as returned by the Simple API
+
+        Returns:
+            Dict mapping version to its yanked and requires-python flags
+        """
+        listed = "versions" in data
+        version_info = {version: {"yanked": False, "requires_python": None} for version in data.get("versions", [])}
+        with_files = set()
+        # One pass without grouping the files, pages of large projects list tens of thousands
+        for file in data.get("files", []):
+            version = file_version(file["filename"])
+            flags = version_info.get(version)
+            if flags is None:
+                if listed or version is None:
+                    continue
+                flags = version_info[version] = {"yanked": False, "requires_python": None}
+            if version not in with_files:
+                with_files.add(version)
+                flags["yanked"] = bool(file.get("yanked"))
+            elif not file.get("yanked"):
+                flags["yanked"] = False
+            if flags["requires_python"] is None:
+                flags["requires_python"] = file.get("requires-python") or None
+        return version_info
+
+    @staticmethod
+    def _parse_serial(value: Optional[str]) -> Optional[int]:
+        """Parse an X-PyPI-Last-Serial header value.
+
+        Args:
+            value: Header value, if present
+
+        Returns:
+            The serial as an int or None if missing or malformed
+        """
+        try:
+            return int(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def get_release_versions_many(self, package_names: Iterable[str]) -> Dict[str, Union[List[str], Exception]]:
+        """Get the release versions of many packages concurrently.
+
+        At most `jobs` requests are in flight at any time. A failure for one
+        package does not affect the others; its exception is returned in place
+        of the version list.
+
+        Args:
+            package_names: Names of the packages
+
+        Returns:
+            Dict mapping package name to its versions or the raised exception
+        """
+        package_names = list(dict.fromkeys(package_names))
+        results = {}
+
+        def fetch(package_name: str) -> Union[List[str], Exception]:
+            try:
+                return self.get_release_versions(package_name)
+            except Exception as e:
+                self.logger.error(f"Error fetching PyPI versions for {package_name}: {e}")
+                return e
+
+        self.logger.info(f"Fetching PyPI metadata for {len(package_names)} packages with {self.jobs} jobs")
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for package_name, result in zip(package_names, executor.map(fetch, package_names)):
+                results[package_name] = result
+
+        return results
+
+    def _xmlrpc(self, method: str, *params):
+        """Call a method of the PyPI XML-RPC API, which is served at the JSON API base URL."""
+        response = self.session.post(
+            self.index_url,
+            data=xmlrpc.client.dumps(params, method),
+            headers={"Content-Type": "text/xml"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        (result,), _ = xmlrpc.client.loads(response.content)
+        return result
+
+    def changelog_last_serial(self) -> int:
+        """Get the serial of the latest change on the whole index.
+
+        Returns:
+            Global PyPI serial
+        """
+        return int(self._xmlrpc("changelog_last_serial"))
+
+    def changed_since(self, serial: int) -> Tuple[Set[str], int]:
+        """Ask the changelog which packages changed after a serial.
+
+        One request covers the whole index, however many packages are tracked.
+
+        Args:
+            serial: Global serial up to which changes were already seen
+
+        Returns:
+            Tuple of the normalized names of the changed packages and the latest serial seen
+        """
+        changes = self._xmlrpc("changelog_since_serial", serial)
+        changed = {canonical_name(name) for name, *_ in changes}
+        last_serial = max([serial, *(int(change[4]) for change in changes)])
+        self.logger.info(f"PyPI changelog: {len(changes)} changes to {len(changed)} packages since serial {serial}")
+        return changed, last_serial
+
+    def close(self) -> None:
+        """Close the underlying HTTP session and prune the metadata cache."""
+        self.session.close()
+        if self.cache:
+            self.logger.info(f"PyPI metadata cache: {self.cache.hits} hits, {self.cache.misses} misses")
+            self.cache.prune()
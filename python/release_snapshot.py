@@ -0,0 +1,413 @@
+"""
+On-disk snapshot of the GitHub releases shared by the pipeline stages and jobs.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from github.GitRelease import GitRelease
+
+import yaml_io
+from github_client import GitHubClient
+
+
+# Bumped whenever the layout of the snapshot changes, older snapshots are ignored
+SNAPSHOT_FORMAT = 1
+
+
+def parse_release_info(description: Optional[str], logger: Optional[logging.Logger] = None) -> Optional[Dict]:
+    """Extract the release info from the YAML block of a release description.
+
+    Args:
+        description: GitHub release description
+        logger: Logger to report unparsable YAML to
+
+    Returns:
+        Dict containing the release info or None if not found
+    """
+    if not description:
+        return None
+
+    yaml_match = re.search(r'```yaml\n(.*?)```', description, re.DOTALL)
+    if not yaml_match:
+        return None
+
+    try:
+        return yaml_io.load(yaml_match.group(1))
+    except Exception as e:
+        (logger or logging.getLogger('release_snapshot')).error(f"Error parsing release info YAML: {e}")
+        return None
+
+
+def release_entry(raw_data: Dict, release_info: Optional[Dict] = None) -> Dict:
+    """Convert a release as returned by the GitHub REST API to a snapshot entry.
+
+    Args:
+        raw_data: Release as returned by the GitHub API
+        release_info: Parsed release info, parsed from the body if None
+
+    Returns:
+        Snapshot entry of the release
+    """
+    if release_info is None:
+        release_info = parse_release_info(raw_data.get("body"))
+    return {
+        "id": raw_data["id"],
+        "name": raw_data.get("name") or raw_data["tag_name"],
+        "tag_name": raw_data["tag_name"],
+        "prerelease": bool(raw_data.get("prerelease")),
+        "release_info": release_info,
+        "assets": {
+            asset["name"]: {"id": asset["id"], "size": asset.get("size"), "digest": asset.get("digest")}
+            for asset in raw_data.get("assets", [])
+        },
+    }
+
+
+class ReleaseSnapshot:
+    """Keep the tags, prerelease flags, release info and assets of all releases on disk.
+
+    The state stage fills the snapshot from the release listing, later
+    stages and jobs look releases up in it and record their own changes, so
+    only writes reach the API. A release missing from the snapshot is
+    fetched once and added. Snapshots of another repository, in an older
+    format or fetched longer than max_age ago are ignored.
+    """
+
+    def __init__(self, path: Optional[str] = None, github_repo: Optional[str] = None,
+                 max_age: float = 24 * 3600):
+        """Initialize the release snapshot.
+
+        Args:
+            path: File to load the snapshot from and save it to, kept in memory only if None
+            github_repo: GitHub repository name (owner/repo) the releases belong to
+            max_age: Maximum age in seconds of a loaded snapshot since its releases were listed
+        """
+        self.path = Path(path) if path else None
+        self.github_repo = github_repo
+        self.max_age = max_age
+        self.logger = logging.getLogger('release_snapshot')
+        self.releases: Dict[str, Dict] = {}
+        self.revision = 0
+        self.fetched_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._lock = threading.Lock()
+        # Whether a usable snapshot of an earlier run was loaded from the file
+        self.loaded = self.load()
+
+    def load(self) -> bool:
+        """Load the snapshot from its file.
+
+        Returns:
+            True if a usable snapshot was loaded
+        """
+        if not self.path:
+            return False
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable release snapshot {self.path}: {e}")
+            return False
+
+        fetched_at = data.get("fetched_at") or 0
+        if data.get("format") != SNAPSHOT_FORMAT:
+            self.logger.info(f"Ignoring release snapshot {self.path} in format {data.get('format')}")
+            return False
+        if self.github_repo and data.get("repo") != self.github_repo:
+            self.logger.info(f"Ignoring release snapshot {self.path} of {data.get('repo')}")
+            return False
+        if time.time() - fetched_at > self.max_age:
+            self.logger.info(f"Ignoring release snapshot {self.path} listed {time.time() - fetched_at:.0f} s ago")
+            return False
+
+        with self._lock:
+            self.releases = data.get("releases", {})
+            self.revision = data.get("revision", 0)
+            self.fetched_at = fetched_at
+            self.dirty = False
+        self.logger.info(f"Loaded {len(self.releases)} releases from snapshot {self.path} revision {self.revision}")
+        return True
+
+    def save(self) -> None:
+        """Write the snapshot to its file if it changed, as the next revision."""
+        with self._lock:
+            if not self.path or not self.dirty:
+                return
+            self.revision += 1
+            data = {
+                "format": SNAPSHOT_FORMAT,
+                "repo": self.github_repo,
+                "revision": self.revision,
+                "fetched_at": self.fetched_at,
+                "releases": self.releases,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Write atomically so a job that is cancelled midway leaves the previous revision
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        self.logger.info(f"Saved {len(self.releases)} releases to snapshot {self.path} revision {self.revision}")
+
+    def replace(self, entries: Iterable[Dict], tag_prefixes: Optional[Iterable[str]] = None) -> None:
+        """Replace the releases with a fresh listing.
+
+        Args:
+            entries: Snapshot entries of the listed releases
+            tag_prefixes: Tag prefixes the listing was limited to, all releases were listed if None
+        """
+        prefixes = tuple(tag_prefixes) if tag_prefixes is not None else None
+        with self._lock:
+            if prefixes is None:
+                self.releases = {}
+            else:
+                self.releases = {tag: entry for tag, entry in self.releases.items() if not tag.startswith(prefixes)}
+            for entry in entries:
+                self.releases[entry["tag_name"]] = entry
+            self.fetched_at = time.time()
+            self.dirty = True
+
+    def get(self, tag_name: str) -> Optional[Dict]:
+        """Get the entry of a release.
+
+        Args:
+            tag_name: Tag of the release
+
+        Returns:
+            Snapshot entry of the release or None if it is not in the snapshot
+        """
+        with self._lock:
+            return self.releases.get(tag_name)
+
+    def put(self, entry: Dict) -> None:
+        """Add or replace the entry of a release.
+
+        Args:
+            entry: Snapshot entry of the release
+        """
+        with self._lock:
+            self.releases[entry["tag_name"]] = entry
+            self.dirty = True
+
+    def remove(self, tag_name: str) -> None:
+        """Remove a release.
+
+        Args:
+            tag_name: Tag of the release
+        """
+        with self._lock:
+            if self.releases.pop(tag_name, None) is not None:
+                self.dirty = True
+
+    def update(self, tag_name: str, **fields) -> None:
+        """Change fields of a release entry, e.g. after the release was edited.
+
+        Args:
+            tag_name: Tag of the release
+            **fields: Entry fields to set
+        """
+        with self._lock:
+            if tag_name in self.releases:
+                self.releases[tag_name].update(fields)
+                self.dirty = True
+
+    def set_asset(self, tag_name: str, asset_name: str, asset: Optional[Dict]) -> None:
+        """Record an uploaded asset of a release, or its removal.
+
+        Args:
+            tag_name: Tag of the release
+            asset_name: Name of the asset
+            asset: Dict with the id, size and digest of the asset, None if it was deleted
+        """
+        with self._lock:
+            entry = self.releases.get(tag_name)
+            if entry is None:
+                return
+            if asset is None:
+                entry["assets"].pop(asset_name, None)
+            else:
+                entry["assets"][asset_name] = asset
+            self.dirty = True
+
+    def merge(self, paths: Iterable[str]) -> int:
+        """Merge the asset changes of snapshots saved by parallel jobs.
+
+        Every job started from this snapshot, so the assets a job added,
+        replaced or deleted are its differences to this snapshot. Releases
+        a job fetched because they were missing are added. Snapshots of
+        another repository or format are ignored.
+
+        Args:
+            paths: Files of the snapshots saved by the jobs
+
+        Returns:
+            Number of releases whose entry changed
+        """
+        changed = set()
+        with self._lock:
+            base = {tag: {name: dict(asset) for name, asset in entry.get("assets", {}).items()}
+                    for tag, entry in self.releases.items()}
+        for path in paths:
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Ignoring unreadable release snapshot {path}: {e}")
+                continue
+            if data.get("format") != SNAPSHOT_FORMAT or (self.github_repo and data.get("repo") != self.github_repo):
+                self.logger.warning(f"Ignoring release snapshot {path} of another repository or format")
+                continue
+
+            with self._lock:
+                for tag_name, entry in data.get("releases", {}).items():
+                    if tag_name not in self.releases:
+                        self.releases[tag_name] = entry
+                        changed.add(tag_name)
+                        continue
+                    before = base.get(tag_name, {})
+                    after = entry.get("assets", {})
+                    assets = self.releases[tag_name].setdefault("assets", {})
+                    for asset_name, asset in after.items():
+                        if before.get(asset_name) != asset:
+                            assets[asset_name] = asset
+                            changed.add(tag_name)
+                    for asset_name in before.keys() - after.keys():
+                        if assets.pop(asset_name, None) is not None:
+                            changed.add(tag_name)
+
+        with self._lock:
+            if changed:
+                self.dirty = True
+        self.logger.info(f"Merged asset changes of {len(changed)} releases into the release snapshot")
+        return len(changed)
+
+    def entries(self) -> List[Dict]:
+        """Get the entries of all releases.
+
+        Returns:
+            List of the snapshot entries
+        """
+        with self._lock:
+            return list(self.releases.values())
+
+    def assets(self, tag_name: str) -> Dict[str, Dict]:
+        """Get a copy of the asset index of a release.
+
+        Args:
+            tag_name: Tag of the release
+
+        Returns:
+            Dict mapping asset name to its id, size and digest
+        """
+        with self._lock:
+            entry = self.releases.get(tag_name) or {}
+            return {name: dict(asset) for name, asset in entry.get("assets", {}).items()}
+
+    def get_release(self, github: GitHubClient, tag_name: str) -> GitRelease:
+        """Get a release object to write through, from the snapshot if possible.
+
+        Args:
+            github: GitHub client the release object makes its requests with
+            tag_name: Tag of the release
+
+        Returns:
+            The release
+
+        Raises:
+            GithubException: If the release is not in the snapshot and does not exist
+        """
+        entry = self.get(tag_name)
+        if entry is None or entry.get("id") is None:
+            with self._lock:
+                self.misses += 1
+            release = github.get_repo(self.github_repo).get_release(tag_name)
+            self.put(release_entry(release.raw_data))
+            return release
+
+        with self._lock:
+            self.hits += 1
+        return github.create_from_raw_data(GitRelease, self.rest_release(github, entry))
+
+    def rest_release(self, github: GitHubClient, entry: Dict) -> Dict:
+        """Build the REST API representation of a release entry.
+
+        Args:
+            github: GitHub client whose API the URLs point at
+            entry: Snapshot entry of the release
+
+        Returns:
+            Release shaped like the GitHub API response
+        """
+        base_url = github.requester.base_url.rstrip("/")
+        if base_url == "https://api.github.com":
+            uploads_url, web_url = "https://uploads.github.com", "https://github.com"
+        elif base_url.endswith("/api/v3"):
+            # GitHub Enterprise Server
+            uploads_url, web_url = base_url[:-len("/v3")] + "/uploads", base_url[:-len("/api/v3")]
+        else:
+            uploads_url = web_url = base_url
+
+        url = f"{base_url}/repos/{self.github_repo}/releases/{entry['id']}"
+        return {
+            "id": entry["id"],
+            "name": entry.get("name") or entry["tag_name"],
+            "tag_name": entry["tag_name"],
+            "prerelease": entry.get("prerelease", False),
+            "draft": False,
+            "url": url,
+            "assets_url": f"{url}/assets",
+            "upload_url": f"{uploads_url}/repos/{self.github_repo}/releases/{entry['id']}/assets{{?name,label}}",
+            "html_url": f"{web_url}/{self.github_repo}/releases/tag/{entry['tag_name']}",
+            "assets": [
+                {"id": asset["id"], "name": name, "size": asset.get("size"), "digest": asset.get("digest")}
+                for name, asset in entry.get("assets", {}).items()
+            ],
+        }
+
+    def package_digests(self) -> Dict[str, str]:
+        """Hash the release entries of every package.
+
+        Releases are grouped by the package in their "<package>-v<version>"
+        tag. Unlike the revision, which grows with every save, a digest only
+        changes when a release of the package is created, edited, deleted or
+        gets other assets.
+
+        Returns:
+            Dict mapping package name to a SHA256 of its release entries
+        """
+        groups: Dict[str, list] = {}
+        with self._lock:
+            for tag_name, entry in self.releases.items():
+                groups.setdefault(tag_name.rsplit("-v", 1)[0], []).append(entry)
+            return {
+                package_name: hashlib.sha256(json.dumps(
+                    sorted(entries, key=lambda entry: entry["tag_name"]), sort_keys=True
+                ).encode()).hexdigest()
+                for package_name, entries in groups.items()
+            }
+
+    def summary(self) -> str:
+        """Describe the snapshot lookups.
+
+        Returns:
+            Human readable summary
+        """
+        return (
+            f"Release snapshot: {len(self.releases)} releases, revision {self.revision}, "
+            f"{self.hits} lookups served, {self.misses} fetched"
+        )
@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the GitHub releases, assets, git refs and GraphQL APIs, used for offline runs and benchmarks.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlencode, urlparse
+
+
+# Ways an injected upload failure behaves
+FAILURE_MODES = ["error", "landed", "disconnect"]
+
+# Largest page the REST API returns, whatever per_page asks for
+MAX_PAGE_SIZE = 100
+
+
+class GitHubStandIn:
+    """Serve the release, asset, git ref and GraphQL endpoints the generators use for in-memory releases.
+
+    Listings are paged with Link headers like the REST API, page_size is
+    used when the request does not ask for another size. Every response
+    carries X-RateLimit headers, with rate_limit set the requests of each
+    resource are limited per rate_window seconds and answered with 403 once
+    the budget is spent. The GraphQL endpoint only understands the queries
+    of ReleaseFetcher.
+
+    Uploads can be made to fail at random: "error" answers 502 without
+    storing the asset, "landed" stores the asset and still answers 502, and
+    "disconnect" drops the connection without an answer.
+    """
+
+    def __init__(self, repo: str = "owner/repo", latency: float = 0.0, failure_rate: float = 0.0,
+                 failure_modes: Optional[List[str]] = None, seed: Optional[int] = None,
+                 page_size: int = 30, rate_limit: Optional[int] = None, rate_window: float = 3600.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        """Initialize the stand-in server.
+
+        Args:
+            repo: Repository name (owner/repo) served
+            latency: Delay in seconds added to every response
+            failure_rate: Fraction of uploads that fail
+            failure_modes: Failure modes to pick from, defaults to all of FAILURE_MODES
+            seed: Seed for the failure injection
+            page_size: Number of items per page of a listing without per_page
+            rate_limit: Number of requests per resource and window, unlimited if None
+            rate_window: Length in seconds of a rate limit window
+            host: Host to bind to
+            port: Port to bind to, 0 picks a free port
+        """
+        self.repo = repo
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_modes = failure_modes or list(FAILURE_MODES)
+        self.random = random.Random(seed)
+        self.page_size = page_size
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.releases: Dict[int, Dict] = {}
+        self.assets: Dict[int, Dict[str, Dict]] = {}
+        self.tags: Dict[str, str] = {}
+        self.requests = 0
+        self.uploads = 0
+        self.failures = 0
+        self.limited = 0
+        self.bytes_received = 0
+        self.endpoints: Dict[str, int] = {}
+        self._budgets: Dict[str, Tuple[int, float]] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger('github_standin')
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        """Base URL of the API, to pass to the generators as the GitHub API URL."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _new_id(self) -> int:
+        """Allocate a release or asset id, the caller holds the lock."""
+        self._next_id += 1
+        return self._next_id
+
+    def create_release(self, tag_name: str, name: Optional[str] = None, body: str = "",
+                       prerelease: bool = False) -> Dict:
+        """Create a release and its tag.
+
+        Args:
+            tag_name: Tag of the release
+            name: Title of the release, the tag if None
+            body: Description of the release
+            prerelease: Whether the release is a prerelease
+
+        Returns:
+            Release shaped like the GitHub API response
+        """
+        with self._lock:
+            release_id = self._new_id()
+            self.releases[release_id] = {
+                "id": release_id,
+                "tag_name": tag_name,
+                "name": name or tag_name,
+                "body": body,
+                "draft": False,
+                "prerelease": prerelease,
+            }
+            self.assets[release_id] = {}
+            self.tags[tag_name] = hashlib.sha1(tag_name.encode()).hexdigest()
+            return self.release_document(release_id)
+
+    def add_asset(self, release_id: int, name: str, content: bytes) -> Dict:
+        """Store an asset of a release directly, as if it was uploaded earlier.
+
+        Args:
+            release_id: Id of the release
+            name: Name of the asset
+            content: Content of the asset
+
+        Returns:
+            Asset shaped like the GitHub API response
+        """
+        with self._lock:
+            return self._store_asset(release_id, name, content, "application/gzip")
+
+    def _store_asset(self, release_id: int, name: str, content: bytes, content_type: Optional[str]) -> Dict:
+        """Store an asset, the caller holds the lock."""
+        asset_id = self._new_id()
+        asset = {
+            "id": asset_id,
+            "name": name,
+            "size": len(content),
+            "state": "uploaded",
+            "content_type": content_type,
+            "digest": f"sha256:{hashlib.sha256(content).hexdigest()}",
+            "url": f"{self.base_url}/repos/{self.repo}/releases/assets/{asset_id}",
+            "browser_download_url": f"{self.base_url}/{self.repo}/releases/download/"
+                                    f"{self.releases[release_id]['tag_name']}/{name}",
+        }
+        self.assets[release_id][name] = asset
+        return asset
+
+    def release_document(self, release_id: int) -> Dict:
+        """Render a release like the REST API, the caller holds the lock."""
+        release = self.releases[release_id]
+        api_url = f"{self.base_url}/repos/{self.repo}/releases/{release_id}"
+        return dict(
+            release,
+            url=api_url,
+            html_url=f"{self.base_url}/{self.repo}/releases/tag/{release['tag_name']}",
+            assets_url=f"{api_url}/assets",
+            upload_url=f"{api_url}/assets{{?name,label}}",
+            assets=list(self.assets[release_id].values()),
+        )
+
+    def release_node(self, release_id: int, asset_first: int = MAX_PAGE_SIZE, asset_offset: int = 0) -> Dict:
+        """Render a release like the GraphQL API, the caller holds the lock.
+
+        Args:
+            release_id: Id of the release
+            asset_first: Number of assets per page
+            asset_offset: Number of assets on earlier pages
+        """
+        release = self.releases[release_id]
+        assets = list(self.assets[release_id].values())
+        return {
+            "databaseId": release_id,
+            "name": release["name"],
+            "tagName": release["tag_name"],
+            "isPrerelease": release["prerelease"],
+            "description": release["body"],
+            "releaseAssets": {
+                "nodes": [
+                    {"databaseId": asset["id"], "name": asset["name"], "size": asset["size"], "digest": asset["digest"]}
+                    for asset in assets[asset_offset:asset_offset + asset_first]
+                ],
+                "pageInfo": {"hasNextPage": asset_offset + asset_first < len(assets),
+                             "endCursor": str(asset_offset + asset_first)},
+            },
+        }
+
+    def release_by_tag(self, tag_name: str) -> Optional[int]:
+        """Find the id of the release of a tag, the caller holds the lock."""
+        return next((release_id for release_id, release in self.releases.items()
+                     if release["tag_name"] == tag_name), None)
+
+    def _pick_failure(self) -> Optional[str]:
+        """Decide whether and how the current upload fails."""
+        with self._lock:
+            if self.random.random() >= self.failure_rate:
+                return None
+            self.failures += 1
+            return self.random.choice(self.failure_modes)
+
+    def _spend(self, resource: str) -> Tuple[bool, Dict[str, str]]:
+        """Take a request from the budget of a resource.
+
+        Returns:
+            Tuple of (whether the budget allowed the request, X-RateLimit headers after it)
+        """
+        now = time.time()
+        limit = self.rate_limit if self.rate_limit is not None else 5000
+        with self._lock:
+            used, reset = self._budgets.get(resource, (0, now + self.rate_window))
+            if now >= reset:
+                used, reset = 0, now + self.rate_window
+            allowed = self.rate_limit is None or used < limit
+            # Without a limit the budget stays full, clients would otherwise start pacing
+            if allowed and self.rate_limit is not None:
+                used += 1
+            self._budgets[resource] = (used, reset)
+        return allowed, {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(limit - used),
+            "X-RateLimit-Used": str(used),
+            "X-RateLimit-Reset": str(int(reset)),
+            "X-RateLimit-Resource": resource,
+        }
+
+    def _page(self, items: List, query: Dict[str, List[str]], path: str) -> Tuple[List, Dict[str, str]]:
+        """Cut a page out of a listing.
+
+        Returns:
+            Tuple of (items on the page, Link header if there is a next page)
+        """
+        per_page = min(int(query.get("per_page", [self.page_size])[0]), MAX_PAGE_SIZE)
+        page = max(1, int(query.get("page", ["1"])[0]))
+        start = (page - 1) * per_page
+        headers = {}
+        if start + per_page < len(items):
+            next_query = urlencode({"per_page": per_page, "page": page + 1})
+            headers["Link"] = f'<{self.base_url}{path}?{next_query}>; rel="next"'
+        return items[start:start + per_page], headers
+
+    def graphql(self, query: str, variables: Dict) -> Dict:
+        """Answer one of the queries of ReleaseFetcher.
+
+        Args:
+            query: GraphQL query document
+            variables: Values of the query variables
+
+        Returns:
+            The "data" member of the response
+        """
+        first_match = re.search(r"first: (\d+)", query)
+        first = min(int(first_match.group(1)) if first_match else MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+        offset = int(variables.get("cursor") or 0)
+        asset_match = re.search(r"releaseAssets\(first: (\d+)", query)
+        asset_first = min(int(asset_match.group(1)) if asset_match else MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+        asset_offset = int(variables.get("assetCursor") or 0)
+
+        with self._lock:
+            if "refs(" in query:
+                # Like GitHub the ref query matches anywhere in the name, in alphabetical order
+                names = sorted(tag for tag in self.tags if variables.get("prefix", "") in tag)
+                page = names[offset:offset + first]
+                return {"repository": {"refs": {
+                    "nodes": [{"name": name} for name in page],
+                    "pageInfo": {"hasNextPage": offset + first < len(names), "endCursor": str(offset + first)},
+                }}}
+
+            if "releases(" in query:
+                # Newest first, as ordered by CREATED_AT DESC
+                release_ids = sorted(self.releases, reverse=True)
+                page = release_ids[offset:offset + first]
+                return {"repository": {"releases": {
+                    "nodes": [self.release_node(release_id, asset_first) for release_id in page],
+                    "pageInfo": {"hasNextPage": offset + first < len(release_ids),
+                                 "endCursor": str(offset + first)},
+                }}}
+
+            repository = {}
+            release_ids = {release["tag_name"]: release_id for release_id, release in self.releases.items()}
+            for alias, variable in re.findall(r"(\w+): release\(tagName: \$(\w+)\)", query):
+                release_id = release_ids.get(variables.get(variable, ""))
+                repository[alias] = (
+                    self.release_node(release_id, asset_first, asset_offset) if release_id is not None else None
+                )
+            return {"repository": repository}
+
+    def _make_handler(self):
+        standin = self
+        repo_path = f"/repos/{re.escape(standin.repo)}"
+        routes = [
+            ("repo", re.compile(rf"{repo_path}")),
+            ("releases", re.compile(rf"{repo_path}/releases")),
+            ("release_by_tag", re.compile(rf"{repo_path}/releases/tags/(.+)")),
+            ("asset", re.compile(rf"{repo_path}/releases/assets/(\d+)")),
+            ("release", re.compile(rf"{repo_path}/releases/(\d+)")),
+            ("release_assets", re.compile(rf"{repo_path}/releases/(\d+)/assets")),
+            ("tag_ref", re.compile(rf"{repo_path}/git/refs/tags/(.+)")),
+            ("graphql", re.compile(r"/graphql")),
+        ]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, Nagle would hold the body back for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def _begin(self):
+                if standin.latency:
+                    time.sleep(standin.latency)
+                url = urlparse(self.path)
+                route, argument = "unknown", None
+                for name, pattern in routes:
+                    match = pattern.fullmatch(url.path)
+                    if match:
+                        route, argument = name, unquote(match.group(1)) if match.groups() else None
+                        break
+                with standin._lock:
+                    standin.requests += 1
+                    endpoint = f"{self.command} {route}"
+                    standin.endpoints[endpoint] = standin.endpoints.get(endpoint, 0) + 1
+
+                allowed, self.rate_headers = standin._spend("graphql" if route == "graphql" else "core")
+                if not allowed:
+                    with standin._lock:
+                        standin.limited += 1
+                    self._send(403, {"message": "API rate limit exceeded"})
+                    return url, None, None
+                return url, route, argument
+
+            def _body(self) -> bytes:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with standin._lock:
+                    standin.bytes_received += len(body)
+                return body
+
+            def do_GET(self):
+                url, route, argument = self._begin()
+                if route is None:
+                    return
+                query = parse_qs(url.query)
+                with standin._lock:
+                    if route == "repo":
+                        owner, name = standin.repo.split("/", 1)
+                        document = {
+                            "id": 1,
+                            "name": name,
+                            "full_name": standin.repo,
+                            "owner": {"login": owner},
+                            "url": f"{standin.base_url}/repos/{standin.repo}",
+                            "html_url": f"{standin.base_url}/{standin.repo}",
+                        }
+                    elif route == "releases":
+                        releases = [standin.release_document(release_id)
+                                    for release_id in sorted(standin.releases, reverse=True)]
+                        page, headers = standin._page(releases, query, url.path)
+                        self._send(200, page, headers)
+                        return
+                    elif route == "release_by_tag":
+                        release_id = standin.release_by_tag(argument)
+                        document = standin.release_document(release_id) if release_id is not None else None
+                    elif route == "release":
+                        release_id = int(argument)
+                        document = standin.release_document(release_id) if release_id in standin.releases else None
+                    elif route == "release_assets" and int(argument) in standin.assets:
+                        assets = list(standin.assets[int(argument)].values())
+                        page, headers = standin._page(assets, query, url.path)
+                        self._send(200, page, headers)
+                        return
+                    elif route == "asset":
+                        document = next((asset for assets in standin.assets.values()
+                                         for asset in assets.values() if asset["id"] == int(argument)), None)
+                    elif route == "tag_ref" and argument in standin.tags:
+                        document = {
+                            "ref": f"refs/tags/{argument}",
+                            "url": f"{standin.base_url}/repos/{standin.repo}/git/refs/tags/{argument}",
+                            "object": {"type": "commit", "sha": standin.tags[argument]},
+                        }
+                    else:
+                        document = None
+                if document is None:
+                    self._send(404, {"message": "Not Found"})
+                else:
+                    self._send(200, document)
+
+            def do_POST(self):
+                url, route, argument = self._begin()
+                body = self._body()
+                if route == "releases":
+                    self._create_release(json.loads(body or b"{}"))
+                elif route == "release_assets":
+                    self._upload(int(argument), parse_qs(url.query).get("name", [""])[0], body)
+                elif route == "graphql":
+                    request = json.loads(body or b"{}")
+                    self._send(200, {"data": standin.graphql(request.get("query", ""), request.get("variables") or {})})
+                elif route is not None:
+                    self._send(404, {"message": "Not Found"})
+
+            def do_PATCH(self):
+                url, route, argument = self._begin()
+                body = self._body()
+                if route != "release":
+                    if route is not None:
+                        self._send(404, {"message": "Not Found"})
+                    return
+                changes = json.loads(body or b"{}")
+                with standin._lock:
+                    release = standin.releases.get(int(argument))
+                    if release is not None:
+                        release.update({key: value for key, value in changes.items()
+                                        if key in ("tag_name", "name", "body", "draft", "prerelease")})
+                        document = standin.release_document(int(argument))
+                if release is None:
+                    self._send(404, {"message": "Not Found"})
+                else:
+                    self._send(200, document)
+
+            def do_DELETE(self):
+                url, route, argument = self._begin()
+                if route is None:
+                    return
+                deleted = False
+                with standin._lock:
+                    if route == "release" and int(argument) in standin.releases:
+                        del standin.releases[int(argument)]
+                        del standin.assets[int(argument)]
+                        deleted = True
+                    elif route == "asset":
+                        for assets in standin.assets.values():
+                            for name, asset in list(assets.items()):
+                                if asset["id"] == int(argument):
+                                    del assets[name]
+                                    deleted = True
+                    elif route == "tag_ref" and argument in standin.tags:
+                        del standin.tags[argument]
+                        deleted = True
+                if deleted:
+                    self._send(204, None)
+                else:
+                    self._send(404, {"message": "Not Found"})
+
+            def _create_release(self, parameters: Dict):
+                tag_name = parameters.get("tag_name")
+                with standin._lock:
+                    exists = not tag_name or standin.release_by_tag(tag_name) is not None
+                if exists:
+                    self._send(422, {"message": "Validation Failed", "errors": [{"code": "already_exists"}]})
+                    return
+                release = standin.create_release(
+                    tag_name,
+                    name=parameters.get("name"),
+                    body=parameters.get("body") or "",
+                    prerelease=bool(parameters.get("prerelease")),
+                )
+                self._send(201, release)
+
+            def _upload(self, release_id: int, name: str, body: bytes):
+                if release_id not in standin.assets or not name:
+                    self._send(404, {"message": "Not Found"})
+                    return
+
+                failure = standin._pick_failure()
+                if failure == "error":
+                    self._send(502, {"message": "Bad Gateway"})
+                    return
+                if failure == "disconnect":
+                    self.close_connection = True
+                    return
+
+                with standin._lock:
+                    conflict = name in standin.assets[release_id]
+                    if not conflict:
+                        asset = standin._store_asset(release_id, name, body, self.headers.get("Content-Type"))
+                        standin.uploads += 1
+                if conflict:
+                    self._send(422, {"message": "Validation Failed", "errors": [{"code": "already_exists"}]})
+                elif failure == "landed":
+                    self._send(502, {"message": "Bad Gateway"})
+                else:
+                    self._send(201, asset)
+
+            def _send(self, status: int, document, headers: Optional[Dict[str, str]] = None):
+                body = json.dumps(document).encode() if document is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                for name, value in {**getattr(self, "rate_headers", {}), **(headers or {})}.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                standin.logger.debug(format % args)
+
+        return Handler
+
+    def summary(self) -> str:
+        """Describe the requests served per endpoint.
+
+        Returns:
+            Human readable summary
+        """
+        endpoints = ", ".join(f"{endpoint} {count}" for endpoint, count in sorted(self.endpoints.items()))
+        return f"GitHub stand-in: {self.requests} requests ({endpoints or 'none'}), {self.limited} rate limited"
+
+    def start(self) -> "GitHubStandIn":
+        """Serve requests on a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger.info(f"GitHub stand-in listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and release the socket."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "GitHubStandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Run a local GitHub releases API stand-in")
+    parser.add_argument("--repo", default="vgijssel/hermit-python-packages", help="Repository name (owner/repo)")
+    parser.add_argument("--releases", nargs="*", default=[], help="Tags of the releases to create")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay in seconds per response")
+    parser.add_argument("--page-size", type=int, default=30, help="Default number of items per listing page")
+    parser.add_argument("--rate-limit", type=int, default=None,
+                        help="Number of requests per resource and window (default: unlimited)")
+    parser.add_argument("--rate-window", type=float, default=3600.0, help="Length in seconds of a rate limit window")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of uploads that fail")
+    parser.add_argument("--failure-modes", default=",".join(FAILURE_MODES),
+                        help="Comma separated failure modes to inject")
+    parser.add_argument("--port", type=int, default=8081, help="Port to listen on")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+                        help="Set the logging level")
+
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    standin = GitHubStandIn(
+        repo=args.repo,
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        failure_modes=[mode.strip() for mode in args.failure_modes.split(",") if mode.strip()],
+        page_size=args.page_size,
+        rate_limit=args.rate_limit,
+        rate_window=args.rate_window,
+        port=args.port
+    )
+    for tag_name in args.releases:
+        release = standin.create_release(tag_name)
+        standin.logger.info(f"Release {tag_name}: {release['upload_url']}")
+    standin.logger.info(f"Serving {args.repo} on {standin.base_url}, "
+                        f"run the generators with --github-api-url {standin.base_url}")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
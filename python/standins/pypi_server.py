@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the PyPI JSON and Simple APIs, used for offline runs and benchmarks.
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import logging
+import random
+import re
+import threading
+import time
+import xmlrpc.client
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+# Accept header value selecting the PEP 691 JSON form of the Simple API
+SIMPLE_JSON = "application/vnd.pypi.simple.v1+json"
+
+# Suffixes of the generated pre-releases
+PRERELEASE_SUFFIXES = ["a1", "b1", "rc1", "rc2"]
+
+
+def canonical_name(name: str) -> str:
+    """Normalize a project name as PEP 503 does.
+
+    Args:
+        name: Project name
+
+    Returns:
+        Lowercase name with runs of "-", "_" and "." replaced by "-"
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def synthetic_catalog(packages: int, versions: int, prerelease_ratio: float = 0.1,
+                      seed: int = 0) -> Dict[str, List[str]]:
+    """Generate a package catalog with ascending versions.
+
+    The same arguments always generate the same catalog.
+
+    Args:
+        packages: Number of packages
+        versions: Number of versions per package
+        prerelease_ratio: Fraction of the versions that are pre-releases
+        seed: Seed of the random choices
+
+    Returns:
+        Dict mapping package name to its versions in upload order
+    """
+    rng = random.Random(seed)
+    catalog = {}
+    for i in range(packages):
+        package_versions = []
+        for n in range(versions):
+            version = f"{1 + n // 400}.{n // 20 % 20}.{n % 20}"
+            if rng.random() < prerelease_ratio:
+                version += rng.choice(PRERELEASE_SUFFIXES)
+            package_versions.append(version)
+        catalog[f"package-{i}"] = package_versions
+    return catalog
+
+
+class PyPIStandIn:
+    """Serve the PyPI JSON and Simple APIs for an in-memory package catalog.
+
+    `/pypi/<package>/json` returns the JSON API document and
+    `/simple/<package>/` the Simple API page, as PEP 691 JSON when asked
+    for it and as PEP 503 HTML otherwise. Every version gets an sdist and
+    wheels, some of which may be yanked. Responses carry an ETag and an
+    X-PyPI-Last-Serial header and honour If-None-Match, like the real index
+    behind its CDN. Serials come from one counter over all packages, so
+    publishing or yanking moves the changed package past all others. Every
+    change is logged in a changelog served through the changelog_last_serial
+    and changelog_since_serial XML-RPC methods at `/pypi`.
+    """
+
+    def __init__(self, packages: Dict[str, List[str]], latency: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, files_per_version: int = 2,
+                 yanked_ratio: float = 0.0, seed: int = 0, cache_size: int = 256, description_size: int = 0):
+        """Initialize the stand-in server.
+
+        Args:
+            packages: Dict mapping package name to its release versions
+            latency: Delay in seconds added to every response
+            host: Host to bind to
+            port: Port to bind to, 0 picks a free port
+            files_per_version: Number of files per version, an sdist and wheels
+            yanked_ratio: Fraction of the versions whose files are all yanked
+            seed: Seed of the choice of yanked versions
+            cache_size: Number of rendered responses kept, so large documents are not rebuilt per request
+            description_size: Size in bytes of the project description in JSON API documents, like a README
+        """
+        self.packages = packages
+        self.latency = latency
+        self.files_per_version = max(1, files_per_version)
+        self.names = {canonical_name(package_name): package_name for package_name in packages}
+        self.serials = {package_name: serial for serial, package_name in enumerate(packages, 1)}
+        self.serial = len(packages)
+        created = int(time.time())
+        self.changelog: List[Tuple[str, Optional[str], int, str, int]] = [
+            (package_name, None, created, "create", serial) for package_name, serial in self.serials.items()
+        ]
+        rng = random.Random(seed)
+        self.yanked: Dict[str, Set[str]] = {
+            package_name: {version for version in versions if rng.random() < yanked_ratio}
+            for package_name, versions in packages.items()
+        } if yanked_ratio else {}
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.cache_size = cache_size
+        self.description_size = description_size
+        self._rendered: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger('pypi_standin')
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def index_url(self) -> str:
+        """Base URL to pass to PyPIClient as index_url."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/pypi"
+
+    @property
+    def simple_url(self) -> str:
+        """Base URL of the Simple API."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/simple"
+
+    def _bump(self, package_name: str, version: str, action: str) -> None:
+        """Give a package the next serial and log the change, the lock must be held."""
+        self.serial += 1
+        self.serials[package_name] = self.serial
+        self.changelog.append((package_name, version, int(time.time()), action, self.serial))
+
+    def publish(self, package_name: str, version: str) -> None:
+        """Add a release to a package and bump its serial.
+
+        Args:
+            package_name: Name of the package
+            version: Version to release
+        """
+        with self._lock:
+            self.packages.setdefault(package_name, []).append(version)
+            self.names[canonical_name(package_name)] = package_name
+            self._bump(package_name, version, "new release")
+
+    def yank(self, package_name: str, version: str) -> None:
+        """Yank all files of a release and bump the serial of its package.
+
+        Args:
+            package_name: Name of the package
+            version: Version to yank
+        """
+        with self._lock:
+            self.yanked.setdefault(package_name, set()).add(version)
+            self._bump(package_name, version, "yank release")
+
+    def xmlrpc(self, method: str, params: Tuple) -> object:
+        """Answer a call to the XML-RPC API.
+
+        Args:
+            method: Name of the method
+            params: Parameters of the call
+
+        Returns:
+            Result of the method
+
+        Raises:
+            xmlrpc.client.Fault: If the method is not served
+        """
+        with self._lock:
+            if method == "changelog_last_serial":
+                return self.serial
+            if method == "changelog_since_serial":
+                since = int(params[0])
+                return [
+                    [name, version, timestamp, action, serial]
+                    for name, version, timestamp, action, serial in self.changelog if serial > since
+                ]
+        raise xmlrpc.client.Fault(1, f"method \"{method}\" is not supported")
+
+    def etag(self, package_name: str) -> str:
+        """Get the ETag of the current document of a package.
+
+        Args:
+            package_name: Name of the package
+
+        Returns:
+            Quoted ETag value
+        """
+        return f'"{package_name}-{self.serials.get(package_name, 0)}"'
+
+    def release_files(self, package_name: str, version: str) -> List[Dict]:
+        """Describe the files of a release as the JSON API does.
+
+        Args:
+            package_name: Name of the package
+            version: Version of the release
+
+        Returns:
+            List of file entries, the sdist first
+        """
+        host, port = self.server.server_address[:2]
+        stem = f"{canonical_name(package_name).replace('-', '_')}-{version}"
+        filenames = [f"{stem}.tar.gz"] + [
+            f"{stem}-py3-none-any.whl" if n == 1 else f"{stem}-{n}-py3-none-any.whl"
+            for n in range(1, self.files_per_version)
+        ]
+        yanked = version in self.yanked.get(package_name, ())
+        files = []
+        for filename in filenames:
+            digest = hashlib.sha256(filename.encode()).hexdigest()
+            files.append({
+                "filename": filename,
+                "comment_text": "",
+                "digests": {"blake2b_256": hashlib.blake2b(filename.encode(), digest_size=32).hexdigest(),
+                            "md5": hashlib.md5(filename.encode()).hexdigest(), "sha256": digest},
+                "downloads": -1,
+                "has_sig": False,
+                "md5_digest": hashlib.md5(filename.encode()).hexdigest(),
+                "packagetype": "sdist" if filename.endswith(".tar.gz") else "bdist_wheel",
+                "python_version": "source" if filename.endswith(".tar.gz") else "py3",
+                "requires_python": ">=3.8",
+                "size": 1024 + int(digest[:4], 16),
+                "upload_time": "2024-01-01T00:00:00",
+                "upload_time_iso_8601": "2024-01-01T00:00:00.000000Z",
+                "url": f"http://{host}:{port}/packages/{digest[:2]}/{digest[2:4]}/{filename}",
+                "yanked": yanked,
+                "yanked_reason": "Broken release" if yanked else None,
+            })
+        return files
+
+    def release_document(self, package_name: str) -> Optional[Dict]:
+        """Build the JSON API document for a package.
+
+        Args:
+            package_name: Name of the package
+
+        Returns:
+            Dict shaped like the PyPI JSON API response or None if unknown
+        """
+        versions = self.packages.get(package_name)
+        if versions is None:
+            return None
+
+        releases = {version: self.release_files(package_name, version) for version in versions}
+        return {
+            "info": {
+                "name": package_name,
+                "version": versions[-1] if versions else None,
+                "summary": f"Synthetic package {package_name}",
+                "description": (f"# {package_name}\n\n" + "Lorem ipsum dolor sit amet. " *
+                                (self.description_size // 28 + 1))[:self.description_size],
+                "description_content_type": "text/markdown",
+                "requires_python": ">=3.8",
+                "yanked": False,
+            },
+            "last_serial": self.serials.get(package_name, 0),
+            "releases": releases,
+            "urls": releases[versions[-1]] if versions else [],
+            "vulnerabilities": [],
+        }
+
+    def simple_document(self, package_name: str) -> Optional[Dict]:
+        """Build the PEP 691 Simple API document for a package.
+
+        Args:
+            package_name: Name of the package
+
+        Returns:
+            Dict shaped like the Simple API JSON response or None if unknown
+        """
+        versions = self.packages.get(package_name)
+        if versions is None:
+            return None
+
+        files = []
+        for version in versions:
+            for entry in self.release_files(package_name, version):
+                # Wheels have their METADATA file served alongside (PEP 658)
+                metadata = {"sha256": entry["md5_digest"] * 2} if entry["packagetype"] == "bdist_wheel" else False
+                files.append({
+                    "filename": entry["filename"],
+                    "url": entry["url"],
+                    "hashes": {"sha256": entry["digests"]["sha256"]},
+                    "requires-python": entry["requires_python"],
+                    "size": entry["size"],
+                    "upload-time": entry["upload_time_iso_8601"],
+                    "yanked": entry["yanked_reason"] or False,
+                    "core-metadata": metadata,
+                    "data-dist-info-metadata": metadata,
+                })
+        return {
+            "meta": {"api-version": "1.1", "_last-serial": self.serials.get(package_name, 0)},
+            "name": canonical_name(package_name),
+            "versions": list(versions),
+            "files": files,
+        }
+
+    @staticmethod
+    def simple_html(document: Dict) -> str:
+        """Render a Simple API document as a PEP 503 HTML page.
+
+        Args:
+            document: Document as returned by simple_document
+
+        Returns:
+            HTML page with a link per file
+        """
+        links = []
+        for entry in document["files"]:
+            attributes = f' data-requires-python="{html.escape(entry["requires-python"])}"'
+            if entry["yanked"]:
+                attributes += f' data-yanked="{html.escape(entry["yanked"])}"'
+            links.append(
+                f'<a href="{entry["url"]}#sha256={entry["hashes"]["sha256"]}"{attributes}>{entry["filename"]}</a><br/>'
+            )
+        return (
+            "<!DOCTYPE html>\n<html><head>"
+            f'<meta name="pypi:repository-version" content="1.1"><title>Links for {document["name"]}</title>'
+            f"</head><body><h1>Links for {document['name']}</h1>\n" + "\n".join(links) + "\n</body></html>\n"
+        )
+
+    def render(self, kind: str, package_name: str) -> Optional[bytes]:
+        """Get the encoded response body of a package, rendering it at most once per serial.
+
+        Args:
+            kind: "json" for the JSON API, "simple-json" or "simple-html" for the Simple API
+            package_name: Name of the package
+
+        Returns:
+            Encoded body or None if the package is unknown
+        """
+        key = (kind, package_name, self.serials.get(package_name, 0))
+        with self._lock:
+            if key in self._rendered:
+                self._rendered.move_to_end(key)
+                return self._rendered[key]
+
+        if kind == "json":
+            document = self.release_document(package_name)
+            body = json.dumps(document).encode() if document else None
+        else:
+            document = self.simple_document(package_name)
+            if document is None:
+                body = None
+            elif kind == "simple-json":
+                body = json.dumps(document).encode()
+            else:
+                body = self.simple_html(document).encode()
+
+        if body is not None and self.cache_size:
+            with self._lock:
+                self._rendered[key] = body
+                while len(self._rendered) > self.cache_size:
+                    self._rendered.popitem(last=False)
+        return body
+
+    def project_index(self, accept_json: bool) -> bytes:
+        """Render the Simple API index listing all projects.
+
+        Args:
+            accept_json: Render PEP 691 JSON instead of PEP 503 HTML
+
+        Returns:
+            Encoded body
+        """
+        names = sorted(self.names)
+        if accept_json:
+            return json.dumps({
+                "meta": {"api-version": "1.1", "_last-serial": self.serial},
+                "projects": [{"name": name} for name in names],
+            }).encode()
+        links = "\n".join(f'<a href="/simple/{name}/">{name}</a><br/>' for name in names)
+        return f"<!DOCTYPE html>\n<html><body>\n{links}\n</body></html>\n".encode()
+
+    def _make_handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes, Nagle would hold back the body
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if standin.latency:
+                    time.sleep(standin.latency)
+
+                with standin._lock:
+                    standin.requests += 1
+
+                path = self.path.split("?", 1)[0]
+                accept_json = SIMPLE_JSON in self.headers.get("Accept", "")
+                if path.rstrip("/") == "/simple":
+                    content_type = SIMPLE_JSON if accept_json else "text/html"
+                    self._send(200, standin.project_index(accept_json), {"Content-Type": content_type})
+                    return
+
+                match = re.fullmatch(r"/pypi/([^/]+)/json/?", path)
+                if match:
+                    kind, content_type = "json", "application/json"
+                else:
+                    match = re.fullmatch(r"/simple/([^/]+)/?", path)
+                    kind, content_type = (
+                        ("simple-json", SIMPLE_JSON) if accept_json else ("simple-html", "text/html")
+                    )
+                package_name = standin.names.get(canonical_name(match.group(1))) if match else None
+                body = standin.render(kind, package_name) if package_name else None
+                if body is None:
+                    self._send(404, b'{"message": "Not Found"}')
+                    return
+
+                headers = {
+                    "Content-Type": content_type,
+                    "ETag": standin.etag(package_name),
+                    "X-PyPI-Last-Serial": str(standin.serials.get(package_name, 0)),
+                }
+                if self.headers.get("If-None-Match") == headers["ETag"]:
+                    with standin._lock:
+                        standin.not_modified += 1
+                    self._send(304, b"", headers)
+                    return
+
+                self._send(200, body, headers)
+
+            def do_POST(self):
+                if standin.latency:
+                    time.sleep(standin.latency)
+
+                with standin._lock:
+                    standin.requests += 1
+
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path.split("?", 1)[0].rstrip("/") != "/pypi":
+                    self._send(404, b'{"message": "Not Found"}')
+                    return
+                try:
+                    params, method = xmlrpc.client.loads(body)
+                    response = xmlrpc.client.dumps((standin.xmlrpc(method, params),), methodresponse=True,
+                                                  allow_none=True)
+                except xmlrpc.client.Fault as fault:
+                    response = xmlrpc.client.dumps(fault, methodresponse=True)
+                self._send(200, response.encode(), {"Content-Type": "text/xml"})
+
+            def _send(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None):
+                headers = dict(headers or {})
+                self.send_response(status)
+                self.send_header("Content-Type", headers.pop("Content-Type", "application/json"))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+                with standin._lock:
+                    standin.bytes_sent += len(body)
+
+            def log_message(self, format, *args):
+                standin.logger.debug(format % args)
+
+        return Handler
+
+    def start(self) -> "PyPIStandIn":
+        """Serve requests on a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger.info(f"PyPI stand-in listening on {self.index_url}")
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and release the socket."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def summary(self) -> str:
+        """Describe the requests served.
+
+        Returns:
+            Human readable summary
+        """
+        return (
+            f"PyPI stand-in: {self.requests} requests, {self.not_modified} not modified, "
+            f"{self.bytes_sent / 1024 / 1024:.1f} MiB sent"
+        )
+
+    def __enter__(self) -> "PyPIStandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def count_versions(catalog: Dict[str, List[str]], yanked: Dict[str, Iterable[str]]) -> Tuple[int, int, int]:
+    """Count the versions, pre-releases and yanked versions of a catalog.
+
+    Args:
+        catalog: Dict mapping package name to its versions
+        yanked: Dict mapping package name to its yanked versions
+
+    Returns:
+        Tuple of the number of versions, pre-releases and yanked versions
+    """
+    versions = sum(len(package_versions) for package_versions in catalog.values())
+    prereleases = sum(
+        1 for package_versions in catalog.values() for version in package_versions
+        if re.search(r"(a|b|rc)\d+$", version)
+    )
+    return versions, prereleases, sum(len(package_yanked) for package_yanked in yanked.values())
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Run a local PyPI JSON and Simple API stand-in")
+    parser.add_argument("--packages", type=int, default=100, help="Number of packages to serve")
+    parser.add_argument("--versions", type=int, default=50, help="Number of versions per package")
+    parser.add_argument("--prereleases", type=float, default=0.1, help="Fraction of the versions that are pre-releases")
+    parser.add_argument("--yanked", type=float, default=0.02, help="Fraction of the versions that are yanked")
+    parser.add_argument("--files-per-version", type=int, default=2, help="Number of files per version")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated catalog")
+    parser.add_argument("--description-size", type=int, default=0,
+                        help="Size in bytes of the project description in JSON API documents")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay in seconds per response")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+                        help="Set the logging level")
+
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    packages = synthetic_catalog(args.packages, args.versions, args.prereleases, args.seed)
+    standin = PyPIStandIn(packages, latency=args.latency, port=args.port, files_per_version=args.files_per_version,
+                          yanked_ratio=args.yanked, seed=args.seed, description_size=args.description_size)
+    versions, prereleases, yanked = count_versions(packages, standin.yanked)
+    standin.logger.info(
+        f"Serving {args.packages} packages with {versions} versions ({prereleases} pre-releases, "
+        f"{yanked} yanked) on {standin.index_url} and {standin.simple_url}"
+    )
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.server.server_close()
+        standin.logger.info(standin.summary())
+
+
+if __name__ == "__main__":
+    main()
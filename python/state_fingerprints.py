@@ -0,0 +1,181 @@
+"""
+Fingerprints of the inputs each state file was generated from, so unchanged packages are skipped.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+# Bumped whenever state generation changes, so all states are generated again once
+FINGERPRINT_FORMAT = 2
+
+# Files of a version directory whose presence marks the version as ready to build
+REQUIREMENTS_FILES = ("requirements.in", "requirements.txt")
+
+
+def requirements_digest(package_path: Path) -> str:
+    """Digest the requirements files of all versions of a package.
+
+    Adding, removing or editing requirements.in or requirements.txt of any
+    version changes the digest.
+
+    Args:
+        package_path: Directory of the package, holding one directory per version
+
+    Returns:
+        Hex SHA-256 over the relative path and content of every requirements file
+    """
+    digest = hashlib.sha256()
+    paths = sorted(path for name in REQUIREMENTS_FILES for path in package_path.glob(f"*/{name}") if path.is_file())
+    for path in paths:
+        content = path.read_bytes()
+        digest.update(f"{path.relative_to(package_path).as_posix()}\0{len(content)}\0".encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def state_fingerprint(pypi_serial: Optional[int], config_path: Path, releases_digest: str) -> Optional[Dict]:
+    """Describe the inputs a state is generated from.
+
+    Args:
+        pypi_serial: Last serial PyPI reported for the package
+        config_path: Path to the config.yaml of the package, next to the version directories
+        releases_digest: Digest of the releases of the package in the release snapshot
+
+    Returns:
+        Dict with the format, serial, config hash, requirements digest and
+        releases digest, or None if PyPI sent no serial and changes cannot
+        be told apart
+    """
+    if pypi_serial is None:
+        return None
+    return {
+        "format": FINGERPRINT_FORMAT,
+        "pypi_serial": pypi_serial,
+        "config": hashlib.sha256(config_path.read_bytes()).hexdigest(),
+        "requirements": requirements_digest(config_path.parent),
+        "releases": releases_digest,
+    }
+
+
+class StateFingerprints:
+    """Keep the fingerprint of the inputs of every package's state in one JSON file.
+
+    The state stage compares a package's current fingerprint with the
+    stored one and skips the package when they match, so a run in which
+    neither PyPI, the config, the requirements files nor the releases
+    changed only reads this file. The global PyPI serial up to which the
+    changelog was processed is kept alongside, for the change feed.
+
+    The file describes the committed state files, so it is committed with
+    them: the finalize job's commit task adds python/state-fingerprints.json
+    together with the states. A fingerprint without its state, or the other
+    way around, would skip a package whose state is stale.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Initialize the fingerprints.
+
+        Args:
+            path: File to load the fingerprints from and save them to, kept in memory only if None
+        """
+        self.path = Path(path) if path else None
+        self.logger = logging.getLogger('state_fingerprints')
+        self.fingerprints: Dict[str, Dict] = {}
+        self.changelog_serial: Optional[int] = None
+        self.dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        """Load the fingerprints from their file, starting empty if it is missing or unreadable."""
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable state fingerprints {self.path}: {e}")
+            return
+
+        with self._lock:
+            self.fingerprints = data.get("packages", {})
+            self.changelog_serial = data.get("changelog_serial")
+            self.dirty = False
+        self.logger.info(f"Loaded state fingerprints of {len(self.fingerprints)} packages from {self.path}")
+
+    def save(self) -> None:
+        """Write the fingerprints to their file if they changed."""
+        with self._lock:
+            if not self.path or not self.dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Write atomically so a cancelled run leaves the previous fingerprints
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"changelog_serial": self.changelog_serial, "packages": self.fingerprints},
+                          f, indent=2, sort_keys=True)
+                f.write("\n")
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        self.logger.info(f"Saved state fingerprints of {len(self.fingerprints)} packages to {self.path}")
+
+    def matches(self, package_name: str, fingerprint: Optional[Dict]) -> bool:
+        """Check whether the state of a package was generated from the same inputs.
+
+        Args:
+            package_name: Package directory name (under python/)
+            fingerprint: Current fingerprint of the package, None if unknown
+
+        Returns:
+            True if the stored fingerprint equals the current one
+        """
+        with self._lock:
+            return fingerprint is not None and self.fingerprints.get(package_name) == fingerprint
+
+    def get(self, package_name: str) -> Optional[Dict]:
+        """Get the stored fingerprint of a package.
+
+        Args:
+            package_name: Package directory name (under python/)
+
+        Returns:
+            Fingerprint the state was last generated from, None if unknown
+        """
+        with self._lock:
+            return self.fingerprints.get(package_name)
+
+    def set_changelog_serial(self, serial: int) -> None:
+        """Record the global PyPI serial up to which the changelog was processed.
+
+        Args:
+            serial: Global PyPI serial
+        """
+        with self._lock:
+            if serial != self.changelog_serial:
+                self.changelog_serial = serial
+                self.dirty = True
+
+    def put(self, package_name: str, fingerprint: Optional[Dict]) -> None:
+        """Record the fingerprint of a freshly generated state, or forget it if unknown.
+
+        Args:
+            package_name: Package directory name (under python/)
+            fingerprint: Fingerprint of the inputs the state was generated from
+        """
+        with self._lock:
+            if fingerprint is None:
+                if self.fingerprints.pop(package_name, None) is not None:
+                    self.dirty = True
+            elif self.fingerprints.get(package_name) != fingerprint:
+                self.fingerprints[package_name] = fingerprint
+                self.dirty = True
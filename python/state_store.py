@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+SQLite store of the package states, an indexed alternative to state.yaml and its asset shards.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from document_store import DocumentStore
+
+
+# Bumped whenever the schema changes, older stores are emptied and have to be imported again
+STORE_FORMAT = 2
+
+# Platforms every complete version has an asset for
+PLATFORMS = ["linux-amd64", "linux-arm64", "darwin-amd64", "darwin-arm64"]
+
+# Keys of a state version entry kept in their own columns, others are kept as JSON
+VERSION_KEYS = {"version", "python", "requirements", "release", "assets", "release_info"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    config_version INTEGER,
+    keys TEXT NOT NULL DEFAULT '[]',
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY,
+    package_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    python TEXT,
+    requirements INTEGER NOT NULL DEFAULT 0,
+    keys TEXT NOT NULL DEFAULT '[]',
+    extra TEXT NOT NULL DEFAULT '{}',
+    UNIQUE (package_id, version)
+);
+CREATE TABLE IF NOT EXISTS releases (
+    version_id INTEGER PRIMARY KEY REFERENCES versions(id) ON DELETE CASCADE,
+    published INTEGER NOT NULL DEFAULT 0,
+    release_info TEXT
+);
+CREATE TABLE IF NOT EXISTS assets (
+    version_id INTEGER NOT NULL REFERENCES versions(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    platform TEXT,
+    sha256 TEXT,
+    PRIMARY KEY (version_id, name)
+);
+CREATE INDEX IF NOT EXISTS versions_by_package ON versions (package_id, position);
+CREATE INDEX IF NOT EXISTS versions_by_requirements ON versions (requirements);
+CREATE INDEX IF NOT EXISTS releases_by_published ON releases (published);
+CREATE INDEX IF NOT EXISTS assets_by_platform ON assets (platform, version_id);
+"""
+
+
+def asset_platform(asset_name: str) -> Optional[str]:
+    """Get the platform of a release asset from its name.
+
+    Args:
+        asset_name: Name like ansible-linux-arm64.tar.gz
+
+    Returns:
+        Platform like linux-arm64, None if the name has no known platform
+    """
+    for platform in PLATFORMS:
+        if asset_name.endswith(f"-{platform}.tar.gz"):
+            return platform
+    return None
+
+
+def present_keys(keys: List[str], columns: Dict, extra: Dict) -> Dict:
+    """Rebuild a state entry with only the keys it had.
+
+    Args:
+        keys: Keys of the entry when it was stored, in their order
+        columns: Values read from the columns of the entry
+        extra: Values of the keys stored as JSON
+
+    Returns:
+        Entry with the keys in their stored order, followed by the column keys
+        it lacked that now hold a value
+    """
+    values = {**columns, **extra}
+    entry = {key: values[key] for key in keys if key in values}
+    entry.update((key, value) for key, value in columns.items() if key not in entry and value)
+    return entry
+
+
+class StateStore:
+    """Keep the state of every package in indexed SQLite tables.
+
+    Packages, their versions, releases and assets each get a table, so
+    questions like which versions lack a platform asset are answered by
+    one query instead of parsing every state file. The YAML files stay the
+    format the generators read and write, import_tree and export_tree move
+    states between them and the store.
+
+    Every thread gets its own connection. Writes run in transactions that
+    take the write lock up front, and the database is in WAL mode with a
+    busy timeout, so concurrent workers, threads or processes, wait for
+    each other instead of failing or losing updates.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        """Initialize the state store, creating the database if it does not exist.
+
+        Args:
+            path: File of the SQLite database, ":memory:" for an in-memory store used by one thread only
+            timeout: Seconds to wait for another writer before giving up
+        """
+        self.path = path
+        self.timeout = timeout
+        self.logger = logging.getLogger('state_store')
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        connection = self.connection
+        format_version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if format_version not in (0, STORE_FORMAT):
+            self.logger.info(f"Emptying state store {path} in format {format_version}")
+            with self.transaction() as db:
+                for table in ("assets", "releases", "versions", "packages"):
+                    db.execute(f"DROP TABLE IF EXISTS {table}")
+        with self.transaction() as db:
+            # executescript() would commit, run the statements in the transaction instead
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    db.execute(statement)
+            db.execute(f"PRAGMA user_version = {STORE_FORMAT}")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection of the calling thread, opened on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA foreign_keys = ON")
+            if self.path != ":memory:":
+                connection.execute("PRAGMA journal_mode = WAL")
+                connection.execute("PRAGMA synchronous = NORMAL")
+            with self._lock:
+                self._connections.append(connection)
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one transaction, committed on success and rolled back on error.
+
+        The write lock is taken when the transaction begins, so a transaction
+        that reads before it writes cannot be overtaken by another writer.
+
+        Yields:
+            Connection to run the statements on
+        """
+        connection = self.connection
+        if connection.in_transaction:
+            # Nested in a transaction of this thread, which commits or rolls back
+            yield connection
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def close(self) -> None:
+        """Close the connections of all threads."""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def packages(self) -> List[str]:
+        """List the packages in the store.
+
+        Returns:
+            Sorted package directory names
+        """
+        return [row["name"] for row in self.connection.execute("SELECT name FROM packages ORDER BY name")]
+
+    def put_state(self, package_name: str, state: Dict) -> None:
+        """Replace the state of a package.
+
+        Args:
+            package_name: Package directory name (under python/)
+            state: State as written to state.yaml
+        """
+        extra = {key: value for key, value in state.items() if key not in ("config_version", "versions")}
+        with self.transaction() as db:
+            db.execute("DELETE FROM packages WHERE name = ?", (package_name,))
+            package_id = db.execute(
+                "INSERT INTO packages (name, config_version, keys, extra) VALUES (?, ?, ?, ?)",
+                (package_name, state.get("config_version"), json.dumps(list(state)), json.dumps(extra))
+            ).lastrowid
+
+            for position, version_info in enumerate(state.get("versions") or []):
+                version_extra = {key: value for key, value in version_info.items() if key not in VERSION_KEYS}
+                version_id = db.execute(
+                    "INSERT INTO versions (package_id, position, version, python, requirements, keys, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (package_id, position, str(version_info["version"]), version_info.get("python"),
+                     bool(version_info.get("requirements")), json.dumps(list(version_info)),
+                     json.dumps(version_extra))
+                ).lastrowid
+                db.execute(
+                    "INSERT INTO releases (version_id, published, release_info) VALUES (?, ?, ?)",
+                    (version_id, bool(version_info.get("release")), json.dumps(version_info.get("release_info")))
+                )
+                db.executemany(
+                    "INSERT INTO assets (version_id, name, platform, sha256) VALUES (?, ?, ?, ?)",
+                    [(version_id, name, asset_platform(name), sha256)
+                     for name, sha256 in (version_info.get("assets") or {}).items()]
+                )
+
+    def get_state(self, package_name: str) -> Optional[Dict]:
+        """Get the state of a package in the layout of state.yaml.
+
+        Args:
+            package_name: Package directory name (under python/)
+
+        Only the keys the imported state had are emitted, in its order. A
+        column key it lacked is added only once the store holds a value for
+        it, like an asset recorded by set_asset.
+
+        Returns:
+            State as written to state.yaml, None if the package is not in the store
+        """
+        db = self.connection
+        package = db.execute("SELECT * FROM packages WHERE name = ?", (package_name,)).fetchone()
+        if package is None:
+            return None
+
+        assets: Dict[int, Dict[str, str]] = {}
+        for row in db.execute(
+            "SELECT a.version_id, a.name, a.sha256 FROM assets a JOIN versions v ON v.id = a.version_id "
+            "WHERE v.package_id = ? ORDER BY a.name", (package["id"],)
+        ):
+            assets.setdefault(row["version_id"], {})[row["name"]] = row["sha256"]
+
+        versions = []
+        for row in db.execute(
+            "SELECT v.*, r.published, r.release_info FROM versions v LEFT JOIN releases r ON r.version_id = v.id "
+            "WHERE v.package_id = ? ORDER BY v.position", (package["id"],)
+        ):
+            columns = {
+                "version": row["version"],
+                "python": row["python"],
+                "requirements": bool(row["requirements"]),
+                "release": bool(row["published"]),
+                "assets": assets.get(row["id"], {}),
+                "release_info": json.loads(row["release_info"]) if row["release_info"] else None,
+            }
+            versions.append(present_keys(json.loads(row["keys"]), columns, json.loads(row["extra"])))
+        return present_keys(json.loads(package["keys"]),
+                            {"config_version": package["config_version"], "versions": versions},
+                            json.loads(package["extra"]))
+
+    def set_asset(self, package_name: str, version: str, asset_name: str, sha256: str) -> bool:
+        """Record an uploaded asset of a version.
+
+        Args:
+            package_name: Package directory name (under python/)
+            version: Version the asset was built for
+            asset_name: Name of the asset
+            sha256: SHA256 hash of the asset
+
+        Returns:
+            True if the version is in the store
+        """
+        with self.transaction() as db:
+            row = db.execute(
+                "SELECT v.id FROM versions v JOIN packages p ON p.id = v.package_id "
+                "WHERE p.name = ? AND v.version = ?", (package_name, version)
+            ).fetchone()
+            if row is None:
+                return False
+            db.execute(
+                "INSERT INTO assets (version_id, name, platform, sha256) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (version_id, name) DO UPDATE SET sha256 = excluded.sha256",
+                (row["id"], asset_name, asset_platform(asset_name), sha256)
+            )
+        return True
+
+    def import_tree(self, package_dir: Path, package_names: Optional[List[str]] = None,
+                    documents: Optional[DocumentStore] = None) -> int:
+        """Import the states of packages from their YAML files.
+
+        The assets of the platform shards are merged into the state like the
+        build info stage does, without changing the files.
+
+        Args:
+            package_dir: Directory containing the package configurations
+            package_names: Package directory names to import, all packages with a state if None
+            documents: Document store to read the files through, a write-through store if None
+
+        Returns:
+            Number of packages imported
+        """
+        package_dir = Path(package_dir)
+        documents = documents or DocumentStore()
+        if package_names is None:
+            package_names = sorted(path.parent.name for path in package_dir.glob("*/config.yaml"))
+
+        imported = 0
+        for package_name in package_names:
+            state_path = package_dir / package_name / "state.yaml"
+            shards = documents.glob(package_dir / package_name, "asset-*.yaml")
+            if not documents.exists(state_path) and not shards:
+                self.logger.debug(f"No state to import for {package_name}")
+                continue
+
+            state = documents.load(state_path) if documents.exists(state_path) else documents.load(shards[0])
+            versions = {version_info["version"]: version_info for version_info in state.get("versions") or []}
+            for shard in shards:
+                for shard_version in documents.load(shard).get("versions") or []:
+                    version_info = versions.get(shard_version["version"])
+                    if version_info is not None and shard_version.get("assets"):
+                        version_info.setdefault("assets", {}).update(shard_version["assets"])
+
+            self.put_state(package_name, state)
+            imported += 1
+
+        self.logger.info(f"Imported the states of {imported} packages into {self.path}")
+        return imported
+
+    def export_tree(self, package_dir: Path, package_names: Optional[List[str]] = None,
+                    documents: Optional[DocumentStore] = None) -> int:
+        """Write the states of packages to their state.yaml files.
+
+        Args:
+            package_dir: Directory containing the package configurations
+            package_names: Package directory names to export, all packages in the store if None
+            documents: Document store to write the files through, a write-through store if None
+
+        Returns:
+            Number of packages exported
+        """
+        package_dir = Path(package_dir)
+        documents = documents or DocumentStore()
+
+        exported = 0
+        for package_name in package_names if package_names is not None else self.packages():
+            state = self.get_state(package_name)
+            if state is None:
+                self.logger.warning(f"No state of {package_name} in {self.path}")
+                continue
+            (package_dir / package_name).mkdir(parents=True, exist_ok=True)
+            documents.save(package_dir / package_name / "state.yaml", state)
+            exported += 1
+
+        self.logger.info(f"Exported the states of {exported} packages from {self.path}")
+        return exported
+
+    def completeness(self, package_names: Optional[List[str]] = None) -> List[Dict]:
+        """Count the versions of packages by how far they got through the pipeline.
+
+        Args:
+            package_names: Package directory names to report on, all packages if None
+
+        Returns:
+            Dict per package with the number of versions, of versions with
+            requirements, with a release, with all platform assets, and of
+            assets per platform
+        """
+        platform_flags = ", ".join(f"MAX(platform = '{platform}') AS \"{platform}\"" for platform in PLATFORMS)
+        platform_sums = ", ".join(f"COALESCE(SUM(a.\"{platform}\"), 0) AS \"{platform}\"" for platform in PLATFORMS)
+        rows = self.connection.execute(
+            f"SELECT p.name, "
+            f"COUNT(v.id) AS versions, "
+            f"COALESCE(SUM(v.requirements), 0) AS requirements, "
+            f"COALESCE(SUM(r.published), 0) AS released, "
+            f"COALESCE(SUM(a.platforms = {len(PLATFORMS)}), 0) AS complete, "
+            f"{platform_sums} "
+            f"FROM packages p LEFT JOIN versions v ON v.package_id = p.id "
+            f"LEFT JOIN releases r ON r.version_id = v.id "
+            f"LEFT JOIN (SELECT version_id, COUNT(DISTINCT platform) AS platforms, {platform_flags} "
+            f"FROM assets WHERE platform IS NOT NULL GROUP BY version_id) a ON a.version_id = v.id "
+            f"GROUP BY p.id ORDER BY p.name"
+        ).fetchall()
+        wanted = set(package_names) if package_names is not None else None
+        return [dict(row) for row in rows if wanted is None or row["name"] in wanted]
+
+    def pending(self, platforms: Optional[List[str]] = None,
+                package_names: Optional[List[str]] = None) -> List[Dict]:
+        """List the work the pipeline stages have left.
+
+        A version is pending for the requirements stage without requirements,
+        for the releases stage with requirements but without a release, for
+        the build of a platform when it has both but no asset of the
+        platform, and for the build info stage when the assets in its release
+        info differ from its assets.
+
+        Args:
+            platforms: Platforms to report missing assets for, all if None
+            package_names: Package directory names to report on, all packages if None
+
+        Returns:
+            Dict per pending item with the stage, package, version and, for builds, platform
+        """
+        wanted = set(package_names) if package_names is not None else None
+        db = self.connection
+        pending = []
+
+        for row in db.execute(
+            "SELECT p.name, v.version FROM versions v JOIN packages p ON p.id = v.package_id "
+            "WHERE v.requirements = 0 ORDER BY p.name, v.position"
+        ):
+            pending.append({"stage": "requirements", "package": row["name"], "version": row["version"]})
+
+        for row in db.execute(
+            "SELECT p.name, v.version FROM versions v JOIN packages p ON p.id = v.package_id "
+            "JOIN releases r ON r.version_id = v.id "
+            "WHERE v.requirements = 1 AND r.published = 0 ORDER BY p.name, v.position"
+        ):
+            pending.append({"stage": "releases", "package": row["name"], "version": row["version"]})
+
+        for platform in platforms or PLATFORMS:
+            for row in db.execute(
+                "SELECT p.name, v.version FROM versions v JOIN packages p ON p.id = v.package_id "
+                "JOIN releases r ON r.version_id = v.id "
+                "WHERE v.requirements = 1 AND r.published = 1 AND NOT EXISTS "
+                "(SELECT 1 FROM assets a WHERE a.platform = ? AND a.version_id = v.id) "
+                "ORDER BY p.name, v.position", (platform,)
+            ):
+                pending.append({"stage": "build", "package": row["name"], "version": row["version"],
+                                "platform": platform})
+
+        assets: Dict[int, Dict[str, str]] = {}
+        for row in db.execute(
+            "SELECT a.version_id, a.name, a.sha256 FROM assets a JOIN releases r ON r.version_id = a.version_id "
+            "WHERE r.published = 1"
+        ):
+            assets.setdefault(row["version_id"], {})[row["name"]] = row["sha256"]
+        for row in db.execute(
+            "SELECT p.name, v.id, v.version, r.release_info FROM versions v JOIN packages p ON p.id = v.package_id "
+            "JOIN releases r ON r.version_id = v.id WHERE r.published = 1 ORDER BY p.name, v.position"
+        ):
+            release_info = json.loads(row["release_info"]) if row["release_info"] else None
+            if (release_info or {}).get("asset_info") != assets.get(row["id"], {}):
+                pending.append({"stage": "build_info", "package": row["name"], "version": row["version"]})
+
+        return [item for item in pending if wanted is None or item["package"] in wanted]
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Import, export and query the SQLite state store")
+    parser.add_argument("--db", default=os.environ.get("STATE_DB", "python/state.db"),
+                        help="File of the SQLite state store")
+    parser.add_argument("--json", action="store_true", help="Print reports as JSON")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+                        help="Set the logging level")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import the states from their YAML files")
+    import_parser.add_argument("package", nargs="*", help="Package directory name(s) (under python/), all if none")
+    export_parser = commands.add_parser("export", help="Write the states to their state.yaml files")
+    export_parser.add_argument("package", nargs="*", help="Package directory name(s) (under python/), all if none")
+    completeness_parser = commands.add_parser("completeness", help="Count the versions by pipeline progress")
+    completeness_parser.add_argument("package", nargs="*", help="Package directory name(s) (under python/)")
+    pending_parser = commands.add_parser("pending", help="List the work the pipeline stages have left")
+    pending_parser.add_argument("package", nargs="*", help="Package directory name(s) (under python/)")
+    pending_parser.add_argument("--platform", action="append", choices=PLATFORMS,
+                                help="Only report missing assets of this platform, may be repeated")
+    pending_parser.add_argument("--stage", action="append",
+                                choices=["requirements", "releases", "build", "build_info"],
+                                help="Only report work of this stage, may be repeated")
+
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    logger = logging.getLogger('state_store')
+
+    package_dir = Path("python")
+    if args.command in ("import", "export") and not package_dir.exists():
+        logger.error(f"Package directory not found: {package_dir}")
+        sys.exit(1)
+
+    store = StateStore(args.db)
+    try:
+        packages = args.package or None
+        if args.command == "import":
+            store.import_tree(package_dir, packages)
+        elif args.command == "export":
+            store.export_tree(package_dir, packages)
+        elif args.command == "completeness":
+            rows = store.completeness(packages)
+            if args.json:
+                print(json.dumps(rows, indent=2))
+            else:
+                columns = ["versions", "requirements", "released", "complete"] + PLATFORMS
+                width = max([len("package")] + [len(row["name"]) for row in rows])
+                print(f"{'package':<{width}} " + " ".join(f"{column:>12}" for column in columns))
+                for row in rows:
+                    print(f"{row['name']:<{width}} " + " ".join(f"{row[column]:>12}" for column in columns))
+        else:
+            items = [item for item in store.pending(args.platform, packages)
+                     if not args.stage or item["stage"] in args.stage]
+            if args.json:
+                print(json.dumps(items, indent=2))
+            else:
+                for item in items:
+                    print(f"{item['stage']:<12} {item['package']} {item['version']} {item.get('platform', '')}".rstrip())
+                logger.info(f"{len(items)} pending items")
+    except sqlite3.Error as e:
+        logger.error(f"State store error: {e}", exc_info=True)
+        sys.exit(1)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Streaming creation of reproducible release tarballs with an inline SHA-256.
+"""
+
+import gzip
+import hashlib
+import os
+import struct
+import tarfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+
+class HashingWriter:
+    """File-like object that hashes the bytes written through it to another file."""
+
+    def __init__(self, fileobj, name: str = ""):
+        """Initialize the hashing writer.
+
+        Args:
+            fileobj: Binary file object to write to
+            name: File name reported to gzip for its header
+        """
+        self.fileobj = fileobj
+        self.name = name
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        """Hash and write a chunk of data."""
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.fileobj.write(data)
+
+    def flush(self) -> None:
+        """Flush the underlying file."""
+        self.fileobj.flush()
+
+    def hexdigest(self) -> str:
+        """Get the SHA256 of everything written so far."""
+        return self.sha256.hexdigest()
+
+
+class ParallelGzipWriter:
+    """File-like object writing a gzip stream whose blocks are deflated in parallel.
+
+    Input is cut into fixed-size blocks that are compressed on a thread pool,
+    zlib releases the GIL while deflating. Each block is primed with the last
+    32 KiB of the block before it and ends on a sync flush, so the blocks
+    concatenate into one ordinary deflate stream inside a single gzip member
+    that any gzip reader accepts.
+    """
+
+    WINDOW_SIZE = 32 * 1024
+
+    def __init__(self, fileobj, jobs: int, level: int = 9, block_size: int = 1024 * 1024,
+                 filename: Optional[str] = None, mtime: Optional[int] = None):
+        """Initialize the parallel gzip writer.
+
+        Args:
+            fileobj: Binary file object to write the gzip stream to
+            jobs: Number of blocks to compress concurrently
+            level: Compression level
+            block_size: Size of the uncompressed blocks
+            filename: Original file name stored in the gzip header
+            mtime: Modification time stored in the gzip header, defaults to now
+        """
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.executor = ThreadPoolExecutor(max_workers=max(1, jobs))
+        self.max_pending = max(1, jobs) * 2
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.window = b""
+        self.crc = 0
+        self.size = 0
+        self.closed = False
+
+        self._write_header(filename, int(time.time()) if mtime is None else mtime)
+
+    def _write_header(self, filename: Optional[str], mtime: int) -> None:
+        """Write the gzip member header."""
+        flags = 0
+        fname = b""
+        if filename:
+            fname = os.path.basename(filename).encode("latin-1", "replace")
+            if fname.endswith(b".gz"):
+                fname = fname[:-3]
+            flags = 0x08 if fname else 0
+        # Extra flags signal maximum or fastest compression like gzip does
+        xfl = 2 if self.level == 9 else 4 if self.level == 1 else 0
+        self.fileobj.write(struct.pack("<BBBBLBB", 0x1f, 0x8b, 8, flags, mtime, xfl, 255))
+        if fname:
+            self.fileobj.write(fname + b"\0")
+
+    @staticmethod
+    def _compress(data: bytes, window: bytes, level: int, final: bool) -> bytes:
+        """Deflate one block as a raw deflate fragment."""
+        if window:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=window)
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    def _submit(self, data: bytes, final: bool) -> None:
+        """Queue a block for compression, writing finished blocks in order."""
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self.pending.append(self.executor.submit(self._compress, data, self.window, self.level, final))
+        self.window = (self.window + data)[-self.WINDOW_SIZE:]
+
+        # Bound the memory held by blocks in flight
+        while len(self.pending) > self.max_pending:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def write(self, data) -> int:
+        """Compress and write data."""
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+            self._submit(block, final=False)
+        return len(data)
+
+    def flush(self) -> None:
+        """Nothing to flush before close, blocks are written as they complete."""
+
+    def close(self) -> None:
+        """Compress the remaining data and write the gzip trailer."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._submit(bytes(self.buffer), final=True)
+            self.buffer.clear()
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().result())
+            self.fileobj.write(struct.pack("<LL", self.crc & 0xffffffff, self.size & 0xffffffff))
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+def file_sha256(path: Path) -> str:
+    """Calculate the SHA256 hash of a file.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        SHA256 hash of the file
+    """
+    sha256_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+
+def source_date_epoch() -> int:
+    """Get the timestamp recorded in reproducible archives.
+
+    Returns:
+        SOURCE_DATE_EPOCH from the environment, or 0
+    """
+    return int(os.environ.get("SOURCE_DATE_EPOCH", "0"))
+
+
+def normalize_tarinfo(tarinfo: tarfile.TarInfo, mtime: int) -> tarfile.TarInfo:
+    """Strip the build machine specific metadata from an archive member.
+
+    Args:
+        tarinfo: Member to normalize
+        mtime: Modification time to record
+
+    Returns:
+        The normalized member
+    """
+    tarinfo.mtime = mtime
+    tarinfo.uid = tarinfo.gid = 0
+    tarinfo.uname = tarinfo.gname = ""
+    tarinfo.mode = 0o755 if tarinfo.mode & 0o111 else 0o644
+    return tarinfo
+
+
+def write_tarball(tarball_path: Path, files: List[Path], compress_jobs: int = 1) -> str:
+    """Write a reproducible gzipped tarball of files in a single pass.
+
+    The files are streamed from where they are into the archive, with each
+    one at the root of the archive under its own name. The SHA-256 is
+    computed over the compressed bytes as they are written, so the tarball
+    is never read back.
+
+    Entries are sorted by name and their timestamps, owners and permissions
+    are normalized, and the gzip header carries no file name and a fixed
+    timestamp. The same files therefore always give the same SHA-256 for a
+    given compress_jobs, where every value above 1 gives the same output.
+
+    Args:
+        tarball_path: Path of the tarball to create
+        files: Files to add
+        compress_jobs: Number of threads compressing, 1 uses the standard single-threaded gzip
+
+    Returns:
+        SHA256 hash of the tarball
+    """
+    mtime = source_date_epoch()
+    with open(tarball_path, "wb") as f:
+        writer = HashingWriter(f)
+        if compress_jobs > 1:
+            gzip_writer = ParallelGzipWriter(writer, jobs=compress_jobs, mtime=mtime)
+        else:
+            gzip_writer = gzip.GzipFile(filename="", mode="wb", fileobj=writer, compresslevel=9, mtime=mtime)
+        try:
+            with tarfile.open(fileobj=gzip_writer, mode="w|", format=tarfile.GNU_FORMAT) as tar:
+                for file_path in sorted(files, key=lambda path: path.name):
+                    tar.add(file_path, arcname=file_path.name,
+                            filter=lambda tarinfo: normalize_tarinfo(tarinfo, mtime))
+        finally:
+            gzip_writer.close()
+
+    return writer.hexdigest()
@@ -0,0 +1,198 @@
+"""
+Shared wheel and resolve cache for PEX builds with LRU eviction.
+"""
+
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+import pep440
+
+
+# Pinned requirement in a uv pip compile lock file, e.g. "requests==2.31.0 ; python_version >= '3.8'"
+_PIN_RE = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)(?:\[[^\]]*\])?\s*==\s*([^\s;\\]+)")
+
+
+def _normalize_name(name: str) -> str:
+    """Normalize a distribution name the way wheel file names do."""
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+class WheelCache:
+    """Manage a pex root shared by all PEX builds.
+
+    Pex stores downloaded and installed wheels in directories named after
+    the hash of their content, so one root can be shared by concurrent builds
+    and kept between runs. This class keeps an index of the wheels in it to
+    count hits and misses per build, marks used entries so they are evicted
+    last, and evicts the least recently used entries above a total size.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024):
+        """Initialize the wheel cache.
+
+        Args:
+            cache_dir: Directory to keep the cache in
+            max_bytes: Maximum total size of the cache before entries are evicted
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger('wheel_cache')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index: Dict[Tuple[str, object], Set[Path]] = {}
+
+        self.pex_root.mkdir(parents=True, exist_ok=True)
+        self.refresh()
+
+    @property
+    def pex_root(self) -> Path:
+        """Directory to pass to pex as --pex-root."""
+        return self.cache_dir / "pex-root"
+
+    def pex_args(self) -> List[str]:
+        """Get the pex command line arguments that use this cache.
+
+        Returns:
+            List of arguments
+        """
+        return ["--pex-root", str(self.pex_root)]
+
+    def _scan(self) -> Dict[Tuple[str, object], Set[Path]]:
+        """Find all wheels in the pex root.
+
+        Returns:
+            Dict mapping (normalized name, version key) to the entry directories holding it
+        """
+        index = {}
+        for dirpath, dirnames, filenames in os.walk(self.pex_root):
+            # Installed wheels are directories named like the wheel, don't descend into them
+            wheel_dirs = [name for name in dirnames if name.endswith(".whl")]
+            dirnames[:] = [name for name in dirnames if not name.endswith(".whl")]
+
+            # Only content-addressed directories below a top-level cache directory are entries
+            entry = Path(dirpath)
+            if entry == self.pex_root or entry.parent == self.pex_root:
+                continue
+
+            for name in wheel_dirs + [name for name in filenames if name.endswith(".whl")]:
+                parts = name[:-len(".whl")].split("-")
+                if len(parts) < 2:
+                    continue
+                version = pep440.try_parse(parts[1])
+                if version is None:
+                    continue
+                index.setdefault((_normalize_name(parts[0]), version), set()).add(entry)
+
+        return index
+
+    def refresh(self) -> None:
+        """Rebuild the wheel index from the pex root."""
+        index = self._scan()
+        with self._lock:
+            self._index = index
+
+    @staticmethod
+    def read_pins(requirements_file: Path) -> List[Tuple[str, str]]:
+        """Read the pinned requirements from a lock file.
+
+        Args:
+            requirements_file: Path to requirements.txt
+
+        Returns:
+            List of (name, version) tuples
+        """
+        pins = []
+        with open(requirements_file, "r") as f:
+            for line in f:
+                match = _PIN_RE.match(line)
+                if match:
+                    pins.append((match.group(1), match.group(2)))
+        return pins
+
+    def lookup(self, requirements_file: Path) -> Tuple[int, int]:
+        """Count which pinned requirements of a build are already cached.
+
+        Entries of cached requirements are marked as recently used.
+
+        Args:
+            requirements_file: Path to requirements.txt
+
+        Returns:
+            Tuple of (hits, misses) for this build
+        """
+        hits = misses = 0
+        now = time.time()
+        for name, version in self.read_pins(requirements_file):
+            key = (_normalize_name(name), pep440.try_parse(version))
+            with self._lock:
+                entries = list(self._index.get(key, ()))
+            if entries:
+                hits += 1
+                for entry in entries:
+                    try:
+                        os.utime(entry, (now, now))
+                    except FileNotFoundError:
+                        pass
+            else:
+                misses += 1
+
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        return hits, misses
+
+    def _entry_size(self, entry: Path) -> int:
+        """Get the total size of the files in an entry directory."""
+        total = 0
+        for dirpath, _, filenames in os.walk(entry):
+            for name in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, name)).st_size
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def prune(self) -> int:
+        """Evict the least recently used entries until the cache fits in max_bytes.
+
+        Returns:
+            Number of evicted entries
+        """
+        entries = {entry for entry_set in self._scan().values() for entry in entry_set}
+        sized = []
+        for entry in entries:
+            try:
+                sized.append((entry.stat().st_mtime, self._entry_size(entry), entry))
+            except FileNotFoundError:
+                continue
+
+        total_bytes = sum(size for _, size, _ in sized)
+        evicted = 0
+        for _, size, entry in sorted(sized, key=lambda item: item[0]):
+            if total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_bytes -= size
+            evicted += 1
+
+        if evicted:
+            self.logger.info(f"Evicted {evicted} wheel cache entries, {total_bytes / 1024 / 1024:.1f} MiB left")
+            self.refresh()
+        return evicted
+
+    def summary(self) -> str:
+        """Describe the hit and miss counters.
+
+        Returns:
+            Human readable summary
+        """
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        return f"Wheel cache: {self.hits} hits, {self.misses} misses ({ratio:.0f}% hit rate)"
@@ -0,0 +1,89 @@
+"""
+YAML serialization shared by the generators, backed by libyaml when PyYAML was built with it.
+"""
+
+from typing import IO, Any, Optional, Union
+
+import yaml
+
+try:
+    from yaml import CSafeDumper, CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+    CSafeDumper = None
+
+
+# Whether documents are parsed and, where that is byte-identical, emitted by libyaml
+LIBYAML = CSafeDumper is not None
+
+# Keys from this length on may be emitted as "? key" by one emitter and as "key:" by the other
+MAX_SIMPLE_KEY = 120
+
+
+def emits_identically(document: Any) -> bool:
+    """Check whether libyaml emits a document byte for byte like the pure-Python emitter.
+
+    The emitters differ in how they wrap double-quoted scalars, which only
+    strings with non-printable or non-ASCII characters need, in when they
+    fall back to complex keys and in how they end a bare scalar document.
+    Config, state, asset and release documents contain none of these.
+
+    Args:
+        document: Document to emit
+
+    Returns:
+        True if both emitters produce the same output
+    """
+    if not isinstance(document, (dict, list)):
+        return False
+
+    stack = [document]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if isinstance(key, str):
+                    if not key or len(key) >= MAX_SIMPLE_KEY or not key.isascii() or not key.isprintable():
+                        return False
+                elif not (key is None or isinstance(key, (bool, int, float))):
+                    return False
+                stack.append(item)
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, str):
+            if not value.isascii() or not value.isprintable():
+                return False
+        elif not (value is None or isinstance(value, (bool, int, float))):
+            return False
+    return True
+
+
+def load(stream: Union[str, bytes, IO]) -> Any:
+    """Parse a YAML document with the safe loader.
+
+    Args:
+        stream: YAML text or a file opened for reading
+
+    Returns:
+        The parsed document
+    """
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def dump(document: Any, stream: Optional[IO] = None, **kwargs) -> Optional[str]:
+    """Emit a YAML document in block style with the safe dumper.
+
+    The output is the same whether or not libyaml is available, documents
+    libyaml would emit differently go through the pure-Python emitter.
+
+    Args:
+        document: Document to emit
+        stream: File opened for writing, the YAML is returned if None
+        **kwargs: Further options of yaml.dump, like sort_keys
+
+    Returns:
+        The YAML text if no stream was given, None otherwise
+    """
+    kwargs.setdefault("default_flow_style", False)
+    dumper = CSafeDumper if LIBYAML and emits_identically(document) else yaml.SafeDumper
+    return yaml.dump(document, stream, Dumper=dumper, **kwargs)